@@ -0,0 +1,206 @@
+"""
+意图快速分类 - 在调用NLU LLM之前用规则或本地模型识别常见意图
+
+分类结果与NLU LLM输出格式一致（intent/confidence/entities/slots），
+置信度达到阈值时工作流直接进入路由，跳过一次LLM调用。
+"""
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Pattern, Protocol, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+from app.config import settings
+from app.core.embeddings import HashingEmbedder
+
+logger = structlog.get_logger()
+
+
+class IntentClassifier(Protocol):
+    """意图分类器协议：无法判断时返回None"""
+
+    def classify(self, text: str) -> Optional[Dict[str, Any]]:
+        ...
+
+
+# ============== 规则分类 ==============
+
+def _greeting(match: re.Match) -> Dict[str, Any]:
+    return {"intent": "general_chat", "confidence": 0.99, "entities": [], "slots": {}}
+
+
+def _create_oag(match: re.Match) -> Dict[str, Any]:
+    subject = (match.group("subject") or "").strip()
+    detail = (match.group("detail") or "").strip()
+    description = detail or subject
+
+    entities = []
+    if subject and subject.upper() != "OAG":
+        entities.append({"type": "domain", "value": subject})
+
+    return {
+        "intent": "create_oag",
+        "confidence": 0.97 if description else 0.6,
+        "entities": entities,
+        "slots": {"description": description} if description else {},
+    }
+
+
+DEFAULT_RULES: List[Tuple[Pattern, Callable[[re.Match], Dict[str, Any]]]] = [
+    (
+        re.compile(r"^\s*(你好|您好|嗨|哈喽|在吗|hi|hello|hey)[\s!！。.,，~]*$", re.IGNORECASE),
+        _greeting,
+    ),
+    (
+        re.compile(
+            r"^\s*(请|请你|帮我|麻烦)?\s*(创建|新建|生成|构建)(一个|一份|一张)?"
+            r"(?P<subject>[^:：\n]*?)的?\s*(OAG)?\s*(知识)?图谱\s*([:：]\s*(?P<detail>.+))?$",
+            re.IGNORECASE | re.DOTALL,
+        ),
+        _create_oag,
+    ),
+]
+
+
+class RuleIntentClassifier:
+    """正则规则分类器，按顺序匹配第一条命中的规则"""
+
+    def __init__(self, rules: Sequence[Tuple[Pattern, Callable[[re.Match], Dict[str, Any]]]] = None):
+        self.rules = list(rules if rules is not None else DEFAULT_RULES)
+
+    def classify(self, text: str) -> Optional[Dict[str, Any]]:
+        for pattern, build in self.rules:
+            match = pattern.match(text)
+            if match:
+                return build(match)
+        return None
+
+
+# ============== 本地模型分类 ==============
+
+class LinearIntentClassifier:
+    """
+    基于哈希特征的 softmax 回归分类器
+
+    使用 NLU 日志（LLM 标注的意图）训练，只输出意图与置信度，不抽取槽位。
+    """
+
+    def __init__(self, labels: Sequence[str], weights: np.ndarray, bias: np.ndarray, embedder: HashingEmbedder = None):
+        self.labels = list(labels)
+        self.weights = weights
+        self.bias = bias
+        self.embedder = embedder or HashingEmbedder(dimension=weights.shape[0])
+
+    def classify(self, text: str) -> Optional[Dict[str, Any]]:
+        probs = self._softmax(self.embedder.embed([text]) @ self.weights + self.bias)[0]
+        best = int(np.argmax(probs))
+        return {"intent": self.labels[best], "confidence": float(probs[best]), "entities": [], "slots": {}}
+
+    @classmethod
+    def train(
+        cls,
+        texts: Sequence[str],
+        intents: Sequence[str],
+        dimension: int = None,
+        epochs: int = 300,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4
+    ) -> "LinearIntentClassifier":
+        """全量梯度下降训练"""
+        embedder = HashingEmbedder(dimension=dimension)
+        labels = sorted(set(intents))
+        index = {label: i for i, label in enumerate(labels)}
+
+        x = embedder.embed(texts)
+        y = np.zeros((len(texts), len(labels)), dtype=np.float32)
+        y[np.arange(len(texts)), [index[i] for i in intents]] = 1.0
+
+        weights = np.zeros((embedder.dimension, len(labels)), dtype=np.float32)
+        bias = np.zeros(len(labels), dtype=np.float32)
+        for _ in range(epochs):
+            grad = (cls._softmax(x @ weights + bias) - y) / len(texts)
+            weights -= learning_rate * (x.T @ grad + l2 * weights)
+            bias -= learning_rate * grad.sum(axis=0)
+
+        return cls(labels, weights, bias, embedder)
+
+    @classmethod
+    def train_from_log(cls, log_path: str, min_confidence: float = 0.8, **kwargs) -> "LinearIntentClassifier":
+        """从意图日志(JSONL)训练，只使用高置信度样本"""
+        texts, intents = [], []
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if (record.get("confidence") or 0) >= min_confidence:
+                    texts.append(record["text"])
+                    intents.append(record["intent"])
+        return cls.train(texts, intents, **kwargs)
+
+    def save(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, weights=self.weights, bias=self.bias, labels=np.array(self.labels))
+
+    @classmethod
+    def load(cls, path: str) -> "LinearIntentClassifier":
+        data = np.load(path, allow_pickle=False)
+        return cls(data["labels"].tolist(), data["weights"], data["bias"])
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+# ============== 组合 ==============
+
+class CompositeIntentClassifier:
+    """按顺序尝试多个分类器，返回第一个达到置信度阈值的结果"""
+
+    def __init__(self, classifiers: Sequence[IntentClassifier], min_confidence: float = 0.9):
+        self.classifiers = list(classifiers)
+        self.min_confidence = min_confidence
+
+    def classify(self, text: str) -> Optional[Dict[str, Any]]:
+        for classifier in self.classifiers:
+            result = classifier.classify(text)
+            if result is not None and result["confidence"] >= self.min_confidence:
+                return result
+        return None
+
+
+def log_intent(path: str, text: str, result: Dict[str, Any]):
+    """记录一条LLM意图解析结果，用于训练本地分类模型"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    record = {"text": text, "intent": result.get("intent"), "confidence": result.get("confidence")}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def build_intent_classifier() -> Optional[IntentClassifier]:
+    """根据配置构建分类器，未启用时返回None"""
+    if not settings.INTENT_ROUTER_ENABLED:
+        return None
+
+    classifiers: List[IntentClassifier] = [RuleIntentClassifier()]
+    model_path = settings.INTENT_ROUTER_MODEL_PATH
+    if model_path:
+        if Path(model_path).exists():
+            classifiers.append(LinearIntentClassifier.load(model_path))
+        else:
+            logger.warning("Intent classifier model not found, using rules only", path=model_path)
+
+    return CompositeIntentClassifier(classifiers, min_confidence=settings.INTENT_ROUTER_MIN_CONFIDENCE)
+
+
+if __name__ == "__main__":
+    # 训练: python -m app.agents.intent_classifier <intent_log.jsonl> <model.npz>
+    if len(sys.argv) != 3:
+        print("usage: python -m app.agents.intent_classifier <intent_log.jsonl> <model.npz>")
+        sys.exit(1)
+    model = LinearIntentClassifier.train_from_log(sys.argv[1])
+    model.save(sys.argv[2])
+    print(f"trained on labels {model.labels}, saved to {sys.argv[2]}")
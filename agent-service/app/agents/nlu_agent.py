@@ -2,8 +2,16 @@
 NLU Agent - 自然语言理解
 """
 import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+from app.config import settings
 from app.graph.state import AgentState, Message
 from app.core.llm_client import kimi_client, Message as LLMMessage
+from app.core.rate_limiter import LLMOverloadedError
+from app.core.semantic_cache import SemanticCache
+from app.core.serialization import loads
+from app.agents.intent_classifier import log_intent
+from app.graph import events
 from app.prompts import load_prompt
 import structlog
 
@@ -15,6 +23,16 @@ class NLUAgent:
     
     def __init__(self):
         self.name = "nlu_agent"
+        
+        # 语义缓存（可选）
+        self.semantic_cache: Optional[SemanticCache] = None
+        if settings.NLU_SEMANTIC_CACHE_ENABLED:
+            self.semantic_cache = SemanticCache(
+                threshold=settings.NLU_SEMANTIC_CACHE_THRESHOLD,
+                max_entries=settings.NLU_SEMANTIC_CACHE_MAX_ENTRIES,
+                path=str(Path(settings.VECTOR_STORE_PATH) / "nlu_cache"),
+                persist_interval=settings.NLU_SEMANTIC_CACHE_PERSIST_INTERVAL
+            )
     
     async def run(self, state: AgentState) -> AgentState:
         """
@@ -28,47 +46,21 @@ class NLUAgent:
         """
         logger.info("NLU Agent running", session_id=state["session_id"])
         
-        user_input = state["user_input"]
-        
-        # 加载Prompt
-        prompt = load_prompt(
-            "nlu_parser",
-            user_input=user_input,
-            context=json.dumps(state.get("slots", {})),
-            entity_types="Vehicle, Domain, Project, Epic, Feature, Task",
-            relation_types="belongs_to, depends_on, contains, relates_to"
-        )
-        
-        # 调用LLM
-        messages = [
-            LLMMessage(role="system", content="你是一个专业的自然语言理解助手。"),
-            LLMMessage(role="user", content=prompt)
-        ]
-        
         try:
-            response = await kimi_client.chat(messages)
+            source = "semantic_cache"
+            result = self._lookup_cache(state)
+            if result is None:
+                source = "llm"
+                result = await self._parse_with_llm(state)
+                self._remember(state, result)
+                if self.semantic_cache is not None:
+                    await self.semantic_cache.persist()
             
-            # 解析结果
-            result = json.loads(response.content)
+            self.apply_result(state, result, source=source)
             
-            # 更新状态
-            state["intent"] = result.get("intent", "general_chat")
-            state["entities"] = result.get("entities", [])
-            state["slots"].update(result.get("slots", {}))
-            state["agent_results"]["nlu"] = result
-            
-            # 添加助手消息
-            state["messages"].append(Message(
-                role="assistant",
-                content=f"意图识别: {result.get('intent')}",
-                name=self.name
-            ))
-            
-            logger.info(
-                "NLU parsing completed",
-                intent=result.get("intent"),
-                confidence=result.get("confidence")
-            )
+        except LLMOverloadedError:
+            # 限流排队超时交由接口层返回503
+            raise
             
         except json.JSONDecodeError as e:
             logger.error("Failed to parse NLU result", error=str(e))
@@ -81,3 +73,122 @@ class NLUAgent:
             state["error"] = str(e)
         
         return state
+    
+    def apply_result(self, state: AgentState, result: Dict[str, Any], source: str = "llm"):
+        """
+        把意图解析结果写入状态
+        
+        Args:
+            state: 当前状态
+            result: 解析结果 (intent/confidence/entities/slots)
+            source: 结果来源 llm / semantic_cache / fast_path
+        """
+        state["intent"] = result.get("intent", "general_chat")
+        state["entities"] = result.get("entities", [])
+        state["slots"].update(result.get("slots", {}))
+        state["agent_results"]["nlu"] = {**result, "source": source}
+        
+        # 添加助手消息
+        state["messages"].append(Message(
+            role="assistant",
+            content=f"意图识别: {result.get('intent')}",
+            name=self.name
+        ))
+        
+        events.emit(
+            "nlu",
+            intent=state["intent"],
+            confidence=result.get("confidence"),
+            source=source,
+            entities=state["entities"],
+            slots=state["slots"]
+        )
+        
+        logger.info(
+            "NLU parsing completed",
+            intent=result.get("intent"),
+            confidence=result.get("confidence"),
+            source=source
+        )
+    
+    def _context(self, state: AgentState) -> str:
+        """当前上下文：已有槽位，多轮会话时附带最近几轮对话"""
+        slots = state.get("slots", {})
+        history = [
+            f"{m.role}: {m.content[:200]}"
+            for m in state["messages"][:-1]
+            if m.name != self.name
+        ][-6:]
+        if not history:
+            return json.dumps(slots)
+        return json.dumps({"slots": slots, "history": history}, ensure_ascii=False)
+    
+    async def _parse_with_llm(self, state: AgentState) -> Dict[str, Any]:
+        """调用LLM解析意图"""
+        # 加载Prompt
+        prompt = load_prompt(
+            "nlu_parser",
+            user_input=state["user_input"],
+            context=self._context(state),
+            entity_types="Vehicle, Domain, Project, Epic, Feature, Task",
+            relation_types="belongs_to, depends_on, contains, relates_to"
+        )
+        
+        # 调用LLM
+        messages = [
+            LLMMessage(role="system", content="你是一个专业的自然语言理解助手。"),
+            LLMMessage(role="user", content=prompt)
+        ]
+        
+        # 流式请求时逐片转发增量，否则一次性请求
+        if events.is_streaming():
+            content = await events.stream_completion(self.name, messages)
+        else:
+            content = (await kimi_client.chat(messages)).content
+        
+        return loads(content)
+    
+    def _lookup_cache(self, state: AgentState) -> Optional[Dict[str, Any]]:
+        """
+        查询语义缓存
+        
+        已有上下文槽位时解析结果依赖上下文，不使用缓存。
+        相似的输入只共享意图：描述槽位取本次输入，实体不复用。
+        """
+        if self.semantic_cache is None or state.get("slots"):
+            return None
+        
+        hit = self.semantic_cache.lookup(state["user_input"])
+        if hit is None:
+            return None
+        
+        cached, similarity = hit
+        logger.info("NLU semantic cache hit", intent=cached.get("intent"), similarity=round(similarity, 4))
+        with_description = cached.get("with_description", "description" in (cached.get("slots") or {}))
+        return {
+            "intent": cached.get("intent"),
+            "confidence": cached.get("confidence"),
+            "entities": [],
+            "slots": {"description": state["user_input"]} if with_description else {}
+        }
+    
+    def _remember(self, state: AgentState, result: Dict[str, Any]):
+        """记录意图日志；高置信度且无需澄清的结果写入语义缓存"""
+        if settings.INTENT_ROUTER_LOG_PATH:
+            log_intent(settings.INTENT_ROUTER_LOG_PATH, state["user_input"], result)
+        
+        if self.semantic_cache is None or state.get("slots"):
+            return
+        if result.get("clarification_needed"):
+            return
+        if (result.get("confidence") or 0) < settings.NLU_SEMANTIC_CACHE_MIN_CONFIDENCE:
+            return
+        # 描述以外的槽位无法从新输入推出，这类结果不缓存
+        slots = result.get("slots") or {}
+        if set(slots) - {"description"}:
+            return
+        self.semantic_cache.add(state["user_input"], {
+            "intent": result.get("intent"),
+            "confidence": result.get("confidence"),
+            "with_description": "description" in slots
+        })
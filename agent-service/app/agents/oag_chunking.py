@@ -0,0 +1,183 @@
+"""
+长文档分块抽取 - 切分、并发抽取后合并
+
+- 切分：按Markdown标题和段落切分（标题与其后的第一个段落合为一块），在token上限内尽量合并相邻段落，
+  相邻块保留少量重叠，避免跨段落的关系丢失；代码块（如mermaid图）不拆开
+- 合并：各块独立编号，同一ID在不同块中可能指向不同实体。按「类型 + 规范化名称」
+  去重，为每块建立 块内ID -> 全局ID 的映射，再据此改写关系并去重
+"""
+import re
+from typing import Any, Dict, List, Tuple
+
+from app.core.entity_index import normalize_label
+from app.core.tokens import estimate_tokens
+
+_HEADING_RE = re.compile(r"^#{1,6}\s")
+
+
+def _blocks(text: str) -> List[str]:
+    """把文档切成不可再分的块：段落、完整的代码块，标题并入其后的第一个块"""
+    blocks: List[str] = []
+    current: List[str] = []
+    # 尚未并入内容的标题行，标题单独成块既浪费一次抽取，也让正文失去章节上下文
+    headings: List[str] = []
+    in_fence = False
+
+    def flush():
+        if current and "".join(current).strip():
+            blocks.append("\n".join(headings + current).strip("\n"))
+            headings.clear()
+        current.clear()
+
+    for line in text.splitlines():
+        if line.lstrip().startswith("```"):
+            if not in_fence:
+                flush()
+            current.append(line)
+            in_fence = not in_fence
+            if not in_fence:
+                flush()
+            continue
+        if in_fence:
+            current.append(line)
+        elif _HEADING_RE.match(line):
+            flush()
+            headings.append(line)
+        elif not line.strip():
+            flush()
+        else:
+            current.append(line)
+    flush()
+    if headings:
+        blocks.append("\n".join(headings))
+    return blocks
+
+
+def _split_oversized(block: str, max_tokens: int) -> List[str]:
+    """超过上限的单个块按行（必要时按字符）硬切"""
+    pieces: List[str] = []
+    current = ""
+    for line in block.splitlines(keepends=True):
+        while estimate_tokens(line) > max_tokens:
+            # 按token密度估算切分位置
+            cut = max(1, len(line) * max_tokens // estimate_tokens(line))
+            head, line = line[:cut], line[cut:]
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(head)
+        if current and estimate_tokens(current) + estimate_tokens(line) > max_tokens:
+            pieces.append(current)
+            current = ""
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_document(text: str, max_tokens: int = 2000, overlap_tokens: int = 200) -> List[str]:
+    """
+    切分长文档
+
+    Args:
+        text: 文档文本
+        max_tokens: 每块的token上限
+        overlap_tokens: 相邻块的重叠token数（取上一块末尾的若干段落）
+
+    Returns:
+        文本块列表
+    """
+    blocks: List[Tuple[str, int]] = []
+    for block in _blocks(text):
+        # 每块额外计1个token，覆盖拼接时的分隔符
+        tokens = estimate_tokens(block) + 1
+        if tokens > max_tokens:
+            blocks.extend((piece, estimate_tokens(piece) + 1) for piece in _split_oversized(block, max_tokens - 1))
+        else:
+            blocks.append((block, tokens))
+
+    chunks: List[str] = []
+    current: List[Tuple[str, int]] = []
+    used = 0
+    for block, tokens in blocks:
+        if current and used + tokens > max_tokens:
+            chunks.append("\n\n".join(b for b, _ in current))
+            # 末尾若干段落带入下一块
+            carried: List[Tuple[str, int]] = []
+            carried_tokens = 0
+            for previous in reversed(current):
+                if carried_tokens + previous[1] > overlap_tokens or carried_tokens + previous[1] + tokens > max_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous[1]
+            current, used = carried, carried_tokens
+        current.append((block, tokens))
+        used += tokens
+    if current:
+        chunks.append("\n\n".join(b for b, _ in current))
+    return chunks
+
+
+def merge_chunk_results(results: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """
+    合并各块的抽取结果
+
+    Args:
+        results: 按块顺序排列的 {"entities": [...], "relations": [...]}
+
+    Returns:
+        (合并后的 {"entities", "relations"}, 统计信息)
+    """
+    entities: Dict[str, Dict[str, Any]] = {}
+    by_key: Dict[Tuple[str, str], str] = {}
+    relations: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    stats = {"entities_in": 0, "duplicates_merged": 0, "ids_renamed": 0, "relations_in": 0, "relations_dropped": 0}
+
+    for chunk_index, result in enumerate(results):
+        id_map: Dict[str, str] = {}
+
+        for entity in result.get("entities", []):
+            local_id, entity_type = entity.get("id"), entity.get("type")
+            if not local_id or not entity_type:
+                continue
+            stats["entities_in"] += 1
+            key = (entity_type, normalize_label(entity.get("label") or local_id))
+
+            canonical = by_key.get(key)
+            if canonical is not None:
+                # 同一实体：补充缺失的属性
+                stats["duplicates_merged"] += 1
+                properties = entities[canonical].setdefault("properties", {})
+                for name, value in (entity.get("properties") or {}).items():
+                    properties.setdefault(name, value)
+                id_map[local_id] = canonical
+                continue
+
+            global_id = local_id
+            if global_id in entities:
+                # ID 已被其他块的不同实体占用
+                global_id = f"{local_id}_c{chunk_index + 1}"
+                suffix = 2
+                while global_id in entities:
+                    global_id = f"{local_id}_c{chunk_index + 1}_{suffix}"
+                    suffix += 1
+                stats["ids_renamed"] += 1
+
+            entities[global_id] = {**entity, "id": global_id, "properties": dict(entity.get("properties") or {})}
+            by_key[key] = global_id
+            id_map[local_id] = global_id
+
+        for relation in result.get("relations", []):
+            stats["relations_in"] += 1
+            source = id_map.get(relation.get("source"))
+            target = id_map.get(relation.get("target"))
+            if source is None or target is None or not relation.get("type"):
+                stats["relations_dropped"] += 1
+                continue
+            key = (source, relation["type"], target)
+            if key not in relations:
+                relations[key] = {**relation, "source": source, "target": target}
+
+    stats["entities_out"] = len(entities)
+    stats["relations_out"] = len(relations)
+    return {"entities": list(entities.values()), "relations": list(relations.values())}, stats
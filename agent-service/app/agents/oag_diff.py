@@ -0,0 +1,119 @@
+"""
+OAG 增量差异 - 把LLM输出的差异合并到现有图谱
+
+差异格式:
+    added_entities:    [{id, type, label, properties}]
+    updated_entities:  [{id, label?, type?, properties?}]   properties 中值为 null 表示删除该属性
+    removed_entities:  [{id}]                                同时删除与其相连的关系
+    added_relations:   [{source, target, type, label?, properties?}]
+    removed_relations: [{source, target, type}]
+"""
+import copy
+from typing import Any, Dict, List, Tuple
+
+DIFF_KEYS = (
+    "added_entities",
+    "updated_entities",
+    "removed_entities",
+    "added_relations",
+    "removed_relations",
+)
+
+
+def relation_key(relation: Dict[str, Any]) -> Tuple[str, str, str]:
+    return relation["source"], relation.get("type", ""), relation["target"]
+
+
+def _update_entity(entity: Dict[str, Any], change: Dict[str, Any]):
+    for field in ("type", "label"):
+        if change.get(field):
+            entity[field] = change[field]
+    properties = dict(entity.get("properties") or {})
+    for name, value in (change.get("properties") or {}).items():
+        if value is None:
+            properties.pop(name, None)
+        else:
+            properties[name] = value
+    entity["properties"] = properties
+
+
+def apply_oag_diff(
+    oag: Dict[str, Any],
+    diff: Dict[str, List[Dict[str, Any]]]
+) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """
+    合并差异，不修改传入的 oag
+
+    Args:
+        oag: 现有OAG（entities/relations）
+        diff: 差异，键见 DIFF_KEYS
+
+    Returns:
+        (合并后的OAG, 各类变更的实际生效数量)
+    """
+    entities: Dict[str, Dict[str, Any]] = {
+        e["id"]: copy.deepcopy(e) for e in oag.get("entities", []) if e.get("id")
+    }
+    relations: Dict[Tuple[str, str, str], Dict[str, Any]] = {
+        relation_key(r): copy.deepcopy(r)
+        for r in oag.get("relations", []) if r.get("source") and r.get("target")
+    }
+    counts = {key: 0 for key in DIFF_KEYS}
+    counts["skipped"] = 0
+
+    for item in diff.get("removed_entities", []):
+        if entities.pop(item.get("id"), None) is None:
+            counts["skipped"] += 1
+            continue
+        counts["removed_entities"] += 1
+        for key in [k for k in relations if item["id"] in (k[0], k[2])]:
+            del relations[key]
+
+    for item in diff.get("updated_entities", []):
+        entity = entities.get(item.get("id"))
+        if entity is None:
+            counts["skipped"] += 1
+            continue
+        _update_entity(entity, item)
+        counts["updated_entities"] += 1
+
+    for item in diff.get("added_entities", []):
+        if not item.get("id") or not item.get("type"):
+            counts["skipped"] += 1
+        elif item["id"] in entities:
+            # 已存在的ID按更新处理
+            _update_entity(entities[item["id"]], item)
+            counts["updated_entities"] += 1
+        else:
+            entities[item["id"]] = {
+                "id": item["id"],
+                "type": item["type"],
+                "label": item.get("label", item["id"]),
+                "properties": item.get("properties") or {},
+            }
+            counts["added_entities"] += 1
+
+    for item in diff.get("removed_relations", []):
+        if not item.get("source") or not item.get("target") or relations.pop(relation_key(item), None) is None:
+            counts["skipped"] += 1
+        else:
+            counts["removed_relations"] += 1
+
+    for item in diff.get("added_relations", []):
+        if item.get("source") not in entities or item.get("target") not in entities or not item.get("type"):
+            counts["skipped"] += 1
+            continue
+        key = relation_key(item)
+        if key in relations:
+            counts["skipped"] += 1
+            continue
+        relations[key] = {
+            "source": item["source"],
+            "target": item["target"],
+            "type": item["type"],
+            "label": item.get("label", ""),
+            "properties": item.get("properties") or {},
+        }
+        counts["added_relations"] += 1
+
+    return {"entities": list(entities.values()), "relations": list(relations.values())}, counts
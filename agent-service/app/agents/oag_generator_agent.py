@@ -1,10 +1,27 @@
 """
 OAG Generator Agent - OAG图谱生成
 """
+import asyncio
 import json
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List, Optional, Set, Union
+from app.core.entity_index import EntityIndex, relation_id
+from app.core.json_stream import StreamingJSONParser
 from app.graph.state import AgentState, Message, Entity, Relation
 from app.core.llm_client import kimi_client, Message as LLMMessage
+from app.core.rate_limiter import LLMOverloadedError
+from app.core.schema_store import schema_store
+from app.core.schema_validator import repair_oag, validate_oag
+from app.core.tokens import estimate_tokens
+from app.core.tracing import tracer
+from app.core.vector_store import VectorStore
+from app.config import settings, TOOL_CONFIG
+from app.graph import events
 from app.prompts import load_prompt
+from app.prompts.graph_prompt import build_graph_prompt, build_reference_prompt
+from app.prompts.schema_prompt import build_schema_prompt
+from app.agents.oag_chunking import merge_chunk_results, split_document
+from app.agents.oag_diff import DIFF_KEYS, apply_oag_diff, relation_key
 import structlog
 
 logger = structlog.get_logger()
@@ -15,6 +32,19 @@ class OAGGeneratorAgent:
     
     def __init__(self):
         self.name = "oag_generator"
+        
+        # 实体规范化索引（可选），已有图谱的实体在服务启动时登记
+        self.entity_index: Optional[EntityIndex] = None
+        if settings.ENTITY_INDEX_ENABLED:
+            self.entity_index = EntityIndex(
+                vector_threshold=settings.ENTITY_INDEX_VECTOR_THRESHOLD,
+                max_learned=settings.ENTITY_INDEX_LEARNED_MAX_ENTRIES
+            )
+        
+        # 已有图谱检索（可选），语料在服务启动时增量导入
+        self.vector_store: Optional[VectorStore] = None
+        if settings.RAG_ENABLED:
+            self.vector_store = VectorStore(path=str(Path(settings.VECTOR_STORE_PATH) / "graphs"))
     
     async def run(self, state: AgentState) -> AgentState:
         """
@@ -32,27 +62,36 @@ class OAGGeneratorAgent:
         description = state["slots"].get("description", state["user_input"])
         schema_id = state["slots"].get("schema_id", "default")
         
-        # 模拟获取Schema (实际应从后端API获取)
-        schema = {
-            "entityTypes": {
-                "Project": {"code": "Project", "label": "项目"},
-                "Domain": {"code": "Domain", "label": "领域"},
-                "Epic": {"code": "Epic", "label": "史诗"},
-                "Feature": {"code": "Feature", "label": "特性"}
-            },
-            "relationTypes": {
-                "contains": {"id": "contains", "label": "包含", "from": ["Project"], "to": ["Domain"]},
-                "has_epic": {"id": "has_epic", "label": "有史诗", "from": ["Domain"], "to": ["Epic"]},
-                "has_feature": {"id": "has_feature", "label": "有特性", "from": ["Epic"], "to": ["Feature"]}
-            }
-        }
+        # 获取Schema（进程内缓存，过期时条件请求重新验证）
+        with tracer.start_span("oag.schema", schema_id=schema_id):
+            schema = await schema_store.get(schema_id)
+        
+        # 长文档分块并发抽取后合并
+        if 0 < settings.OAG_CHUNK_THRESHOLD_TOKENS < estimate_tokens(description):
+            return await self.run_chunked(state, description, schema)
+        
+        # 只保留与描述和NLU实体相关的Schema类型，控制在token预算内
+        schema_text, prompt_stats = build_schema_prompt(
+            schema,
+            description,
+            entities=state.get("entities"),
+            token_budget=settings.OAG_SCHEMA_TOKEN_BUDGET
+        )
+        
+        # 检索已有图谱中的相关实体
+        with tracer.start_span("oag.retrieve"):
+            context_text, context_stats = self._reference_context(description)
+        prompt_stats.update(context_stats)
         
         # 加载Prompt
         prompt = load_prompt(
             "oag_generator",
-            schema=json.dumps(schema, ensure_ascii=False),
-            description=description
+            schema=schema_text,
+            description=description,
+            context=context_text
         )
+        prompt_stats["prompt_tokens"] = estimate_tokens(prompt)
+        logger.info("OAG prompt built", session_id=state["session_id"], **prompt_stats)
         
         # 调用LLM
         messages = [
@@ -61,44 +100,46 @@ class OAGGeneratorAgent:
         ]
         
         try:
-            response = await kimi_client.chat(messages)
-            
-            # 解析结果
-            result = json.loads(response.content)
-            
-            # 转换为内部数据模型
+            # 流式解析：每个实体/关系在其JSON对象闭合时即可使用
+            parser = StreamingJSONParser(("entities", "relations"))
             entities = []
-            for e in result.get("entities", []):
-                entities.append(Entity(
-                    id=e["id"],
-                    type=e["type"],
-                    label=e["label"],
-                    properties=e.get("properties", {})
-                ))
-            
             relations = []
-            for r in result.get("relations", []):
-                relations.append(Relation(
-                    id=f"{r['source']}_{r['type']}_{r['target']}",
-                    source=r["source"],
-                    target=r["target"],
-                    type=r["type"],
-                    label=r.get("label", ""),
-                    properties=r.get("properties", {})
-                ))
-            
-            # 更新状态
+            accepted = {"entities": [], "relations": []}
+            async for item in self.stream_items(messages, parser, accepted):
+                if isinstance(item, Entity):
+                    entities.append(item)
+                else:
+                    relations.append(item)
+            
+            result = parser.result()
+            if not result["complete"]:
+                if not entities:
+                    raise json.JSONDecodeError("LLM输出中没有完整的JSON对象", "", 0)
+                # 输出被截断(如达到max_tokens)时保留已完成的部分
+                logger.warning(
+                    "OAG output truncated, keeping partial result",
+                    entity_count=len(entities),
+                    relation_count=len(relations)
+                )
+            
+            # 更新状态（跳过的格式错误元素不进入结果）
             state["entities_to_create"] = entities
             state["relations_to_create"] = relations
             state["agent_results"]["oag_generator"] = {
-                "entities": result.get("entities", []),
-                "relations": result.get("relations", []),
-                "explanation": result.get("explanation", "")
+                "entities": accepted["entities"],
+                "relations": accepted["relations"],
+                "explanation": result.get("explanation", ""),
+                "truncated": not result["complete"],
+                "prompt_stats": prompt_stats
             }
             
+            with tracer.start_span("oag.validate"):
+                self._validate(state, schema)
+                self._canonicalize(state)
+            
             # 添加助手消息
-            entity_count = len(entities)
-            relation_count = len(relations)
+            entity_count = len(state["entities_to_create"])
+            relation_count = len(state["relations_to_create"])
             state["messages"].append(Message(
                 role="assistant",
                 content=f"已生成OAG图谱: {entity_count}个实体, {relation_count}个关系。{result.get('explanation', '')}",
@@ -111,6 +152,10 @@ class OAGGeneratorAgent:
                 relation_count=relation_count
             )
             
+        except LLMOverloadedError:
+            # 限流排队超时交由接口层返回503
+            raise
+            
         except json.JSONDecodeError as e:
             logger.error("Failed to parse OAG result", error=str(e))
             state["error"] = f"OAG生成结果解析失败: {str(e)}"
@@ -120,3 +165,407 @@ class OAGGeneratorAgent:
             state["error"] = str(e)
         
         return state
+    
+    async def run_chunked(self, state: AgentState, description: str, schema) -> AgentState:
+        """
+        长文档分块抽取：各块并发调用LLM，再去重合并实体并统一ID
+        
+        Args:
+            state: 当前状态
+            description: 长文档
+            schema: CachedSchema
+            
+        Returns:
+            更新后的状态
+        """
+        chunks = split_document(description, settings.OAG_CHUNK_MAX_TOKENS, settings.OAG_CHUNK_OVERLAP_TOKENS)
+        logger.info("OAG chunked extraction running", session_id=state["session_id"], chunks=len(chunks))
+        
+        semaphore = asyncio.Semaphore(settings.OAG_CHUNK_CONCURRENCY)
+        
+        async def extract(index: int, chunk: str) -> Dict[str, Any]:
+            async with semaphore:
+                with tracer.start_span("oag.chunk", index=index):
+                    result = await self._extract_chunk(chunk, schema, state.get("entities"))
+            events.emit(
+                "chunk_extracted",
+                agent=self.name,
+                index=index,
+                total=len(chunks),
+                entities=len(result["entities"]),
+                relations=len(result["relations"])
+            )
+            return result
+        
+        outcomes = await asyncio.gather(
+            *(extract(i, chunk) for i, chunk in enumerate(chunks)),
+            return_exceptions=True
+        )
+        results = [o for o in outcomes if not isinstance(o, BaseException)]
+        failures = [o for o in outcomes if isinstance(o, BaseException)]
+        for error in failures:
+            logger.warning("OAG chunk extraction failed", session_id=state["session_id"], error=str(error))
+        
+        try:
+            if not results:
+                raise failures[0]
+            
+            merged, merge_stats = merge_chunk_results(results)
+            accepted = {"entities": [], "relations": []}
+            entities = []
+            relations = []
+            for key, target, convert in (
+                ("entities", entities, self._to_entity),
+                ("relations", relations, self._to_relation)
+            ):
+                for data in merged[key]:
+                    try:
+                        target.append(convert(data))
+                    except KeyError as e:
+                        logger.warning("Skipping malformed OAG item", kind=key, missing=str(e))
+                        continue
+                    accepted[key].append(data)
+                    events.emit("entity" if key == "entities" else "relation", agent=self.name, data=data)
+            
+            prompt_tokens = [r["prompt_tokens"] for r in results]
+            explanation = "\n".join(r["explanation"] for r in results if r["explanation"])
+            state["entities_to_create"] = entities
+            state["relations_to_create"] = relations
+            state["agent_results"]["oag_generator"] = {
+                "entities": accepted["entities"],
+                "relations": accepted["relations"],
+                "explanation": explanation,
+                "truncated": any(r["truncated"] for r in results),
+                "chunking": {**merge_stats, "chunks": len(chunks), "chunks_failed": len(failures)},
+                "prompt_stats": {"prompt_tokens": sum(prompt_tokens), "max_prompt_tokens": max(prompt_tokens)}
+            }
+            
+            with tracer.start_span("oag.validate"):
+                self._validate(state, schema)
+                self._canonicalize(state)
+            
+            state["messages"].append(Message(
+                role="assistant",
+                content=(
+                    f"已分{len(chunks)}段生成OAG图谱: "
+                    f"{len(state['entities_to_create'])}个实体, {len(state['relations_to_create'])}个关系"
+                    f"（合并重复实体{merge_stats['duplicates_merged']}个）。"
+                ),
+                name=self.name
+            ))
+            
+            logger.info(
+                "OAG chunked extraction completed",
+                session_id=state["session_id"],
+                chunks=len(chunks),
+                chunks_failed=len(failures),
+                **merge_stats
+            )
+            
+        except LLMOverloadedError:
+            raise
+            
+        except json.JSONDecodeError as e:
+            logger.error("Failed to parse OAG result", error=str(e))
+            state["error"] = f"OAG生成结果解析失败: {str(e)}"
+            
+        except Exception as e:
+            logger.error("OAG chunked extraction error", error=str(e))
+            state["error"] = str(e)
+        
+        return state
+    
+    async def _extract_chunk(self, chunk: str, schema, hints: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """抽取一个文本块，返回块内编号的 entities / relations"""
+        schema_text, _ = build_schema_prompt(
+            schema,
+            chunk,
+            entities=hints,
+            token_budget=settings.OAG_SCHEMA_TOKEN_BUDGET
+        )
+        context_text, _ = self._reference_context(chunk)
+        prompt = load_prompt("oag_generator", schema=schema_text, description=chunk, context=context_text)
+        messages = [
+            LLMMessage(role="system", content="你是一个专业的本体图谱工程师。"),
+            LLMMessage(role="user", content=prompt)
+        ]
+        
+        parser = StreamingJSONParser(("entities", "relations"))
+        async for delta in kimi_client.chat_stream(messages):
+            parser.feed(delta)
+        
+        result = parser.result()
+        if not result["complete"] and not result.get("entities"):
+            raise json.JSONDecodeError("LLM输出中没有完整的JSON对象", "", 0)
+        return {
+            "entities": result.get("entities", []),
+            "relations": result.get("relations", []),
+            "explanation": result.get("explanation", ""),
+            "truncated": not result["complete"],
+            "prompt_tokens": estimate_tokens(prompt)
+        }
+    
+    def _reference_context(self, description: str):
+        """检索与描述相关的已有图谱实体，返回 (参考文本, 统计信息)"""
+        if self.vector_store is None:
+            return build_reference_prompt([])
+        hits = self.vector_store.search(
+            description,
+            top_k=TOOL_CONFIG["search"]["top_k"],
+            min_score=settings.RAG_MIN_SCORE
+        )
+        return build_reference_prompt(hits, settings.RAG_CONTEXT_TOKEN_BUDGET)
+    
+    async def update(self, state: AgentState) -> AgentState:
+        """
+        增量更新OAG：把现有图谱交给LLM，只生成差异并在本地合并
+        
+        会话中没有上一次的OAG时退回完整生成。
+        
+        Args:
+            state: 当前状态
+            
+        Returns:
+            更新后的状态
+        """
+        existing = state.get("last_oag")
+        if not existing or not existing.get("entities"):
+            logger.info("No existing OAG in session, generating from scratch", session_id=state["session_id"])
+            return await self.run(state)
+        
+        logger.info("OAG incremental update running", session_id=state["session_id"])
+        
+        # 修改要求就是本轮输入本身
+        description = state["user_input"]
+        schema_id = state["slots"].get("schema_id", "default")
+        schema = await schema_store.get(schema_id)
+        
+        # Schema按修改要求和现有实体类型裁剪，现有图谱按相关度裁剪
+        hints = list(state.get("entities") or [])
+        hints.extend({"type": t} for t in {e.get("type") for e in existing["entities"]} if t)
+        schema_text, prompt_stats = build_schema_prompt(
+            schema,
+            description,
+            entities=hints,
+            token_budget=settings.OAG_SCHEMA_TOKEN_BUDGET
+        )
+        graph_text, graph_stats = build_graph_prompt(
+            existing,
+            description,
+            token_budget=settings.OAG_GRAPH_TOKEN_BUDGET
+        )
+        prompt_stats.update(graph_stats)
+        
+        prompt = load_prompt(
+            "oag_updater",
+            schema=schema_text,
+            graph=graph_text,
+            description=description
+        )
+        prompt_stats["prompt_tokens"] = estimate_tokens(prompt)
+        logger.info("OAG update prompt built", session_id=state["session_id"], **prompt_stats)
+        
+        messages = [
+            LLMMessage(role="system", content="你是一个专业的本体图谱工程师。"),
+            LLMMessage(role="user", content=prompt)
+        ]
+        
+        try:
+            parser = StreamingJSONParser(DIFF_KEYS)
+            async for delta in kimi_client.chat_stream(messages):
+                events.emit("token", agent=self.name, content=delta)
+                for key, data in parser.feed(delta):
+                    events.emit("diff", agent=self.name, op=key, data=data)
+            
+            result = parser.result()
+            diff = {key: result.get(key, []) for key in DIFF_KEYS}
+            if not result["complete"]:
+                if not any(diff.values()):
+                    raise json.JSONDecodeError("LLM输出中没有完整的JSON对象", "", 0)
+                logger.warning("OAG diff truncated, applying completed operations", session_id=state["session_id"])
+            
+            merged, counts = apply_oag_diff(existing, diff)
+            state["agent_results"]["oag_generator"] = {
+                "mode": "update",
+                "entities": merged["entities"],
+                "relations": merged["relations"],
+                "diff": diff,
+                "changes": counts,
+                "explanation": result.get("explanation", ""),
+                "truncated": not result["complete"],
+                "prompt_stats": prompt_stats
+            }
+            
+            # 新增部分与完整生成一样经过Schema校验和ID规范化，已有实体保持原ID
+            existing_ids = {e.get("id") for e in existing["entities"]}
+            with tracer.start_span("oag.validate"):
+                self._validate(state, schema)
+                id_map = self._canonicalize(state, keep=existing_ids)
+            
+            # 与现有ID重复或对齐到现有实体的"新增"已按更新合并，不再作为新实体
+            merged = state["agent_results"]["oag_generator"]
+            added_relations = {
+                (id_map.get(r["source"], r["source"]), r.get("type", ""), id_map.get(r["target"], r["target"]))
+                for r in diff["added_relations"] if r.get("source") and r.get("target")
+            }
+            state["entities_to_create"] = [
+                self._to_entity(e) for e in merged["entities"] if e["id"] not in existing_ids
+            ]
+            state["relations_to_create"] = [
+                self._to_relation(r) for r in merged["relations"] if relation_key(r) in added_relations
+            ]
+            
+            state["messages"].append(Message(
+                role="assistant",
+                content=(
+                    f"已更新OAG图谱: 新增{counts['added_entities']}个实体, 修改{counts['updated_entities']}个, "
+                    f"删除{counts['removed_entities']}个; 新增{counts['added_relations']}个关系, "
+                    f"删除{counts['removed_relations']}个。{result.get('explanation', '')}"
+                ),
+                name=self.name
+            ))
+            
+            logger.info("OAG incremental update completed", session_id=state["session_id"], **counts)
+            
+        except LLMOverloadedError:
+            raise
+            
+        except json.JSONDecodeError as e:
+            logger.error("Failed to parse OAG diff", error=str(e))
+            state["error"] = f"OAG更新结果解析失败: {str(e)}"
+            
+        except Exception as e:
+            logger.error("OAG incremental update error", error=str(e))
+            state["error"] = str(e)
+        
+        return state
+    
+    async def stream_items(
+        self,
+        messages: List[LLMMessage],
+        parser: StreamingJSONParser,
+        accepted: Optional[Dict[str, List[Dict[str, Any]]]] = None
+    ) -> AsyncGenerator[Union[Entity, Relation], None]:
+        """
+        流式生成实体和关系
+        
+        Args:
+            messages: 消息列表
+            parser: 增量解析器，结束后可从中读取 explanation 等字段
+            accepted: 可选，成功转换的原始元素按字段名追加到其中（格式错误被跳过的不计入）
+            
+        Yields:
+            每个闭合后的 Entity / Relation
+        """
+        async for delta in kimi_client.chat_stream(messages):
+            events.emit("token", agent=self.name, content=delta)
+            
+            for key, data in parser.feed(delta):
+                try:
+                    item = self._to_entity(data) if key == "entities" else self._to_relation(data)
+                except KeyError as e:
+                    logger.warning("Skipping malformed OAG item", kind=key, missing=str(e))
+                    continue
+                
+                if accepted is not None:
+                    accepted.setdefault(key, []).append(data)
+                events.emit("entity" if key == "entities" else "relation", agent=self.name, data=data)
+                yield item
+    
+    def _validate(self, state: AgentState, schema):
+        """按Schema本地校验生成结果，开启自动修正时先修正再校验"""
+        if not settings.OAG_SCHEMA_VALIDATION:
+            return
+        
+        result = state["agent_results"]["oag_generator"]
+        strict = TOOL_CONFIG["schema_validator"]["strict_mode"]
+        if settings.OAG_SCHEMA_AUTO_REPAIR:
+            oag, report = repair_oag(schema, result, strict)
+            result["entities"] = oag["entities"]
+            result["relations"] = oag["relations"]
+            state["entities_to_create"] = [self._to_entity(e) for e in oag["entities"]]
+            state["relations_to_create"] = [self._to_relation(r) for r in oag["relations"]]
+        else:
+            report = validate_oag(schema, result, strict)
+        result["validation"] = report
+        
+        events.emit("validated", agent=self.name, valid=report["valid"], **report["stats"])
+        logger.info(
+            "OAG validated",
+            session_id=state["session_id"],
+            valid=report["valid"],
+            repairs=len(report.get("repairs", [])),
+            **report["stats"]
+        )
+    
+    def _canonicalize(self, state: AgentState, keep: Optional[Set[str]] = None) -> Dict[str, str]:
+        """
+        实体对齐到已有图谱或生成稳定ID，合并重复实体，并同步改写关系
+        
+        Args:
+            state: 当前状态
+            keep: 保持原ID的实体（增量更新时会话中已有的实体），只规范化其余实体
+        
+        Returns:
+            原ID -> 规范ID（只含发生变化的）
+        """
+        if self.entity_index is None:
+            return {}
+        
+        result = state["agent_results"]["oag_generator"]
+        if keep:
+            oag, stats = self._canonicalize_new(result, keep)
+        else:
+            oag, stats = self.entity_index.canonicalize(result)
+        id_map = stats.pop("id_map")
+        result["entities"] = oag["entities"]
+        result["relations"] = oag["relations"]
+        result["canonicalization"] = stats
+        state["entities_to_create"] = [self._to_entity(e) for e in oag["entities"]]
+        state["relations_to_create"] = [self._to_relation(r) for r in oag["relations"]]
+        
+        # 流式输出的实体使用的是LLM生成的ID，客户端按映射改写
+        events.emit("canonicalized", agent=self.name, id_map=id_map, **stats)
+        logger.info("OAG entities canonicalized", session_id=state["session_id"], **stats)
+        return id_map
+    
+    def _canonicalize_new(self, oag: Dict[str, Any], keep: Set[str]):
+        """只规范化 keep 以外的实体，关系端点按映射改写后去重"""
+        kept = [e for e in oag["entities"] if e.get("id") in keep]
+        canonical, stats = self.entity_index.canonicalize(
+            {"entities": [e for e in oag["entities"] if e.get("id") not in keep], "relations": []}
+        )
+        id_map = stats["id_map"]
+        
+        kept_ids = {e["id"] for e in kept}
+        entities = kept + [e for e in canonical["entities"] if e["id"] not in kept_ids]
+        relations: Dict[str, Dict[str, Any]] = {}
+        for relation in oag["relations"]:
+            source = id_map.get(relation["source"], relation["source"])
+            target = id_map.get(relation["target"], relation["target"])
+            rid = relation_id(source, relation["type"], target)
+            if rid in relations:
+                continue
+            relations[rid] = {**relation, "id": rid, "source": source, "target": target}
+        return {"entities": entities, "relations": list(relations.values())}, stats
+    
+    @staticmethod
+    def _to_entity(data: Dict[str, Any]) -> Entity:
+        return Entity(
+            id=data["id"],
+            type=data["type"],
+            # 缺少名称不算格式错误，开启自动修正时由校验补全
+            label=data.get("label", ""),
+            properties=data.get("properties", {})
+        )
+    
+    @staticmethod
+    def _to_relation(data: Dict[str, Any]) -> Relation:
+        return Relation(
+            id=relation_id(data["source"], data["type"], data["target"]),
+            source=data["source"],
+            target=data["target"],
+            type=data["type"],
+            label=data.get("label", ""),
+            properties=data.get("properties", {})
+        )
@@ -24,18 +24,88 @@ class Settings(BaseSettings):
     KIMI_MAX_TOKENS: int = 8192
     KIMI_TEMPERATURE: float = 0.7
     KIMI_REQUEST_TIMEOUT: int = 60
+    KIMI_CONNECT_TIMEOUT: float = 10.0
+    
+    # HTTP 连接池 (chat / chat_stream / function_call 共享)
+    KIMI_POOL_MAX_CONNECTIONS: int = 100
+    KIMI_POOL_MAX_KEEPALIVE: int = 20
+    KIMI_POOL_KEEPALIVE_EXPIRY: float = 30.0  # 秒
+    KIMI_HTTP2: bool = False  # 需要安装 h2
+    
+    # LLM 单价 (每1K token，用于 /metrics 中的费用估算，0 表示不统计)
+    KIMI_PROMPT_PRICE_PER_1K: float = 0.0
+    KIMI_COMPLETION_PRICE_PER_1K: float = 0.0
     
     # 速率限制
     KIMI_RATE_LIMIT_PER_MINUTE: int = 60
+    KIMI_TOKEN_LIMIT_PER_MINUTE: int = 0  # 0 表示不限制
+    KIMI_MAX_CONCURRENCY: int = 8
+    KIMI_MAX_QUEUE_WAIT: float = 30.0  # 排队超过该秒数返回503
+    
+    # 失败重试与对冲请求
+    KIMI_MAX_RETRIES: int = 3
+    KIMI_RETRY_BASE_DELAY: float = 0.5  # 秒，指数退避基准
+    KIMI_RETRY_MAX_DELAY: float = 8.0  # 秒，单次退避上限
+    KIMI_HEDGE_ENABLED: bool = False
+    KIMI_HEDGE_QUANTILE: float = 0.95  # 超过该分位延迟仍未返回时发起对冲请求
+    KIMI_HEDGE_MIN_DELAY: float = 2.0  # 秒
+    
+    # LLM 响应缓存 (相同请求直接返回缓存结果)
+    LLM_CACHE_ENABLED: bool = False
+    LLM_CACHE_TTL: int = 3600  # 1小时
+    LLM_CACHE_MAX_ENTRIES: int = 1024
+    LLM_CACHE_PATH: str = ""  # SQLite文件路径，为空则只使用内存
+    LLM_CACHE_DISK_MAX_ENTRIES: int = 10000
+    
+    # LLM 流量录制/回放 (离线复现真实负载做性能对比)
+    LLM_CASSETTE_MODE: str = "off"  # off / record / replay
+    LLM_CASSETTE_PATH: str = "./data/llm_cassette.jsonl.gz"
+    LLM_CASSETTE_REPLAY_SPEED: float = 1.0  # 回放速度倍数，1为原始时序，0为不等待
+    
+    # 相同LLM请求并发合并 (single-flight)
+    LLM_SINGLE_FLIGHT_ENABLED: bool = True
     
     # Vector Store 配置
     VECTOR_STORE_PATH: str = "./data/vectors"
     EMBEDDING_DIMENSION: int = 1536
     
+    # 已有图谱检索 (生成时检索相关实体写入Prompt，检索条数见 TOOL_CONFIG["search"]["top_k"])
+    RAG_ENABLED: bool = False  # 开启后索引写入 VECTOR_STORE_PATH/graphs
+    RAG_CORPUS_PATH: str = "../data"  # 启动时增量导入该目录下的图谱JSON，为空则不导入
+    RAG_MIN_SCORE: float = 0.2  # 最小相似度，默认哈希嵌入下相关实体的相似度多在 0.2~0.5
+    RAG_CONTEXT_TOKEN_BUDGET: int = 600  # Prompt中参考实体部分的token预算，<=0 时不裁剪
+    
+    # 意图快速路由 (规则/本地模型高置信命中时跳过NLU LLM调用)
+    INTENT_ROUTER_ENABLED: bool = True
+    INTENT_ROUTER_MIN_CONFIDENCE: float = 0.9
+    INTENT_ROUTER_MODEL_PATH: str = ""  # 本地分类模型(.npz)，为空则只使用规则
+    INTENT_ROUTER_LOG_PATH: str = ""  # 记录LLM意图解析结果用于训练模型，为空则不记录
+    
+    # NLU 语义缓存 (近似表述复用意图解析结果)
+    NLU_SEMANTIC_CACHE_ENABLED: bool = False
+    NLU_SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    NLU_SEMANTIC_CACHE_MIN_CONFIDENCE: float = 0.8  # 低置信度结果不写入缓存
+    NLU_SEMANTIC_CACHE_MAX_ENTRIES: int = 5000
+    NLU_SEMANTIC_CACHE_PERSIST_INTERVAL: int = 300  # 秒
+    
     # Redis 配置 (用于对话记忆)
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_TTL: int = 3600  # 1小时
     
+    # 会话存储
+    SESSION_STORE: str = "memory"  # memory / redis（使用 REDIS_URL，会话按 REDIS_TTL 过期）
+    SESSION_STORE_MAX_SESSIONS: int = 10000  # 进程内存储最多保留的会话数
+    
+    # 指标
+    METRICS_ENABLED: bool = True  # 暴露 /metrics
+    DEBUG_TIMING_HEADER: str = "X-Debug-Timing"  # 请求带该头时响应中附带耗时明细
+    
+    # 链路追踪
+    TRACING_EXPORTER: str = "none"  # none / memory（可通过 /api/v1/traces 查询）/ file
+    TRACING_SAMPLE_RATE: float = 1.0  # 根span采样比例，上游带 traceparent 时沿用其采样标记
+    TRACING_FILE_PATH: str = "./data/traces.jsonl"
+    TRACING_MAX_TRACES: int = 1000  # memory 导出器保留的trace数
+    
     # 日志配置
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "json"
@@ -43,6 +113,49 @@ class Settings(BaseSettings):
     # 主后端服务地址
     BACKEND_API_URL: str = "http://localhost:8090/api/v1"
     
+    # Schema 缓存
+    SCHEMA_CACHE_TTL: int = 300  # 秒，期间直接使用缓存
+    SCHEMA_CACHE_STALE_TTL: int = 3600  # 秒，过期后该时长内先返回旧值并后台刷新
+    SCHEMA_REFRESH_INTERVAL: int = 0  # 秒，>0 时后台定期刷新已缓存的Schema
+    SCHEMA_REQUEST_TIMEOUT: float = 5.0
+    
+    # OAG Prompt 构建
+    OAG_SCHEMA_TOKEN_BUDGET: int = 3000  # Prompt中Schema部分的token预算，<=0 时不裁剪
+    OAG_GRAPH_TOKEN_BUDGET: int = 4000  # 增量更新时Prompt中现有图谱部分的token预算，<=0 时不裁剪
+    
+    # 长文档分块抽取
+    OAG_CHUNK_THRESHOLD_TOKENS: int = 3000  # 描述超过该token数时分块抽取，<=0 时不分块
+    OAG_CHUNK_MAX_TOKENS: int = 2000  # 每块的token上限
+    OAG_CHUNK_OVERLAP_TOKENS: int = 200  # 相邻块重叠的token数
+    OAG_CHUNK_CONCURRENCY: int = 4
+    
+    # OAG Schema 校验 (本地校验，严格模式见 TOOL_CONFIG["schema_validator"])
+    OAG_SCHEMA_VALIDATION: bool = True
+    OAG_SCHEMA_AUTO_REPAIR: bool = True  # 校验前自动修正类型、关系方向，删除无法修正的条目
+    
+    # 实体规范化 (生成的实体对齐到已有图谱，统一ID)
+    ENTITY_INDEX_ENABLED: bool = True
+    ENTITY_INDEX_CORPUS_PATH: str = "../data/oag"  # 已有OAG图谱目录，为空则只对齐本进程生成的实体
+    ENTITY_INDEX_VECTOR_THRESHOLD: float = 0.93  # 名称向量相似度匹配阈值，<=0 时只做精确匹配
+    ENTITY_INDEX_LEARNED_MAX_ENTRIES: int = 10000  # 运行中生成的实体最多登记的条目数（LRU淘汰），0 为不登记
+    
+    # OAG 批量生成
+    OAG_BATCH_CONCURRENCY: int = 4  # 默认并发数
+    OAG_BATCH_MAX_CONCURRENCY: int = 16  # 请求可指定的最大并发数
+    OAG_BATCH_MAX_ITEMS: int = 1000  # 单次批量请求的最大条目数
+    
+    # 异步任务
+    JOB_WORKERS: int = 4
+    JOB_QUEUE_SIZE: int = 100  # 最多排队的任务数，超出时提交返回503
+    JOB_TTL: int = 3600  # 秒，完成的任务结果保留时长
+    JOB_WEBHOOK_TIMEOUT: float = 10.0
+    JOB_WEBHOOK_ALLOWED_HOSTS: str = ""  # 允许的回调主机，逗号分隔；为空时只允许解析到公网地址的主机
+    
+    # LangGraph 检查点
+    GRAPH_CHECKPOINT_ENABLED: bool = True
+    GRAPH_CHECKPOINT_MAX_THREADS: int = 1000  # 最多保留检查点的会话数
+    GRAPH_CHECKPOINT_PER_THREAD: int = 20  # 每个会话保留的快照数
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -1,3 +1,32 @@
 from .llm_client import kimi_client, Message, LLMResponse
+from .cache import ResponseCache
+from .cassette import Cassette, CassetteMissError, CassetteTransport
+from .embeddings import Embedder, HashingEmbedder, default_embedder
+from .entity_index import EntityIndex, normalize_label, relation_id, stable_entity_id
+from .job_queue import CallbackURLError, Job, JobQueue, JobQueueFullError, JobStatus
+from .json_stream import StreamingJSONParser
+from .metrics import MetricsRegistry, RequestTimings, metrics
+from .rate_limiter import LLMGovernor, LLMOverloadedError
+from .retry import Hedger, RetryPolicy
+from .schema_validator import compile_schema, repair_oag, validate_oag
+from .semantic_cache import SemanticCache
+from .serialization import JSON_BACKEND, dumps, loads
+from .session_store import MemorySessionStore, RedisSessionStore, SessionData, build_session_store
+from .singleflight import SingleFlight
+from .tracing import FileExporter, MemoryExporter, Tracer, current_span, tracer
+from .vector_store import VectorStore, graph_documents
 
-__all__ = ['kimi_client', 'Message', 'LLMResponse']
+__all__ = [
+    'kimi_client', 'Message', 'LLMResponse',
+    'ResponseCache', 'Cassette', 'CassetteMissError', 'CassetteTransport', 'SemanticCache', 'SingleFlight', 'StreamingJSONParser',
+    'LLMGovernor', 'LLMOverloadedError', 'RetryPolicy', 'Hedger',
+    'Embedder', 'HashingEmbedder', 'default_embedder',
+    'EntityIndex', 'normalize_label', 'relation_id', 'stable_entity_id',
+    'SessionData', 'MemorySessionStore', 'RedisSessionStore', 'build_session_store',
+    'CallbackURLError', 'Job', 'JobQueue', 'JobQueueFullError', 'JobStatus',
+    'compile_schema', 'validate_oag', 'repair_oag',
+    'VectorStore', 'graph_documents',
+    'MetricsRegistry', 'RequestTimings', 'metrics',
+    'JSON_BACKEND', 'dumps', 'loads',
+    'Tracer', 'MemoryExporter', 'FileExporter', 'current_span', 'tracer',
+]
@@ -0,0 +1,182 @@
+"""
+LLM 响应缓存 - 按请求内容寻址，内存LRU + 可选SQLite磁盘两级存储
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import structlog
+
+logger = structlog.get_logger()
+
+# 参与缓存键计算时忽略的字段（不影响响应内容）
+_KEY_EXCLUDED_FIELDS = ("stream",)
+
+
+class ResponseCache:
+    """LLM响应缓存"""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: int = 3600,
+        path: Optional[str] = None,
+        disk_max_entries: int = 10000
+    ):
+        """
+        Args:
+            max_entries: 内存层最大条目数
+            ttl: 默认过期时间（秒）
+            path: SQLite文件路径，为空时只使用内存层
+            disk_max_entries: 磁盘层最大条目数
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if path:
+            self._open_disk(path)
+
+        self._stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """
+        根据请求载荷计算缓存键
+
+        Args:
+            payload: chat/completions 请求体（model, messages, temperature, tools, max_tokens...）
+
+        Returns:
+            SHA-256 十六进制摘要
+        """
+        material = {k: v for k, v in payload.items() if k not in _KEY_EXCLUDED_FIELDS}
+        encoded = json.dumps(material, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存，未命中或已过期返回None"""
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return value
+            del self._memory[key]
+            self._stats["expired"] += 1
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._disk_get, key, now)
+            if row is not None:
+                expires_at, value = row
+                self._remember(key, expires_at, value)
+                self._stats["hits"] += 1
+                self._stats["disk_hits"] += 1
+                return value
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: Optional[int] = None):
+        """写入缓存"""
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl)
+        self._remember(key, expires_at, value)
+        self._stats["sets"] += 1
+
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, expires_at, value)
+
+    async def clear(self):
+        """清空所有缓存"""
+        self._memory.clear()
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_execute, "DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率等统计信息"""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_enabled": self._db is not None,
+        }
+
+    def _remember(self, key: str, expires_at: float, value: Dict[str, Any]):
+        """写入内存层并执行LRU淘汰"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    # ============== 磁盘层 ==============
+
+    def _open_disk(self, path: str):
+        db_path = Path(path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created_at)")
+        self._db.commit()
+        logger.info("LLM response cache disk tier opened", path=str(db_path))
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, Dict[str, Any]]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._db.commit()
+                self._stats["expired"] += 1
+                return None
+        return row[1], json.loads(row[0])
+
+    def _disk_set(self, key: str, expires_at: float, value: Dict[str, Any]):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at, time.time())
+            )
+            # 超出容量时删除最早写入的条目
+            self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,)
+            )
+            self._db.commit()
+
+    def _disk_execute(self, sql: str):
+        with self._db_lock:
+            self._db.execute(sql)
+            self._db.commit()
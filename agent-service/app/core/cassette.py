@@ -0,0 +1,262 @@
+"""
+LLM 流量录制/回放 - 在HTTP传输层录制上游请求与响应，离线按原始（或加速的）时序回放
+
+- record：真实请求照常发出，响应体及各数据块到达的时间偏移写入 gzip 压缩的 JSON Lines 文件；
+  同时记录每次图运行的用户输入，作为回放的工作负载
+- replay：不访问网络，按请求内容（同响应缓存键）查找录制的响应并按时序逐块返回；
+  同一请求录制了多次时依次返回，用完后循环
+- 作为httpx传输层接入，限流、重试、流式解析、耗时统计等上层逻辑与真实请求完全一致
+
+条目格式:
+    {"type": "llm", "key", "stream", "request", "status", "headers", "ttfb", "body", "chunks": [[偏移秒, 结束字节], ...]}
+    {"type": "input", "session_id", "user_input"}
+"""
+import asyncio
+import gzip
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+import structlog
+
+from app.config import settings
+from app.core.cache import ResponseCache
+
+logger = structlog.get_logger()
+
+# 回放时保留的响应头，其余的（如 content-length、content-encoding）由回放内容决定
+_KEPT_HEADERS = ("content-type", "retry-after")
+
+
+class CassetteMissError(Exception):
+    """回放模式下请求没有对应的录制"""
+
+
+class Cassette:
+    """录制文件"""
+
+    def __init__(self, path: str, mode: str):
+        """
+        Args:
+            path: 录制文件路径（gzip压缩的JSON Lines）
+            mode: record / replay
+        """
+        self.path = Path(path)
+        self.mode = mode
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursors: Dict[str, int] = {}
+        self.inputs: List[Dict[str, Any]] = []
+        self._file = None
+        self._lock = threading.Lock()
+        self._stats = {"recorded": 0, "replayed": 0, "misses": 0}
+
+        if mode == "replay":
+            self._load()
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = gzip.open(self.path, "at", encoding="utf-8")
+
+    @staticmethod
+    def key(payload: Dict[str, Any]) -> str:
+        """请求键：与响应缓存相同的内容寻址，另区分流式与非流式"""
+        return f"{ResponseCache.make_key(payload)}:{'stream' if payload.get('stream') else 'chat'}"
+
+    def next(self, key: str) -> Optional[Dict[str, Any]]:
+        """取该请求的下一条录制"""
+        entries = self._entries.get(key)
+        if not entries:
+            self._stats["misses"] += 1
+            return None
+        cursor = self._cursors.get(key, 0)
+        self._cursors[key] = cursor + 1
+        self._stats["replayed"] += 1
+        return entries[cursor % len(entries)]
+
+    def record(self, entry: Dict[str, Any]):
+        """追加一条LLM录制"""
+        self._write({"type": "llm", **entry})
+        self._stats["recorded"] += 1
+
+    def record_input(self, session_id: str, user_input: str):
+        """追加一次图运行的用户输入"""
+        self._write({"type": "input", "session_id": session_id, "user_input": user_input})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": str(self.path),
+            "requests": sum(len(entries) for entries in self._entries.values()),
+            "inputs": len(self.inputs),
+            **self._stats
+        }
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, entry: Dict[str, Any]):
+        if self._file is None:
+            return
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            # 每条落盘，进程异常退出时已录制的部分仍可读
+            self._file.flush()
+
+    def _load(self):
+        if not self.path.exists():
+            logger.warning("Cassette not found, every request will miss", path=str(self.path))
+            return
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if entry.get("type") == "input":
+                        self.inputs.append(entry)
+                    else:
+                        self._entries.setdefault(entry["key"], []).append(entry)
+        except (OSError, EOFError, ValueError) as e:
+            # 录制中途退出时文件尾部可能不完整，保留已读到的条目
+            logger.warning("Cassette truncated, using entries read so far", path=str(self.path), error=str(e))
+        logger.info("Cassette loaded", path=str(self.path), requests=self.stats()["requests"], inputs=len(self.inputs))
+
+
+class _RecordingStream(httpx.AsyncByteStream):
+    """
+    透传上游响应体，记录每块到达的时间偏移，完整读取后写入录制
+
+    SSE读取方在收到 [DONE] 后即关闭响应，此时也视为完整；
+    其他情况下调用方提前关闭的响应不录制
+    """
+
+    def __init__(self, inner: httpx.AsyncByteStream, started: float, on_complete):
+        self._inner = inner
+        self._started = started
+        self._on_complete = on_complete
+        self._body = bytearray()
+        self._chunks: List[List[float]] = []
+        self._recorded = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._inner:
+            self._body.extend(chunk)
+            self._chunks.append([round(time.perf_counter() - self._started, 4), len(self._body)])
+            yield chunk
+        self._complete()
+
+    async def aclose(self):
+        if self._body.rstrip().endswith(b"data: [DONE]"):
+            self._complete()
+        await self._inner.aclose()
+
+    def _complete(self):
+        if not self._recorded:
+            self._recorded = True
+            self._on_complete(bytes(self._body), self._chunks)
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+    """按录制的时间偏移逐块返回响应体"""
+
+    def __init__(self, entry: Dict[str, Any], speed: float):
+        self._body = entry["body"].encode("utf-8")
+        self._chunks = entry["chunks"]
+        self._ttfb = entry["ttfb"]
+        self._speed = speed
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        previous_offset = self._ttfb
+        previous_end = 0
+        for offset, end in self._chunks:
+            if self._speed > 0 and offset > previous_offset:
+                await asyncio.sleep((offset - previous_offset) / self._speed)
+            previous_offset = offset
+            yield self._body[previous_end:end]
+            previous_end = end
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """
+    录制/回放传输层
+
+    Args:
+        cassette: 录制文件
+        inner: 录制模式下实际发出请求的传输层
+        speed: 回放速度倍数，1为原始时序，0为不等待
+    """
+
+    def __init__(self, cassette: Cassette, inner: Optional[httpx.AsyncBaseTransport] = None, speed: float = 1.0):
+        self.cassette = cassette
+        self.inner = inner
+        self.speed = speed
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content or b"{}")
+        key = Cassette.key(payload)
+        if self.cassette.mode == "replay":
+            return await self._replay(request, key)
+        return await self._record(request, key, payload)
+
+    async def _replay(self, request: httpx.Request, key: str) -> httpx.Response:
+        entry = self.cassette.next(key)
+        if entry is None:
+            raise CassetteMissError(f"录制中没有该请求: {key}")
+        if self.speed > 0 and entry["ttfb"] > 0:
+            await asyncio.sleep(entry["ttfb"] / self.speed)
+        return httpx.Response(
+            entry["status"],
+            headers=entry["headers"],
+            stream=_ReplayStream(entry, self.speed),
+            request=request
+        )
+
+    async def _record(self, request: httpx.Request, key: str, payload: Dict[str, Any]) -> httpx.Response:
+        # 录制未压缩的响应体，回放时不依赖解码
+        request.headers["Accept-Encoding"] = "identity"
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        ttfb = round(time.perf_counter() - started, 4)
+        headers = {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers}
+
+        def on_complete(body: bytes, chunks: List[List[float]]):
+            self.cassette.record({
+                "key": key,
+                "stream": bool(payload.get("stream")),
+                "request": payload,
+                "status": response.status_code,
+                "headers": headers,
+                "ttfb": ttfb,
+                "body": body.decode("utf-8", errors="replace"),
+                "chunks": chunks
+            })
+
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, started, on_complete),
+            extensions=response.extensions,
+            request=request
+        )
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+
+def build_cassette(mode: str, path: str) -> Optional[Cassette]:
+    """按配置创建录制文件，未启用时返回None"""
+    if mode in ("record", "replay"):
+        return Cassette(path, mode)
+    if mode not in ("", "off"):
+        logger.warning("Unknown cassette mode, recording disabled", mode=mode)
+    return None
+
+
+# 全局录制文件（LLM_CASSETTE_MODE=off 时为None）
+cassette = build_cassette(settings.LLM_CASSETTE_MODE, settings.LLM_CASSETTE_PATH)
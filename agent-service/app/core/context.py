@@ -0,0 +1,12 @@
+"""
+请求上下文 - 在异步调用链中传递当前会话信息
+"""
+from contextvars import ContextVar
+from typing import Optional
+
+
+# 当前请求所属会话ID，由工作流入口设置
+current_session_id: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
+
+# 当前执行的Agent图节点，用于按Agent统计token用量
+current_agent: ContextVar[Optional[str]] = ContextVar("current_agent", default=None)
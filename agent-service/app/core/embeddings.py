@@ -0,0 +1,73 @@
+"""
+本地文本向量化 - 无需调用外部模型的嵌入函数
+
+默认实现为字符 n-gram 特征哈希：对中文短文本足够区分近似表述，
+完全离线、确定性（跨进程稳定），可通过 Embedder 协议替换为真实模型。
+"""
+import re
+import zlib
+from typing import List, Protocol, Sequence
+
+import numpy as np
+
+from app.config import settings
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+class Embedder(Protocol):
+    """
+    嵌入函数协议：输入文本列表，输出 (n, dimension) 的 float32 单位向量
+
+    调用方只依赖 dimension 与 embed，单条文本用 embed([text])
+    """
+
+    dimension: int
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbedder:
+    """字符 n-gram 哈希嵌入"""
+
+    def __init__(self, dimension: int = None, ngram_range: tuple = (1, 3)):
+        self.dimension = dimension or settings.EMBEDDING_DIMENSION
+        self.ngram_range = ngram_range
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        批量向量化
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            L2归一化后的向量矩阵，内积即余弦相似度
+        """
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for gram in self._ngrams(text):
+                h = zlib.crc32(gram.encode("utf-8"))
+                # 最高位决定符号，降低哈希冲突带来的偏差
+                vectors[row, h % self.dimension] += 1.0 if h & 0x80000000 else -1.0
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def embed_one(self, text: str) -> np.ndarray:
+        """单条文本向量化，返回 (1, dimension)"""
+        return self.embed([text])
+
+    def _ngrams(self, text: str) -> List[str]:
+        text = _SPACE_RE.sub("", text.lower())
+        low, high = self.ngram_range
+        grams = []
+        for n in range(low, high + 1):
+            grams.extend(text[i:i + n] for i in range(len(text) - n + 1))
+        return grams
+
+
+# 默认嵌入函数
+default_embedder = HashingEmbedder()
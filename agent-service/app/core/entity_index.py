@@ -0,0 +1,305 @@
+"""
+实体规范化索引 - 生成的实体与已有图谱实体对齐，统一ID
+
+- 精确匹配：按「类型 + 规范化名称」哈希，O(1) 查找
+- 近似匹配（可选）：同类型实体名称向量的 faiss 内积最近邻，相似度达到阈值视为同一实体
+- 未匹配的实体按「类型 + 规范化名称」生成稳定ID，同一实体跨会话、跨进程ID不变；
+  关系ID同样由三元组哈希生成，不会因ID中含下划线而冲突
+- 已有图谱（种子）常驻；运行中生成并登记的实体单独存放，按LRU限制条目数
+"""
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+import structlog
+
+from app.core.embeddings import Embedder, default_embedder
+
+logger = structlog.get_logger()
+
+_NORMALIZE_RE = re.compile(r"[\s\-_·•:：,，.。()（）\[\]【】\"'“”‘’]+")
+_ID_PREFIX_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_label(label: Any) -> str:
+    """名称规范化：小写，去掉空白和常见标点"""
+    return _NORMALIZE_RE.sub("", str(label or "")).lower()
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def stable_entity_id(entity_type: str, label: Any) -> str:
+    """由类型和规范化名称生成稳定ID，如 domain_3fa2c1d9e0"""
+    prefix = _ID_PREFIX_RE.sub("", entity_type.lower()) or "entity"
+    return f"{prefix}_{_digest(entity_type, normalize_label(label))[:10]}"
+
+
+def relation_id(source: str, relation_type: str, target: str) -> str:
+    """由关系三元组生成稳定ID"""
+    return f"rel_{_digest(source, relation_type, target)[:12]}"
+
+
+class _EntityTier:
+    """一层已知实体：「类型 + 规范化名称」-> ID，以及每个类型的名称向量索引"""
+
+    def __init__(self, dimension: int, max_entries: int = 0):
+        """
+        Args:
+            dimension: 名称向量维度
+            max_entries: 最大条目数，超出后淘汰最久未命中的条目；0 为不限
+        """
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._by_key: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        # 每个类型一个向量索引，行号对应 _vector_keys 中的名称键
+        self._vectors: Dict[str, faiss.IndexFlatIP] = {}
+        self._vector_keys: Dict[str, List[Tuple[str, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self._by_key
+
+    @property
+    def types(self) -> set:
+        """已建立向量索引的实体类型"""
+        return set(self._vectors)
+
+    def add(self, items: List[Tuple[Tuple[str, str], str, str]], embedder: Optional[Embedder]):
+        """
+        登记新条目（调用方保证名称键未登记）
+
+        Args:
+            items: (名称键, 实体ID, 名称)
+            embedder: 为None时不建立向量索引
+        """
+        if self.max_entries and len(self._by_key) + len(items) > self.max_entries:
+            overflow = len(self._by_key) + len(items) - self.max_entries
+            # 批量淘汰，避免每次登记都重建向量索引
+            self._evict(min(len(self._by_key), max(overflow, self.max_entries // 10)))
+            items = items[-self.max_entries:]
+
+        by_type: Dict[str, List[Tuple[Tuple[str, str], str]]] = {}
+        for key, entity_id, label in items:
+            self._by_key[key] = entity_id
+            by_type.setdefault(key[0], []).append((key, label))
+
+        if embedder is not None:
+            for entity_type, entries in by_type.items():
+                index = self._vectors.get(entity_type)
+                if index is None:
+                    index = self._vectors[entity_type] = faiss.IndexFlatIP(self.dimension)
+                index.add(embedder.embed([label for _, label in entries]))
+                self._vector_keys.setdefault(entity_type, []).extend(key for key, _ in entries)
+
+    def get(self, key: Tuple[str, str]) -> Optional[str]:
+        entity_id = self._by_key.get(key)
+        if entity_id is not None and self.max_entries:
+            self._by_key.move_to_end(key)
+        return entity_id
+
+    def nearest(self, entity_type: str, vector: np.ndarray) -> Optional[Tuple[Tuple[str, str], float]]:
+        """同类型中名称向量最接近的实体 (名称键, 相似度)，不计为命中"""
+        index = self._vectors.get(entity_type)
+        if index is None or not index.ntotal:
+            return None
+        scores, rows = index.search(vector, 1)
+        score, row = float(scores[0][0]), int(rows[0][0])
+        if row < 0:
+            return None
+        return self._vector_keys[entity_type][row], score
+
+    def _evict(self, count: int):
+        """淘汰最久未命中的 count 个条目，并从向量索引中删除对应行"""
+        evicted = set()
+        for _ in range(count):
+            key, _ = self._by_key.popitem(last=False)
+            evicted.add(key)
+        for entity_type in {key[0] for key in evicted}:
+            keys = self._vector_keys.get(entity_type)
+            if not keys:
+                continue
+            rows = np.array([row for row, key in enumerate(keys) if key in evicted], dtype=np.int64)
+            if len(rows):
+                # IndexFlat 删除后保持剩余行的相对顺序，与过滤后的 keys 对齐
+                self._vectors[entity_type].remove_ids(rows)
+                self._vector_keys[entity_type] = [key for key in keys if key not in evicted]
+        self.evictions += count
+
+
+class EntityIndex:
+    """已知实体索引"""
+
+    def __init__(self, vector_threshold: float = 0.93, embedder: Embedder = None, max_learned: int = 10000):
+        """
+        Args:
+            vector_threshold: 近似匹配所需的最小余弦相似度，<=0 时只做精确匹配
+            embedder: 名称嵌入函数
+            max_learned: 运行中登记的实体（非种子）最多保留的条目数，按LRU淘汰；0 为不登记
+        """
+        self.vector_threshold = vector_threshold
+        self.embedder = embedder or default_embedder
+
+        # 种子：启动时载入的已有图谱，常驻
+        self._seed = _EntityTier(self.embedder.dimension)
+        # 运行中生成的实体，有上限
+        self._learned = _EntityTier(self.embedder.dimension, max_entries=max_learned)
+        self._stats = {"exact_hits": 0, "vector_hits": 0, "misses": 0}
+
+    def __len__(self) -> int:
+        return len(self._seed) + len(self._learned)
+
+    def add_many(self, entities: Iterable[Dict[str, Any]]) -> int:
+        """
+        批量登记已有图谱的实体（常驻），已登记的名称保留先登记的ID
+
+        Args:
+            entities: 含 id / type / label 的实体
+
+        Returns:
+            新登记的实体数
+        """
+        return self._add(self._seed, entities)
+
+    def _add(self, tier: _EntityTier, entities: Iterable[Dict[str, Any]]) -> int:
+        pending: Dict[Tuple[str, str], Tuple[Tuple[str, str], str, str]] = {}
+        for entity in entities:
+            entity_id, entity_type = entity.get("id"), entity.get("type")
+            if not entity_id or not entity_type:
+                continue
+            label = str(entity.get("label") or entity_id)
+            key = (entity_type, normalize_label(label))
+            if key in self._seed or key in self._learned or key in pending:
+                continue
+            pending[key] = (key, entity_id, label)
+
+        tier.add(list(pending.values()), self.embedder if self.vector_threshold > 0 else None)
+        return len(pending)
+
+    def add_graph(self, graph: Dict[str, Any]) -> int:
+        """登记一个图谱的实体，兼容 entities（Agent输出）和 nodes（后端存储）两种格式"""
+        return self.add_many(graph.get("entities") or graph.get("nodes") or [])
+
+    def load_directory(self, path: str) -> int:
+        """登记目录下所有OAG JSON文件的实体，无法解析的文件跳过"""
+        directory = Path(path)
+        if not directory.is_dir():
+            logger.warning("Entity index corpus not found", path=path)
+            return 0
+
+        added = 0
+        for file in sorted(directory.glob("*.json")):
+            try:
+                with open(file, "r", encoding="utf-8") as f:
+                    added += self.add_graph(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable OAG file", path=str(file), error=str(e))
+        logger.info("Entity index loaded", path=path, entities=len(self), added=added)
+        return added
+
+    def match(self, entity_type: str, label: Any) -> Optional[Tuple[str, float]]:
+        """
+        查找已知的同一实体
+
+        Returns:
+            (实体ID, 相似度)，精确匹配的相似度为1.0；未找到返回None
+        """
+        key = (entity_type, normalize_label(label))
+        entity_id = self._seed.get(key) or self._learned.get(key)
+        if entity_id is not None:
+            self._stats["exact_hits"] += 1
+            return entity_id, 1.0
+
+        if self.vector_threshold > 0 and (self._seed.types or self._learned.types):
+            vector = self.embedder.embed([str(label)])
+            best = None
+            for tier in (self._seed, self._learned):
+                found = tier.nearest(entity_type, vector)
+                if found is not None and found[1] >= self.vector_threshold and (best is None or found[1] > best[2]):
+                    best = (tier, found[0], found[1])
+            if best is not None:
+                tier, key, score = best
+                self._stats["vector_hits"] += 1
+                return tier.get(key), score
+
+        self._stats["misses"] += 1
+        return None
+
+    def canonicalize(self, oag: Dict[str, Any], register: bool = True) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        规范化生成的OAG：实体对齐到已知ID或生成稳定ID，重写关系端点与关系ID，
+        合并重复实体与重复关系。不修改传入的 oag
+
+        Args:
+            oag: 生成的OAG（entities/relations）
+            register: 是否把新实体登记到索引（有上限，按LRU淘汰），供后续生成对齐
+
+        Returns:
+            (规范化后的OAG, 统计信息，含 id_map: 原ID -> 规范ID)
+        """
+        entities: Dict[str, Dict[str, Any]] = {}
+        id_map: Dict[str, str] = {}
+        stats = {"matched": 0, "new": 0, "duplicates_merged": 0, "relations_dropped": 0}
+
+        for entity in oag.get("entities", []):
+            local_id, entity_type = entity.get("id"), entity.get("type")
+            if not local_id or not entity_type:
+                continue
+            label = entity.get("label") or local_id
+            found = self.match(entity_type, label)
+            if found is not None:
+                canonical = found[0]
+                stats["matched"] += 1
+            else:
+                canonical = stable_entity_id(entity_type, label)
+                stats["new"] += 1
+            id_map[local_id] = canonical
+
+            if canonical in entities:
+                stats["duplicates_merged"] += 1
+                properties = entities[canonical]["properties"]
+                for name, value in (entity.get("properties") or {}).items():
+                    properties.setdefault(name, value)
+            else:
+                entities[canonical] = {
+                    **entity,
+                    "id": canonical,
+                    "label": label,
+                    "properties": dict(entity.get("properties") or {}),
+                }
+
+        relations: Dict[str, Dict[str, Any]] = {}
+        for relation in oag.get("relations", []):
+            source = id_map.get(relation.get("source"))
+            target = id_map.get(relation.get("target"))
+            if source is None or target is None or not relation.get("type"):
+                stats["relations_dropped"] += 1
+                continue
+            rid = relation_id(source, relation["type"], target)
+            if rid not in relations:
+                relations[rid] = {**relation, "id": rid, "source": source, "target": target}
+
+        if register and self._learned.max_entries:
+            self._add(self._learned, entities.values())
+
+        stats["id_map"] = {k: v for k, v in id_map.items() if k != v}
+        return {"entities": list(entities.values()), "relations": list(relations.values())}, stats
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "entities": len(self),
+            "seed_entities": len(self._seed),
+            "learned_entities": len(self._learned),
+            "learned_evictions": self._learned.evictions,
+            "types": len(self._seed.types | self._learned.types),
+        }
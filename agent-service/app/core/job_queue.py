@@ -0,0 +1,290 @@
+"""
+异步任务队列 - 长耗时的生成请求先返回任务ID，由服务内的worker池执行
+
+- 有界队列：排队已满时提交直接失败（接口层返回503），形成背压
+- 任务完成后结果保留 ttl 秒，可轮询状态、订阅状态变化或通过回调URL推送；
+  回调只发往白名单主机，未配置白名单时只发往解析到公网地址的主机（防止SSRF访问内网）
+- 排队中的任务取消后不再执行，运行中的任务取消时中断执行
+"""
+import asyncio
+import ipaddress
+import socket
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+import httpx
+import structlog
+
+from app.core.serialization import dumps
+
+logger = structlog.get_logger()
+
+
+class JobStatus:
+    """任务状态"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+TERMINAL_STATUSES = frozenset({JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED})
+
+
+class CallbackURLError(ValueError):
+    """回调URL不被允许"""
+
+
+class JobQueueFullError(Exception):
+    """排队已满"""
+
+    def __init__(self, message: str, retry_after: float = 5.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class Job:
+    """一个异步任务"""
+    id: str
+    payload: Dict[str, Any]
+    callback_url: Optional[str] = None
+    status: str = JobStatus.QUEUED
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    async def wait_changed(self, timeout: Optional[float] = None) -> bool:
+        """等待下一次状态变化，超时返回False"""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _set_status(self, status: str):
+        self.status = status
+        if status == JobStatus.RUNNING:
+            self.started_at = time.time()
+        elif status in TERMINAL_STATUSES:
+            self.finished_at = time.time()
+        # 唤醒当前等待方，之后的等待方等待下一次变化
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class JobQueue:
+    """任务队列与worker池"""
+
+    def __init__(
+        self,
+        runner: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        workers: int = 4,
+        max_queue: int = 100,
+        ttl: int = 3600,
+        webhook_timeout: float = 10.0,
+        webhook_allowed_hosts: Sequence[str] = ()
+    ):
+        """
+        Args:
+            runner: 执行任务的协程函数，返回结果字典；结果中 success 为False时任务记为失败
+            workers: worker数
+            max_queue: 最多排队的任务数
+            ttl: 完成的任务保留时长（秒）
+            webhook_timeout: 回调请求超时（秒）
+            webhook_allowed_hosts: 允许的回调主机，为空时只允许解析到公网地址的主机
+        """
+        self.runner = runner
+        self.workers = workers
+        self.max_queue = max_queue
+        self.ttl = ttl
+        self.webhook_timeout = webhook_timeout
+        self.webhook_allowed_hosts = frozenset(h.strip().lower() for h in webhook_allowed_hosts if h.strip())
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+        # 发送中的回调，独立于worker运行，慢回调不占用worker
+        self._webhooks: set = set()
+        self._running = 0
+        self._stats = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0, "cancelled": 0}
+
+    def start(self):
+        """启动worker池"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """停止worker池，运行中的任务与未发完的回调被取消"""
+        for task in [*self._tasks, *self._webhooks]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._webhooks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, payload: Dict[str, Any], callback_url: Optional[str] = None) -> Job:
+        """
+        提交任务
+
+        Raises:
+            JobQueueFullError: 排队已满
+        """
+        if self._queue is None:
+            self.start()
+        self._purge()
+
+        job = Job(id=str(uuid.uuid4()), payload=payload, callback_url=callback_url)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._stats["rejected"] += 1
+            raise JobQueueFullError(f"任务队列已满（{self.max_queue}），请稍后重试")
+
+        self._jobs[job.id] = job
+        self._stats["submitted"] += 1
+        logger.info("Job submitted", job_id=job.id, queue_depth=self._queue.qsize())
+        return job
+
+    async def check_callback_url(self, url: str):
+        """
+        检查回调URL，提交时与发送前各检查一次（发送前重新解析，防止DNS指向改变）
+
+        Raises:
+            CallbackURLError: 不是 http(s) 地址、主机不在白名单或解析到内网/回环等非公网地址
+        """
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        if parts.scheme not in ("http", "https") or not host:
+            raise CallbackURLError("callback_url 必须是 http(s) 地址")
+        if self.webhook_allowed_hosts:
+            if host not in self.webhook_allowed_hosts:
+                raise CallbackURLError(f"回调主机不在允许列表中: {host}")
+            return
+
+        try:
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except (OSError, ValueError) as e:
+            raise CallbackURLError(f"无法解析回调主机: {host}") from e
+        for info in infos:
+            address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+            if not address.is_global:
+                raise CallbackURLError(f"回调地址不能指向内网或本机: {host}")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._purge()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """取消任务，已结束的任务不受影响"""
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return job
+        if job._task is not None:
+            job._task.cancel()
+        self._finish(job, JobStatus.CANCELLED)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self._running,
+            "webhooks_pending": len(self._webhooks),
+            "retained": len(self._jobs),
+            "workers": len(self._tasks),
+        }
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            if job.status != JobStatus.QUEUED:
+                # 排队期间已取消
+                continue
+
+            self._running += 1
+            job._set_status(JobStatus.RUNNING)
+            job._task = asyncio.create_task(self.runner(job.payload))
+            try:
+                result = await job._task
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    # worker 本身被停止
+                    if not job.done:
+                        self._finish(job, JobStatus.CANCELLED)
+                    raise
+                # 任务被取消，状态已由 cancel() 设置
+            except Exception as e:
+                logger.error("Job failed", job_id=job.id, error=str(e))
+                job.error = str(e)
+                self._finish(job, JobStatus.FAILED)
+            else:
+                job.result = result
+                job.error = result.get("error")
+                self._finish(job, JobStatus.SUCCEEDED if result.get("success", True) else JobStatus.FAILED)
+            finally:
+                self._running -= 1
+                job._task = None
+
+            if job.callback_url:
+                task = asyncio.create_task(self._notify(job))
+                self._webhooks.add(task)
+                task.add_done_callback(self._webhooks.discard)
+
+    def _finish(self, job: Job, status: str):
+        self._stats[status] += 1
+        job._set_status(status)
+        logger.info("Job finished", job_id=job.id, status=status)
+
+    async def _notify(self, job: Job):
+        """把任务结果推送到回调URL，失败只记录日志"""
+        try:
+            await self.check_callback_url(job.callback_url)
+        except CallbackURLError as e:
+            logger.warning("Job webhook blocked", job_id=job.id, url=job.callback_url, error=str(e))
+            return
+        try:
+            # 不跟随重定向，避免被跳转到内网地址
+            async with httpx.AsyncClient(timeout=self.webhook_timeout, follow_redirects=False) as client:
+                response = await client.post(
+                    job.callback_url,
+                    content=dumps(job.to_dict()),
+                    headers={"Content-Type": "application/json"}
+                )
+                response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning("Job webhook failed", job_id=job.id, url=job.callback_url, error=str(e))
+
+    def _purge(self):
+        """清理超过保留时长的已完成任务"""
+        expire_before = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and job.finished_at is not None and job.finished_at < expire_before
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,170 @@
+"""
+增量JSON解析器 - 在LLM流式输出过程中逐个取出已完成的数组元素
+
+针对 {"entities": [...], "relations": [...], "explanation": "..."} 这类
+根对象结构：指定的数组字段中每个对象在其右花括号到达时即被解析产出，
+根级标量字段（如 explanation）在其值结束时记录。输出被截断时已完成的
+元素依然保留。
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.serialization import loads
+
+_WHITESPACE = " \t\r\n"
+
+
+class StreamingJSONParser:
+    """流式JSON解析器"""
+
+    def __init__(self, collections: Iterable[str]):
+        """
+        Args:
+            collections: 需要逐元素产出的根级数组字段名
+        """
+        self.collections = tuple(collections)
+        self.items: Dict[str, List[Dict[str, Any]]] = {k: [] for k in self.collections}
+        self.scalars: Dict[str, Any] = {}
+        self.errors = 0
+
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+
+        # 根对象层级的解析状态
+        self._key: Optional[str] = None
+        self._expect_value = False
+        self._value_start = -1
+        self._array_key: Optional[str] = None
+        self._item_start = -1
+
+    @property
+    def complete(self) -> bool:
+        """根对象是否已完整闭合"""
+        return self._finished
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        输入一段增量文本
+
+        Args:
+            chunk: LLM输出的增量片段
+
+        Returns:
+            本次新完成的 (字段名, 元素) 列表
+        """
+        if self._finished or not chunk:
+            return []
+
+        self._buffer += chunk
+        buffer = self._buffer
+        completed: List[Tuple[str, Dict[str, Any]]] = []
+
+        i = self._pos
+        end = len(buffer)
+        while i < end:
+            c = buffer[i]
+
+            if not self._started:
+                # 跳过代码块标记等前导内容
+                if c == "{":
+                    self._started = True
+                    self._depth = 1
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._on_string_end(i)
+                i += 1
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                if self._depth == 1 and self._expect_value and self._value_start < 0:
+                    self._value_start = i
+            elif c == "{" or c == "[":
+                self._depth += 1
+                if self._depth == 2:
+                    self._expect_value = False
+                    if c == "[" and self._key in self.items:
+                        self._array_key = self._key
+                elif self._depth == 3 and c == "{" and self._array_key is not None:
+                    self._item_start = i
+            elif c == "}" or c == "]":
+                if self._depth == 3 and c == "}" and self._item_start >= 0:
+                    item = self._decode(buffer[self._item_start:i + 1])
+                    if isinstance(item, dict):
+                        self.items[self._array_key].append(item)
+                        completed.append((self._array_key, item))
+                    self._item_start = -1
+                elif self._depth == 1:
+                    self._end_scalar(i)
+                self._depth -= 1
+                if self._depth == 1:
+                    self._array_key = None
+                elif self._depth == 0:
+                    self._finished = True
+                    i += 1
+                    break
+            elif self._depth == 1:
+                if c == ":":
+                    self._expect_value = True
+                elif c == ",":
+                    self._end_scalar(i)
+                    self._key = None
+                elif self._expect_value and self._value_start < 0 and c not in _WHITESPACE:
+                    self._value_start = i
+            i += 1
+
+        self._pos = i
+        return completed
+
+    def result(self) -> Dict[str, Any]:
+        """
+        当前已解析出的结果
+
+        Returns:
+            包含各数组字段、根级标量字段以及 complete 标记的字典
+        """
+        result: Dict[str, Any] = dict(self.scalars)
+        for key, values in self.items.items():
+            result[key] = list(values)
+        result["complete"] = self._finished
+        return result
+
+    def _on_string_end(self, i: int):
+        """根层级字符串结束：要么是字段名，要么是字符串值"""
+        if self._depth != 1:
+            return
+        if self._expect_value:
+            self._end_scalar(i + 1)
+        else:
+            self._key = self._decode(self._buffer[self._string_start:i + 1])
+
+    def _end_scalar(self, end: int):
+        """根层级标量值结束"""
+        if self._value_start >= 0 and self._key is not None:
+            value = self._decode(self._buffer[self._value_start:end].strip())
+            if value is not None:
+                self.scalars[self._key] = value
+        self._value_start = -1
+        self._expect_value = False
+
+    def _decode(self, text: str) -> Any:
+        try:
+            return loads(text)
+        except json.JSONDecodeError:
+            self.errors += 1
+            return None
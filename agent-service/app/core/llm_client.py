@@ -3,8 +3,20 @@ LLM 客户端 - 直接使用HTTP调用Kimi API，不依赖LangChain
 """
 import httpx
 import json
-from typing import AsyncGenerator, Dict, List, Any, Optional
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Dict, List, Any, Optional, Tuple
 from app.config import settings
+from app.core.cache import ResponseCache
+from app.core.cassette import CassetteTransport, cassette
+from app.core.context import current_agent, current_session_id
+from app.core.metrics import LLM_COST, LLM_LATENCY, LLM_REQUESTS, LLM_TOKENS, current_timings
+from app.core.rate_limiter import LLMGovernor, LLMOverloadedError
+from app.core.retry import Hedger, RetryPolicy
+from app.core.serialization import loads
+from app.core.singleflight import SingleFlight
+from app.core.tracing import current_span, tracer
+from app.core.tokens import estimate_message_tokens, estimate_tokens
 import structlog
 
 logger = structlog.get_logger()
@@ -38,12 +50,131 @@ class LLMResponse:
         self.model = model
         self.finish_reason = finish_reason
         self.tool_calls = tool_calls or []
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "content": self.content,
+            "usage": self.usage,
+            "model": self.model,
+            "finish_reason": self.finish_reason,
+            "tool_calls": self.tool_calls
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LLMResponse":
+        return cls(**data)
+
+
+class _UpstreamTimer:
+    """
+    一次上游请求的耗时与用量记录，同时作为一个 llm.<mode> trace span
+    
+    建立连接、收到响应头的时间点来自httpx的 trace 扩展；传输层不支持时
+    （如测试用的MockTransport）只记录总耗时，流式请求以进入响应上下文作为收到响应头。
+    等待限流许可的时间单独记录，不计入上游耗时。
+    """
+    
+    def __init__(self, mode: str, model: str):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.queue_wait: Optional[float] = None
+        self.connect: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self._connect_started: Optional[float] = None
+        # 流式请求在异步生成器中执行，span不设为当前span，直接结束
+        self.span = tracer.start_span(f"llm.{mode}", model=model)
+    
+    def acquired(self):
+        """拿到限流许可，此后开始计上游耗时"""
+        now = time.perf_counter()
+        self.queue_wait = now - self.started
+        self.started = now
+    
+    async def trace(self, event_name: str, info: Dict[str, Any]):
+        now = time.perf_counter()
+        if event_name == "connection.connect_tcp.started":
+            self._connect_started = now
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self._connect_started is not None:
+                self.connect = now - self._connect_started
+        elif event_name.endswith("receive_response_headers.complete"):
+            self.ttfb = now - self.started
+    
+    def headers_received(self):
+        if self.ttfb is None:
+            self.ttfb = time.perf_counter() - self.started
+    
+    def finish(
+        self,
+        status: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        error: Optional[BaseException] = None
+    ):
+        total = time.perf_counter() - self.started
+        agent = current_agent.get() or "unknown"
+        
+        self.span.set_attributes(
+            agent=agent,
+            status=status,
+            queue_wait_ms=round(self.queue_wait * 1000, 1) if self.queue_wait is not None else None,
+            ttfb_ms=round(self.ttfb * 1000, 1) if self.ttfb is not None else None,
+            connect_ms=round(self.connect * 1000, 1) if self.connect is not None else None,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens
+        )
+        if error is not None:
+            self.span.record_exception(error)
+        self.span.end()
+        
+        LLM_REQUESTS.inc(mode=self.mode, status=status)
+        LLM_LATENCY.observe(total, mode=self.mode, phase="total")
+        if self.ttfb is not None:
+            LLM_LATENCY.observe(self.ttfb, mode=self.mode, phase="ttfb")
+        if self.connect is not None:
+            LLM_LATENCY.observe(self.connect, mode=self.mode, phase="connect")
+        if prompt_tokens or completion_tokens:
+            LLM_TOKENS.inc(prompt_tokens, agent=agent, kind="prompt")
+            LLM_TOKENS.inc(completion_tokens, agent=agent, kind="completion")
+            cost = (
+                prompt_tokens * settings.KIMI_PROMPT_PRICE_PER_1K
+                + completion_tokens * settings.KIMI_COMPLETION_PRICE_PER_1K
+            ) / 1000
+            if cost:
+                LLM_COST.inc(cost, agent=agent)
+        
+        timings = current_timings.get()
+        if timings is not None:
+            timings.record(
+                "llm",
+                agent,
+                total,
+                mode=self.mode,
+                status=status,
+                ttfb_ms=round(self.ttfb * 1000, 1) if self.ttfb is not None else None,
+                connect_ms=round(self.connect * 1000, 1) if self.connect is not None else None,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens
+            )
+    
+    @staticmethod
+    def status_of(error: BaseException) -> str:
+        if isinstance(error, httpx.HTTPStatusError):
+            return str(error.response.status_code)
+        if isinstance(error, httpx.TimeoutException):
+            return "timeout"
+        if isinstance(error, LLMOverloadedError):
+            return "overloaded"
+        return "error"
 
 
 class KimiClient:
     """Kimi API 客户端 - 使用连接池复用HTTP连接"""
     
     _client: Optional[httpx.AsyncClient] = None
+    _http2: bool = False
+    _in_flight: int = 0
+    _peak_in_flight: int = 0
     
     def __init__(self):
         self.api_key = settings.KIMI_API_KEY
@@ -53,6 +184,40 @@ class KimiClient:
         self.temperature = settings.KIMI_TEMPERATURE
         self.timeout = settings.KIMI_REQUEST_TIMEOUT
         
+        # 响应缓存（可选）
+        self.cache: Optional[ResponseCache] = None
+        if settings.LLM_CACHE_ENABLED:
+            self.cache = ResponseCache(
+                max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                ttl=settings.LLM_CACHE_TTL,
+                path=settings.LLM_CACHE_PATH or None,
+                disk_max_entries=settings.LLM_CACHE_DISK_MAX_ENTRIES
+            )
+        
+        # 相同请求合并（可选）
+        self.single_flight: Optional[SingleFlight] = SingleFlight() if settings.LLM_SINGLE_FLIGHT_ENABLED else None
+        
+        # 限流与并发控制
+        self.governor = LLMGovernor(
+            requests_per_minute=settings.KIMI_RATE_LIMIT_PER_MINUTE,
+            tokens_per_minute=settings.KIMI_TOKEN_LIMIT_PER_MINUTE,
+            max_concurrency=settings.KIMI_MAX_CONCURRENCY,
+            max_queue_wait=settings.KIMI_MAX_QUEUE_WAIT
+        )
+        
+        # 重试与对冲请求
+        self.retry_policy = RetryPolicy(
+            max_retries=settings.KIMI_MAX_RETRIES,
+            base_delay=settings.KIMI_RETRY_BASE_DELAY,
+            max_delay=settings.KIMI_RETRY_MAX_DELAY
+        )
+        self.hedger: Optional[Hedger] = None
+        if settings.KIMI_HEDGE_ENABLED:
+            self.hedger = Hedger(
+                quantile=settings.KIMI_HEDGE_QUANTILE,
+                min_delay=settings.KIMI_HEDGE_MIN_DELAY
+            )
+        
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -64,14 +229,21 @@ class KimiClient:
         if cls._client is None:
             # 创建带连接池的客户端
             limits = httpx.Limits(
-                max_keepalive_connections=20,  # 最大保持连接数
-                max_connections=100,            # 最大连接数
-                keepalive_expiry=30.0          # 连接保持时间（秒）
-            )
-            cls._client = httpx.AsyncClient(
-                limits=limits,
-                timeout=httpx.Timeout(60.0, connect=10.0)
+                max_keepalive_connections=settings.KIMI_POOL_MAX_KEEPALIVE,  # 最大保持连接数
+                max_connections=settings.KIMI_POOL_MAX_CONNECTIONS,          # 最大连接数
+                keepalive_expiry=settings.KIMI_POOL_KEEPALIVE_EXPIRY         # 连接保持时间（秒）
             )
+            cls._http2 = cls._http2_available()
+            timeout = httpx.Timeout(settings.KIMI_REQUEST_TIMEOUT, connect=settings.KIMI_CONNECT_TIMEOUT)
+            if cassette is not None:
+                # 录制/回放：在传输层拦截，回放时不建立真实连接
+                inner = None
+                if cassette.mode == "record":
+                    inner = httpx.AsyncHTTPTransport(limits=limits, http2=cls._http2)
+                transport = CassetteTransport(cassette, inner, speed=settings.LLM_CASSETTE_REPLAY_SPEED)
+                cls._client = httpx.AsyncClient(transport=transport, timeout=timeout)
+            else:
+                cls._client = httpx.AsyncClient(limits=limits, timeout=timeout, http2=cls._http2)
         return cls._client
     
     @classmethod
@@ -80,6 +252,55 @@ class KimiClient:
         if cls._client is not None:
             await cls._client.aclose()
             cls._client = None
+        if cassette is not None:
+            cassette.close()
+    
+    @staticmethod
+    def _http2_available() -> bool:
+        """配置开启HTTP/2且已安装h2时启用多路复用"""
+        if not settings.KIMI_HTTP2:
+            return False
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("KIMI_HTTP2 is enabled but 'h2' is not installed, falling back to HTTP/1.1")
+            return False
+        return True
+    
+    @classmethod
+    @asynccontextmanager
+    async def _track_request(cls) -> AsyncGenerator[None, None]:
+        """统计进行中的上游请求数"""
+        cls._in_flight += 1
+        cls._peak_in_flight = max(cls._peak_in_flight, cls._in_flight)
+        try:
+            yield
+        finally:
+            cls._in_flight -= 1
+    
+    @classmethod
+    def pool_stats(cls) -> Dict[str, Any]:
+        """连接池使用情况"""
+        max_connections = settings.KIMI_POOL_MAX_CONNECTIONS
+        stats: Dict[str, Any] = {
+            "open": cls._client is not None,
+            "http2": cls._client is not None and cls._http2,
+            "max_connections": max_connections,
+            "max_keepalive": settings.KIMI_POOL_MAX_KEEPALIVE,
+            "in_flight_requests": cls._in_flight,
+            "peak_in_flight_requests": cls._peak_in_flight,
+        }
+        
+        # 连接明细依赖httpcore的连接池实现，取不到时只报告请求数
+        pool = getattr(getattr(cls._client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            idle = sum(1 for c in connections if c.is_idle())
+            stats["connections"] = len(connections)
+            stats["idle_connections"] = idle
+            stats["utilization"] = round((len(connections) - idle) / max_connections, 4) if max_connections else 0.0
+        
+        return stats
     
     async def chat(
         self,
@@ -87,6 +308,7 @@ class KimiClient:
         tools: Optional[List[Dict]] = None,
         stream: bool = False,
         temperature: Optional[float] = None,
+        use_cache: bool = True,
         **kwargs
     ) -> LLMResponse:
         """
@@ -97,6 +319,7 @@ class KimiClient:
             tools: 工具定义
             stream: 是否流式输出
             temperature: 温度参数
+            use_cache: 启用缓存时是否读写缓存
             
         Returns:
             LLMResponse
@@ -115,27 +338,28 @@ class KimiClient:
         if tools:
             payload["tools"] = tools
         
-        client = self.get_client()
+        cache_key = self._cache_key(payload, use_cache)
+        if cache_key:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                current_span().add_event("llm.cache_hit")
+                return LLMResponse.from_dict(cached)
+        
         try:
-            response = await client.post(
-                url,
-                headers=self.headers,
-                json=payload,
-                timeout=self.timeout
-            )
-            response.raise_for_status()
-            data = response.json()
+            # 并发的相同请求只发起一次上游调用
+            if self.single_flight is not None:
+                result = await self.single_flight.do(
+                    ResponseCache.make_key(payload),
+                    lambda: self._post_resilient(url, payload)
+                )
+            else:
+                result = await self._post_resilient(url, payload)
             
-            choice = data["choices"][0]
-            message = choice["message"]
+            # 被max_tokens截断的结果不缓存
+            if cache_key and result.finish_reason != "length":
+                await self.cache.set(cache_key, result.to_dict())
             
-            return LLMResponse(
-                content=message.get("content", ""),
-                usage=data.get("usage", {}),
-                model=data.get("model", self.model),
-                finish_reason=choice.get("finish_reason", ""),
-                tool_calls=message.get("tool_calls", [])
-            )
+            return result
             
         except httpx.HTTPError as e:
             logger.error("Kimi API request failed", error=str(e))
@@ -149,6 +373,7 @@ class KimiClient:
         messages: List[Message],
         tools: Optional[List[Dict]] = None,
         temperature: Optional[float] = None,
+        use_cache: bool = True,
         **kwargs
     ) -> AsyncGenerator[str, None]:
         """
@@ -158,6 +383,7 @@ class KimiClient:
             messages: 消息列表
             tools: 工具定义
             temperature: 温度参数
+            use_cache: 启用缓存时是否读写缓存（命中时整段内容作为一个片段返回）
             
         Yields:
             内容片段
@@ -176,34 +402,200 @@ class KimiClient:
         if tools:
             payload["tools"] = tools
         
+        cache_key = self._cache_key(payload, use_cache)
+        if cache_key:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                current_span().add_event("llm.cache_hit")
+                if cached["content"]:
+                    yield cached["content"]
+                return
+        
+        chunks: List[str] = []
+        finish_reason = ""
+        
+        # 并发的相同流式请求共享同一条上游流
+        if self.single_flight is not None:
+            deltas = self.single_flight.stream(
+                ResponseCache.make_key(payload),
+                lambda: self._stream_resilient(url, payload)
+            )
+        else:
+            deltas = self._stream_resilient(url, payload)
+        
+        try:
+            async for content, reason in deltas:
+                finish_reason = reason or finish_reason
+                if content:
+                    chunks.append(content)
+                    yield content
+        finally:
+            await deltas.aclose()
+        
+        # 完整读取且未被截断时写入缓存
+        if cache_key and finish_reason != "length":
+            await self.cache.set(
+                cache_key,
+                LLMResponse(
+                    content="".join(chunks),
+                    model=self.model,
+                    finish_reason=finish_reason
+                ).to_dict()
+            )
+    
+    async def _post_resilient(self, url: str, payload: Dict[str, Any]) -> LLMResponse:
+        """带重试（及可选对冲）的非流式请求"""
+        if self.hedger is not None:
+            return await self.retry_policy.run(lambda: self.hedger.run(lambda: self._post(url, payload)))
+        return await self.retry_policy.run(lambda: self._post(url, payload))
+    
+    async def _stream_resilient(
+        self,
+        url: str,
+        payload: Dict[str, Any]
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        """带重试的流式请求：只在尚未收到任何片段时重试，已输出的内容无法撤回"""
+        attempt = 0
+        while True:
+            started = False
+            deltas = self._stream_deltas(url, payload)
+            try:
+                async for item in deltas:
+                    started = True
+                    yield item
+                return
+            except Exception as e:
+                if started:
+                    raise
+                await self.retry_policy.before_retry(attempt, e)
+                attempt += 1
+            finally:
+                await deltas.aclose()
+    
+    async def _post(self, url: str, payload: Dict[str, Any]) -> LLMResponse:
+        """发起一次非流式请求"""
+        estimated = estimate_message_tokens(payload["messages"])
         client = self.get_client()
-        async with client.stream(
-            "POST",
-            url,
-            headers=self.headers,
-            json=payload,
-            timeout=self.timeout
-        ) as response:
-            response.raise_for_status()
-            
-            async for line in response.aiter_lines():
-                if line.startswith("data: "):
-                    data_str = line[6:]
-                    if data_str == "[DONE]":
-                        break
-                    
-                    try:
-                        data = json.loads(data_str)
-                        delta = data["choices"][0].get("delta", {})
-                        content = delta.get("content", "")
-                        if content:
-                            yield content
+        timer = _UpstreamTimer("chat", payload["model"])
+        try:
+            async with self.governor.acquire(estimated, current_session_id.get()), self._track_request():
+                timer.acquired()
+                response = await client.post(
+                    url,
+                    headers=self.headers,
+                    json=payload,
+                    extensions={"trace": timer.trace}
+                )
+                response.raise_for_status()
+                data = loads(response.content)
+        except Exception as e:
+            timer.finish(timer.status_of(e), error=e)
+            raise
+        
+        usage = data.get("usage") or {}
+        self.governor.record_usage(usage.get("total_tokens", estimated) - estimated)
+        timer.finish(
+            "ok",
+            prompt_tokens=usage.get("prompt_tokens", estimated),
+            completion_tokens=usage.get("completion_tokens", 0)
+        )
+        
+        choice = data["choices"][0]
+        message = choice["message"]
+        
+        return LLMResponse(
+            content=message.get("content", ""),
+            usage=data.get("usage", {}),
+            model=data.get("model", self.model),
+            finish_reason=choice.get("finish_reason", ""),
+            tool_calls=message.get("tool_calls", [])
+        )
+    
+    async def _stream_deltas(
+        self,
+        url: str,
+        payload: Dict[str, Any]
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        """发起一次流式请求，逐个产出 (内容片段, finish_reason)"""
+        estimated = estimate_message_tokens(payload["messages"])
+        completion_tokens = 0
+        client = self.get_client()
+        timer = _UpstreamTimer("stream", payload["model"])
+        status = "cancelled"
+        error: Optional[BaseException] = None
+        try:
+            async for item in self._stream_lines(client, url, payload, estimated, timer):
+                completion_tokens += estimate_tokens(item[0])
+                yield item
+            status = "ok"
+        except Exception as e:
+            status = timer.status_of(e)
+            error = e
+            raise
+        finally:
+            # 流被调用方提前关闭时按已收到的部分记录
+            timer.finish(status, prompt_tokens=estimated, completion_tokens=completion_tokens, error=error)
+        
+        self.governor.record_usage(completion_tokens)
+    
+    async def _stream_lines(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        payload: Dict[str, Any],
+        estimated: int,
+        timer: _UpstreamTimer
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        """读取SSE响应，产出 (内容片段, finish_reason)"""
+        async with self.governor.acquire(estimated, current_session_id.get()), self._track_request():
+            timer.acquired()
+            async with client.stream(
+                "POST",
+                url,
+                headers=self.headers,
+                json=payload,
+                extensions={"trace": timer.trace}
+            ) as response:
+                timer.headers_received()
+                response.raise_for_status()
+                
+                async for line in response.aiter_lines():
+                    if line.startswith("data: "):
+                        data_str = line[6:]
+                        if data_str == "[DONE]":
+                            break
+                        
+                        try:
+                            data = loads(data_str)
+                            choice = data["choices"][0]
+                            content = choice.get("delta", {}).get("content", "")
+                            finish_reason = choice.get("finish_reason") or ""
+                            if content or finish_reason:
+                                yield content, finish_reason
                         except json.JSONDecodeError:
                             continue
                         except Exception as e:
                             logger.warning("Error parsing stream data", error=str(e))
                             continue
     
+    def _cache_key(self, payload: Dict[str, Any], use_cache: bool) -> Optional[str]:
+        """计算缓存键，未启用缓存时返回None"""
+        if self.cache is None or not use_cache:
+            return None
+        return ResponseCache.make_key(payload)
+    
+    def stats(self) -> Dict[str, Any]:
+        """客户端运行统计"""
+        return {
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "single_flight": self.single_flight.stats() if self.single_flight is not None else None,
+            "rate_limiter": self.governor.stats(),
+            "retry": self.retry_policy.stats(),
+            "hedge": self.hedger.stats() if self.hedger is not None else None,
+            "pool": self.pool_stats(),
+            "cassette": cassette.stats() if cassette is not None else None
+        }
+    
     async def function_call(
         self,
         messages: List[Message],
@@ -221,36 +613,8 @@ class KimiClient:
         Returns:
             LLMResponse (包含tool_calls)
         """
-        url = f"{self.base_url}/chat/completions"
-        
-        payload = {
-            "model": self.model,
-            "messages": [m.to_dict() for m in messages],
-            "tools": tools,
-            "tool_choice": tool_choice,
-            "max_tokens": self.max_tokens,
-            "temperature": self.temperature
-        }
-        
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(
-                url,
-                headers=self.headers,
-                json=payload
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            choice = data["choices"][0]
-            message = choice["message"]
-            
-            return LLMResponse(
-                content=message.get("content", ""),
-                usage=data.get("usage", {}),
-                model=data.get("model", self.model),
-                finish_reason=choice.get("finish_reason", ""),
-                tool_calls=message.get("tool_calls", [])
-            )
+        # 复用chat的连接池、限流、重试与缓存
+        return await self.chat(messages, tools=tools, tool_choice=tool_choice)
 
 
 # 全局客户端实例
@@ -0,0 +1,232 @@
+"""
+运行指标 - 进程内的计数器与直方图，按 Prometheus 文本格式（0.0.4）输出
+
+- Counter / Histogram 支持标签，写入为O(1)字典操作
+- collector：抓取时调用的回调，用于导出各组件 stats() 中已有的计数，避免重复计数
+- RequestTimings：单个请求内的耗时明细（节点、LLM调用），请求带调试头时写入响应
+"""
+import math
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 默认直方图分桶（秒），覆盖毫秒级的本地节点到分钟级的长文档生成
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+# collector 产出的样本: (指标名, 类型, 说明, 标签, 值)
+Sample = Tuple[str, str, str, Dict[str, Any], float]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """单调递增计数器"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0.0)
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Histogram:
+    """分桶直方图"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各桶计数..., 总次数, 总和]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        row = self._values.get(key)
+        if row is None:
+            row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+                break
+        row[-2] += 1
+        row[-1] += value
+
+    def count(self, **labels: Any) -> float:
+        row = self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames))
+        return row[-2] if row else 0.0
+
+    def render(self) -> List[str]:
+        lines = []
+        names = self.labelnames + ("le",)
+        for key, row in self._values.items():
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                labels = _format_labels(names, key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_bucket{_format_labels(names, key + ('+Inf',))} {_format_value(row[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(row[-2])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(row[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]):
+        """注册抓取时调用的回调"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+
+        described = set()
+        for collector in self._collectors:
+            for name, metric_type, documentation, labels, value in collector():
+                if value is None:
+                    continue
+                if name not in described:
+                    lines.append(f"# HELP {name} {documentation}")
+                    lines.append(f"# TYPE {name} {metric_type}")
+                    described.add(name)
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标已注册: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+class RequestTimings:
+    """单个请求内的耗时明细"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.entries: List[Dict[str, Any]] = []
+
+    def record(self, kind: str, name: str, seconds: float, **extra: Any):
+        self.entries.append({"kind": kind, "name": name, "ms": round(seconds * 1000, 1), **extra})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"total_ms": round((time.perf_counter() - self.started) * 1000, 1), "entries": self.entries}
+
+    def server_timing(self) -> str:
+        """Server-Timing 响应头，同名条目累加"""
+        totals: Dict[str, float] = {}
+        for entry in self.entries:
+            key = f"{entry['kind']}-{entry['name']}"
+            totals[key] = totals.get(key, 0.0) + entry["ms"]
+        parts = [f"{key};dur={ms:.1f}" for key, ms in totals.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+# 当前请求的耗时明细，仅在请求带调试头时设置
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+
+# 全局指标注册表
+metrics = MetricsRegistry()
+
+NODE_DURATION = metrics.histogram(
+    "agent_node_duration_seconds",
+    "Agent图各节点的执行耗时",
+    ["node"]
+)
+NODE_ERRORS = metrics.counter(
+    "agent_node_errors_total",
+    "Agent图节点抛出的异常数",
+    ["node"]
+)
+LLM_LATENCY = metrics.histogram(
+    "llm_request_duration_seconds",
+    "上游LLM请求耗时，phase: connect 建立连接 / ttfb 收到响应头 / total 完整响应",
+    ["mode", "phase"]
+)
+LLM_REQUESTS = metrics.counter(
+    "llm_requests_total",
+    "上游LLM请求数（每次尝试计一次）",
+    ["mode", "status"]
+)
+LLM_TOKENS = metrics.counter(
+    "llm_tokens_total",
+    "各Agent消耗的token数，kind: prompt / completion",
+    ["agent", "kind"]
+)
+LLM_COST = metrics.counter(
+    "llm_cost_total",
+    "各Agent按配置单价估算的LLM费用",
+    ["agent"]
+)
+
+
+def observe_node(node: str, seconds: float, failed: bool = False):
+    """记录一次节点执行"""
+    NODE_DURATION.observe(seconds, node=node)
+    if failed:
+        NODE_ERRORS.inc(node=node)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.record("node", node, seconds)
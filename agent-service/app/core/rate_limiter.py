@@ -0,0 +1,222 @@
+"""
+LLM 调用限流 - 请求数/token数令牌桶 + 并发上限 + 按会话公平排队
+
+所有上游调用先在此排队获得许可：各会话各自FIFO排队，会话之间轮转出队，
+避免单个会话的突发请求占满额度；排队超过最长等待时间直接失败。
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+_DEFAULT_SESSION = "__default__"
+
+
+class LLMOverloadedError(Exception):
+    """排队超时，上游额度已满"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """按分钟速率匀速补充的令牌桶"""
+
+    def __init__(self, per_minute: int, capacity: Optional[int] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity or per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        """获得 amount 个令牌还需等待的秒数，0 表示可立即获得"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        """扣除令牌（允许透支，透支部分延后后续请求）"""
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def debit(self, amount: float):
+        """事后追加扣除（如实际用量超过预估）"""
+        self.tokens -= amount
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class LLMGovernor:
+    """LLM调用许可管理"""
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int = 0,
+        max_concurrency: int = 8,
+        max_queue_wait: float = 30.0
+    ):
+        """
+        Args:
+            requests_per_minute: 每分钟请求数上限，<=0 不限制
+            tokens_per_minute: 每分钟token数上限，<=0 不限制
+            max_concurrency: 最大并发请求数
+            max_queue_wait: 最长排队时间（秒）
+        """
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_concurrency = max_concurrency
+        self.max_queue_wait = max_queue_wait
+
+        self._queues: "OrderedDict[str, Deque[Tuple[asyncio.Future, int, float]]]" = OrderedDict()
+        self._active = 0
+        self._depth = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats = {
+            "granted": 0,
+            "rejected": 0,
+            "max_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    @asynccontextmanager
+    async def acquire(self, tokens: int = 0, session_id: Optional[str] = None) -> AsyncIterator[None]:
+        """
+        获取一次调用许可
+
+        Args:
+            tokens: 预估消耗的token数
+            session_id: 所属会话，用于公平排队
+
+        Raises:
+            LLMOverloadedError: 排队超过 max_queue_wait
+        """
+        await self._enter(tokens, session_id or _DEFAULT_SESSION)
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._dispatch()
+
+    def record_usage(self, extra_tokens: int):
+        """实际用量超出预估时补扣token额度"""
+        if self.tokens is not None and extra_tokens > 0:
+            self.tokens.debit(extra_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        granted = self._stats["granted"]
+        return {
+            **self._stats,
+            "total_wait_seconds": round(self._stats["total_wait_seconds"], 3),
+            "max_wait_seconds": round(self._stats["max_wait_seconds"], 3),
+            "avg_wait_seconds": round(self._stats["total_wait_seconds"] / granted, 4) if granted else 0.0,
+            "queue_depth": self._depth,
+            "active": self._active,
+            "sessions_waiting": len(self._queues),
+        }
+
+    async def _enter(self, tokens: int, session_id: str):
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, tokens, time.monotonic())
+        self._queues.setdefault(session_id, deque()).append(waiter)
+        self._depth += 1
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._depth)
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(future, self.max_queue_wait)
+        except asyncio.TimeoutError:
+            self._discard(session_id, waiter)
+            self._stats["rejected"] += 1
+            logger.warning("LLM queue wait exceeded", session_id=session_id, queue_depth=self._depth)
+            raise LLMOverloadedError(
+                f"LLM服务繁忙，排队超过{self.max_queue_wait}秒",
+                retry_after=self.max_queue_wait
+            )
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 许可已发放但调用方已离开，归还许可
+                self._active -= 1
+                self._dispatch()
+            else:
+                self._discard(session_id, waiter)
+            raise
+
+    def _dispatch(self):
+        """在额度允许时按会话轮转发放许可"""
+        while self._active < self.max_concurrency and self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            future, tokens, enqueued_at = queue[0]
+
+            if future.done():
+                # 调用方已取消
+                self._pop(session_id, queue)
+                continue
+
+            wait = 0.0
+            if self.requests is not None:
+                wait = self.requests.wait_time(1)
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.wait_time(tokens))
+            if wait > 0:
+                self._schedule(wait)
+                return
+
+            if self.requests is not None:
+                self.requests.consume(1)
+            if self.tokens is not None:
+                self.tokens.consume(tokens)
+
+            self._pop(session_id, queue)
+            self._active += 1
+            waited = time.monotonic() - enqueued_at
+            self._stats["granted"] += 1
+            self._stats["total_wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+            future.set_result(None)
+
+    def _pop(self, session_id: str, queue: Deque):
+        """队首出队；会话仍有等待时移到轮转末尾"""
+        queue.popleft()
+        self._depth -= 1
+        del self._queues[session_id]
+        if queue:
+            self._queues[session_id] = queue
+
+    def _discard(self, session_id: str, waiter: Tuple[asyncio.Future, int, float]):
+        queue = self._queues.get(session_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._depth -= 1
+            if not queue:
+                del self._queues[session_id]
+
+    def _schedule(self, delay: float):
+        """额度不足时定时重新尝试发放"""
+        loop = asyncio.get_running_loop()
+        if self._timer is not None:
+            if self._timer_loop is loop:
+                return
+            # 定时器属于已更换的事件循环（如测试或重启后的新循环），作废重建
+            self._timer.cancel()
+
+        def wakeup():
+            self._timer = None
+            self._timer_loop = None
+            self._dispatch()
+
+        self._timer = loop.call_later(delay, wakeup)
+        self._timer_loop = loop
@@ -0,0 +1,214 @@
+"""
+重试与对冲请求 - 处理上游的瞬时失败和长尾延迟
+
+- 重试：指数退避 + 全抖动，遵循上游 Retry-After；仅对超时、连接错误
+  以及 429/5xx 重试（chat/completions 无副作用，重复请求是安全的）
+- 对冲：请求耗时超过近期延迟的 p95 仍未返回时再发起一个相同请求，
+  取先成功的结果并取消另一个
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+import httpx
+import structlog
+
+from app.core.rate_limiter import LLMOverloadedError
+
+logger = structlog.get_logger()
+
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+def parse_retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或HTTP日期）"""
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """重试策略"""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        max_retry_after: float = 60.0
+    ):
+        """
+        Args:
+            max_retries: 最大重试次数（不含首次请求）
+            base_delay: 退避基准时长（秒）
+            max_delay: 单次退避上限（秒）
+            max_retry_after: 遵循 Retry-After 的最长等待（秒），超过则放弃重试
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self._stats: Dict[str, int] = {"retries": 0, "gave_up": 0}
+
+    def is_retryable(self, error: BaseException) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in RETRYABLE_STATUS
+        return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+    def backoff(self, attempt: int, error: BaseException) -> Optional[float]:
+        """
+        计算第 attempt 次重试前的等待时间
+
+        Returns:
+            等待秒数；Retry-After 超过上限时返回None表示不再重试
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if isinstance(error, httpx.HTTPStatusError):
+            retry_after = parse_retry_after(error.response)
+            if retry_after is not None:
+                if retry_after > self.max_retry_after:
+                    return None
+                delay = max(delay, retry_after)
+        return delay
+
+    async def run(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """按策略执行并重试"""
+        attempt = 0
+        while True:
+            try:
+                return await fn()
+            except Exception as e:
+                await self.before_retry(attempt, e)
+                attempt += 1
+
+    async def before_retry(self, attempt: int, error: Exception):
+        """
+        判断是否重试并等待退避时间，不重试时抛出（转换后的）原异常
+
+        Args:
+            attempt: 已重试次数
+            error: 本次失败的异常
+        """
+        delay = None
+        if attempt < self.max_retries and self.is_retryable(error):
+            delay = self.backoff(attempt, error)
+
+        if delay is None:
+            if self.is_retryable(error):
+                self._stats["gave_up"] += 1
+            translated = self.translate(error)
+            if translated is error:
+                raise error
+            raise translated from error
+
+        self._stats["retries"] += 1
+        reason = self._reason(error)
+        self._stats[f"retries_{reason}"] = self._stats.get(f"retries_{reason}", 0) + 1
+        logger.warning("Retrying LLM request", attempt=attempt + 1, reason=reason, delay=round(delay, 3))
+        await asyncio.sleep(delay)
+
+    @staticmethod
+    def translate(error: Exception) -> Exception:
+        """上游持续限流时转为过载错误，由接口层返回503"""
+        if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429:
+            return LLMOverloadedError(
+                "上游LLM服务限流，请稍后重试",
+                retry_after=parse_retry_after(error.response) or 1.0
+            )
+        return error
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+    @staticmethod
+    def _reason(error: BaseException) -> str:
+        if isinstance(error, httpx.HTTPStatusError):
+            return str(error.response.status_code)
+        if isinstance(error, httpx.TimeoutException):
+            return "timeout"
+        return "transport"
+
+
+class LatencyTracker:
+    """记录近期成功请求的耗时"""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        """样本不足时返回None"""
+        if len(self._samples) < min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Hedger:
+    """对冲请求"""
+
+    def __init__(self, quantile: float = 0.95, min_delay: float = 2.0):
+        """
+        Args:
+            quantile: 触发对冲的延迟分位数
+            min_delay: 对冲等待的最小时长（秒），避免对快速请求过度对冲
+        """
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.latency = LatencyTracker()
+        self._stats = {"hedged": 0, "hedge_wins": 0}
+
+    def delay(self) -> Optional[float]:
+        """当前对冲等待时长，样本不足时不对冲"""
+        q = self.latency.quantile(self.quantile)
+        return None if q is None else max(self.min_delay, q)
+
+    async def run(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """执行请求，超过对冲等待时长仍未返回时发起第二个请求"""
+        started = time.monotonic()
+        delay = self.delay()
+        primary = asyncio.create_task(fn())
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                self._stats["hedged"] += 1
+                pending.add(asyncio.create_task(fn()))
+
+            error: Optional[BaseException] = None
+            while True:
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is not primary:
+                        self._stats["hedge_wins"] += 1
+                    self.latency.record(time.monotonic() - started)
+                    return task.result()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        current = self.delay()
+        return {**self._stats, "delay_seconds": round(current, 3) if current is not None else None}
@@ -0,0 +1,249 @@
+"""
+Schema 获取与缓存 - 从主后端拉取Schema定义并在进程内缓存
+
+- 按 schema_id + version 缓存，条目中保存序列化后的Prompt文本，避免每次请求重复序列化
+- 过期后用 ETag / If-None-Match 条件请求重新验证，未变化时后端返回304
+- stale-while-revalidate：过期不久的条目先直接返回，同时在后台刷新
+- 后端不可用时退回旧缓存，完全没有缓存时使用内置的默认Schema
+
+后端只有一个接口 GET /graph/schema，返回最新版本；schema_id 通过 schemaId
+查询参数传递（default 不带参数）。历史版本只能从本进程已缓存的版本中获取。
+"""
+import asyncio
+import json
+import time
+from functools import cached_property
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import structlog
+
+from app.config import settings
+from app.core.singleflight import SingleFlight
+
+logger = structlog.get_logger()
+
+
+# 后端不可用且无缓存时使用的默认Schema
+FALLBACK_SCHEMA: Dict[str, Any] = {
+    "version": "fallback",
+    "entityTypes": {
+        "Project": {"code": "Project", "label": "项目"},
+        "Domain": {"code": "Domain", "label": "领域"},
+        "Epic": {"code": "Epic", "label": "史诗"},
+        "Feature": {"code": "Feature", "label": "特性"}
+    },
+    "relationTypes": {
+        "contains": {"id": "contains", "label": "包含", "from": ["Project"], "to": ["Domain"]},
+        "has_epic": {"id": "has_epic", "label": "有史诗", "from": ["Domain"], "to": ["Epic"]},
+        "has_feature": {"id": "has_feature", "label": "有特性", "from": ["Epic"], "to": ["Feature"]}
+    }
+}
+
+
+def relation_endpoints(relation: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """关系的源/目标类型（兼容 from/to 列表与 sourceType/targetType 两种写法）"""
+    sources = relation.get("from") or ([relation["sourceType"]] if relation.get("sourceType") else [])
+    targets = relation.get("to") or ([relation["targetType"]] if relation.get("targetType") else [])
+    return list(sources), list(targets)
+
+
+class SchemaVersionNotFoundError(LookupError):
+    """请求的Schema版本既不在缓存中，也不是后端当前的最新版本"""
+
+
+class CachedSchema:
+    """一个缓存的Schema版本"""
+
+    def __init__(self, schema_id: str, schema: Dict[str, Any], etag: Optional[str] = None):
+        self.schema_id = schema_id
+        self.schema = schema
+        self.version = str(schema.get("version", ""))
+        self.etag = etag
+        self.fetched_at = time.monotonic()
+
+    @property
+    def entity_types(self) -> Dict[str, Any]:
+        return self.schema.get("entityTypes", {})
+
+    @property
+    def relation_types(self) -> Dict[str, Any]:
+        return self.schema.get("relationTypes", {})
+
+    @cached_property
+    def prompt_json(self) -> str:
+        """用于Prompt的Schema文本（只序列化一次）"""
+        return json.dumps(
+            {"entityTypes": self.entity_types, "relationTypes": self.relation_types},
+            ensure_ascii=False
+        )
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class SchemaStore:
+    """Schema缓存"""
+
+    def __init__(
+        self,
+        base_url: str = None,
+        ttl: int = None,
+        stale_ttl: int = None,
+        timeout: float = None
+    ):
+        """
+        Args:
+            base_url: 主后端API地址
+            ttl: 新鲜期（秒），期间直接返回缓存
+            stale_ttl: 过期后仍可先返回旧值的时长（秒）
+            timeout: 请求超时（秒）
+        """
+        self.base_url = (base_url or settings.BACKEND_API_URL).rstrip("/")
+        self.ttl = ttl if ttl is not None else settings.SCHEMA_CACHE_TTL
+        self.stale_ttl = stale_ttl if stale_ttl is not None else settings.SCHEMA_CACHE_STALE_TTL
+        self.timeout = timeout if timeout is not None else settings.SCHEMA_REQUEST_TIMEOUT
+
+        self._versions: Dict[Tuple[str, str], CachedSchema] = {}
+        self._latest: Dict[str, CachedSchema] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight = SingleFlight()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._background: set = set()
+        self._stats = {"hits": 0, "stale_hits": 0, "fetches": 0, "not_modified": 0, "errors": 0, "fallbacks": 0}
+
+    async def get(self, schema_id: str = "default", version: Optional[str] = None) -> CachedSchema:
+        """
+        获取Schema
+
+        Args:
+            schema_id: Schema ID
+            version: 指定版本，为空时取最新版本
+
+        Returns:
+            CachedSchema
+
+        Raises:
+            SchemaVersionNotFoundError: 指定的版本不可用
+        """
+        if version is None:
+            return await self._get_latest(schema_id)
+
+        if (schema_id, version) in self._versions:
+            self._stats["hits"] += 1
+            return self._versions[(schema_id, version)]
+
+        latest = await self._get_latest(schema_id)
+        if latest.version != version:
+            raise SchemaVersionNotFoundError(
+                f"Schema {schema_id} 的版本 {version} 不存在（当前版本 {latest.version}）"
+            )
+        return latest
+
+    async def _get_latest(self, schema_id: str) -> CachedSchema:
+        cached = self._latest.get(schema_id)
+        if cached is not None:
+            age = cached.age()
+            if age < self.ttl:
+                self._stats["hits"] += 1
+                return cached
+            if age < self.ttl + self.stale_ttl:
+                self._stats["stale_hits"] += 1
+                self._revalidate_in_background(schema_id)
+                return cached
+
+        return await self.refresh(schema_id)
+
+    async def refresh(self, schema_id: str) -> CachedSchema:
+        """立即向后端重新验证（并发请求合并为一次）"""
+        return await self._inflight.do(schema_id, lambda: self._fetch(schema_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "cached_schemas": len(self._latest), "cached_versions": len(self._versions)}
+
+    def start_background_refresh(self, interval: int):
+        """定期刷新已缓存的Schema"""
+        if interval <= 0 or self._refresh_task is not None:
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_loop(interval))
+
+    async def close(self):
+        """停止后台刷新并关闭HTTP客户端"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        for task in list(self._background):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _fetch(self, schema_id: str) -> CachedSchema:
+        cached = self._latest.get(schema_id)
+        headers = {}
+        if cached is not None and cached.etag:
+            headers["If-None-Match"] = cached.etag
+
+        params = {} if schema_id == "default" else {"schemaId": schema_id}
+        try:
+            self._stats["fetches"] += 1
+            response = await self._get_client().get(
+                f"{self.base_url}/graph/schema",
+                params=params,
+                headers=headers
+            )
+            if response.status_code == 304 and cached is not None:
+                self._stats["not_modified"] += 1
+                cached.fetched_at = time.monotonic()
+                return cached
+
+            response.raise_for_status()
+            body = response.json()
+            schema = body.get("data", body) if isinstance(body, dict) else body
+
+        except (httpx.HTTPError, ValueError) as e:
+            self._stats["errors"] += 1
+            if cached is not None:
+                logger.warning("Schema fetch failed, serving stale copy", schema_id=schema_id, error=str(e))
+                return cached
+            logger.warning("Schema fetch failed, using fallback schema", schema_id=schema_id, error=str(e))
+            self._stats["fallbacks"] += 1
+            # 缓存默认Schema，避免后端不可用时每个请求都等待超时
+            fallback = CachedSchema(schema_id, FALLBACK_SCHEMA)
+            self._latest[schema_id] = fallback
+            return fallback
+
+        entry = CachedSchema(schema_id, schema, etag=response.headers.get("etag"))
+        previous = self._versions.get((schema_id, entry.version))
+        if previous is not None and previous.etag == entry.etag:
+            # 版本与内容都未变化，沿用已序列化的条目
+            previous.fetched_at = entry.fetched_at
+            entry = previous
+        self._versions[(schema_id, entry.version)] = entry
+        self._latest[schema_id] = entry
+        logger.info("Schema loaded", schema_id=schema_id, version=entry.version,
+                    entity_types=len(entry.entity_types), relation_types=len(entry.relation_types))
+        return entry
+
+    def _revalidate_in_background(self, schema_id: str):
+        task = asyncio.create_task(self.refresh(schema_id))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _refresh_loop(self, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            for schema_id in list(self._latest):
+                try:
+                    await self.refresh(schema_id)
+                except Exception as e:
+                    logger.warning("Background schema refresh failed", schema_id=schema_id, error=str(e))
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+
+# 全局实例
+schema_store = SchemaStore()
@@ -0,0 +1,303 @@
+"""
+OAG Schema 校验 - 本地、确定性地校验生成的实体与关系，无需调用LLM
+
+Schema 编译为查找表（每个 CachedSchema 只编译一次）：
+- 实体类型 -> 必填属性、属性类型、枚举取值
+- 关系类型 x 实体类型 的源/目标允许矩阵（numpy 布尔矩阵），整批关系的端点一次索引完成检查
+
+校验结果为逐条的问题列表；auto-repair 只做有把握的修正（大小写/标签纠正类型、
+补全缺失的名称、交换反向关系、关系类型无效时按端点类型推断唯一可能的类型），
+无法修正的条目删除。
+"""
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.schema_store import CachedSchema, relation_endpoints
+
+ERROR = "error"
+WARNING = "warning"
+
+_NUMBER_TYPES = {"Integer": int, "Float": float}
+
+
+class CompiledSchema:
+    """Schema 的查找表"""
+
+    def __init__(self, cached: CachedSchema):
+        self.entity_codes: List[str] = list(cached.entity_types)
+        self.type_index: Dict[str, int] = {code: i for i, code in enumerate(self.entity_codes)}
+        # 大小写不敏感的代码与标签 -> 类型代码，用于修正
+        self.type_aliases: Dict[str, str] = {}
+        self.required: Dict[str, List[str]] = {}
+        self.properties: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for code, spec in cached.entity_types.items():
+            self.type_aliases.setdefault(code.lower(), code)
+            if spec.get("label"):
+                self.type_aliases.setdefault(str(spec["label"]).lower(), code)
+            properties = {name: p for name, p in (spec.get("properties") or {}).items() if isinstance(p, dict)}
+            self.properties[code] = properties
+            # id 是实体的顶层字段，不在 properties 中
+            self.required[code] = [name for name, p in properties.items() if p.get("required") and name != "id"]
+
+        self.relation_codes: List[str] = list(cached.relation_types)
+        self.relation_index: Dict[str, int] = {code: i for i, code in enumerate(self.relation_codes)}
+        self.relation_aliases: Dict[str, str] = {}
+        # 多出的最后一列对应未知实体类型，始终为False
+        unknown = len(self.entity_codes)
+        self.allowed_from = np.zeros((len(self.relation_codes), unknown + 1), dtype=bool)
+        self.allowed_to = np.zeros((len(self.relation_codes), unknown + 1), dtype=bool)
+        for row, (code, spec) in enumerate(cached.relation_types.items()):
+            self.relation_aliases.setdefault(code.lower(), code)
+            if spec.get("label"):
+                self.relation_aliases.setdefault(str(spec["label"]).lower(), code)
+            sources, targets = relation_endpoints(spec)
+            # 未声明端点的关系类型不限制
+            self._allow(self.allowed_from[row], sources)
+            self._allow(self.allowed_to[row], targets)
+
+    def _allow(self, row: np.ndarray, codes: List[str]):
+        if not codes:
+            row[:-1] = True
+        for code in codes:
+            if code in self.type_index:
+                row[self.type_index[code]] = True
+
+    def type_id(self, code: Optional[str]) -> int:
+        return self.type_index.get(code, len(self.entity_codes))
+
+    def relations_between(self, source_type: str, target_type: str) -> List[str]:
+        """源/目标类型之间允许的关系类型"""
+        mask = self.allowed_from[:, self.type_id(source_type)] & self.allowed_to[:, self.type_id(target_type)]
+        return [self.relation_codes[i] for i in np.flatnonzero(mask)]
+
+
+_compiled: "weakref.WeakKeyDictionary[CachedSchema, CompiledSchema]" = weakref.WeakKeyDictionary()
+
+
+def compile_schema(cached: CachedSchema) -> CompiledSchema:
+    """获取Schema的查找表（按 CachedSchema 缓存）"""
+    compiled = _compiled.get(cached)
+    if compiled is None:
+        compiled = _compiled[cached] = CompiledSchema(cached)
+    return compiled
+
+
+def _issue(level: str, kind: str, index: int, item_id: Any, code: str, message: str) -> Dict[str, Any]:
+    return {"level": level, "kind": kind, "index": index, "id": item_id, "code": code, "message": message}
+
+
+def _check_property(spec: Dict[str, Any], value: Any) -> Optional[str]:
+    """属性值与定义不符时返回问题描述"""
+    if value is None:
+        return None
+    values = spec.get("values")
+    if values and value not in values:
+        return f"取值 {value!r} 不在 {values} 中"
+    number_type = _NUMBER_TYPES.get(spec.get("type"))
+    if number_type is not None and not isinstance(value, bool):
+        try:
+            number_type(value)
+        except (TypeError, ValueError):
+            return f"取值 {value!r} 不是 {spec['type']}"
+    return None
+
+
+def validate_oag(cached: CachedSchema, oag: Dict[str, Any], strict: bool = True) -> Dict[str, Any]:
+    """
+    校验OAG
+
+    Args:
+        cached: Schema
+        oag: 生成的OAG（entities/relations）
+        strict: 严格模式下必填属性缺失、属性取值不符记为错误，否则记为警告
+
+    Returns:
+        {"valid", "errors", "warnings", "stats"}，问题条目含 kind / index / id / code / message
+    """
+    compiled = compile_schema(cached)
+    soft = ERROR if strict else WARNING
+    issues: List[Dict[str, Any]] = []
+    entities = oag.get("entities", [])
+    relations = oag.get("relations", [])
+
+    types_by_id: Dict[str, str] = {}
+    for i, entity in enumerate(entities):
+        entity_id, entity_type = entity.get("id"), entity.get("type")
+        if not entity_id:
+            issues.append(_issue(ERROR, "entity", i, None, "missing_id", "实体缺少id"))
+            continue
+        if entity_id in types_by_id:
+            issues.append(_issue(ERROR, "entity", i, entity_id, "duplicate_id", f"实体ID重复: {entity_id}"))
+            continue
+        types_by_id[entity_id] = entity_type
+        if entity_type not in compiled.type_index:
+            issues.append(_issue(ERROR, "entity", i, entity_id, "unknown_type", f"未知实体类型: {entity_type}"))
+            continue
+
+        properties = entity.get("properties") or {}
+        for name in compiled.required[entity_type]:
+            if properties.get(name) in (None, ""):
+                issues.append(_issue(soft, "entity", i, entity_id, "missing_property", f"缺少必填属性: {name}"))
+        specs = compiled.properties[entity_type]
+        for name, value in properties.items():
+            spec = specs.get(name)
+            if spec is None:
+                issues.append(_issue(WARNING, "entity", i, entity_id, "unknown_property", f"未定义的属性: {name}"))
+                continue
+            problem = _check_property(spec, value)
+            if problem:
+                issues.append(_issue(soft, "entity", i, entity_id, "invalid_property", f"属性 {name} {problem}"))
+
+    # 关系端点整批检查
+    count = len(relations)
+    rel_rows = np.full(count, -1, dtype=np.int64)
+    source_cols = np.empty(count, dtype=np.int64)
+    target_cols = np.empty(count, dtype=np.int64)
+    for i, relation in enumerate(relations):
+        rel_rows[i] = compiled.relation_index.get(relation.get("type"), -1)
+        source_cols[i] = compiled.type_id(types_by_id.get(relation.get("source")))
+        target_cols[i] = compiled.type_id(types_by_id.get(relation.get("target")))
+    known = rel_rows >= 0
+    source_ok = target_ok = np.ones(count, dtype=bool)
+    if count and compiled.relation_codes:
+        rows = np.where(known, rel_rows, 0)
+        source_ok = ~known | compiled.allowed_from[rows, source_cols]
+        target_ok = ~known | compiled.allowed_to[rows, target_cols]
+
+    seen = set()
+    for i, relation in enumerate(relations):
+        rid = relation.get("id") or f"{relation.get('source')}-{relation.get('type')}->{relation.get('target')}"
+        missing = [end for end in ("source", "target") if relation.get(end) not in types_by_id]
+        if missing:
+            issues.append(_issue(ERROR, "relation", i, rid, "unknown_endpoint", f"关系端点不存在: {', '.join(missing)}"))
+            continue
+        if not known[i]:
+            issues.append(_issue(ERROR, "relation", i, rid, "unknown_type", f"未知关系类型: {relation.get('type')}"))
+            continue
+        if not source_ok[i]:
+            issues.append(_issue(
+                ERROR, "relation", i, rid, "invalid_source",
+                f"{relation['type']} 的源类型不能是 {types_by_id[relation['source']]}"
+            ))
+        if not target_ok[i]:
+            issues.append(_issue(
+                ERROR, "relation", i, rid, "invalid_target",
+                f"{relation['type']} 的目标类型不能是 {types_by_id[relation['target']]}"
+            ))
+        key = (relation["source"], relation["type"], relation["target"])
+        if key in seen:
+            issues.append(_issue(WARNING, "relation", i, rid, "duplicate", "重复的关系"))
+        seen.add(key)
+
+    errors = [issue for issue in issues if issue["level"] == ERROR]
+    warnings = [issue for issue in issues if issue["level"] == WARNING]
+    return {
+        "valid": not errors,
+        "errors": errors,
+        "warnings": warnings,
+        "stats": {"entities": len(entities), "relations": count, "errors": len(errors), "warnings": len(warnings)},
+    }
+
+
+def repair_oag(
+    cached: CachedSchema,
+    oag: Dict[str, Any],
+    strict: bool = True
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    自动修正OAG后重新校验，不修改传入的 oag
+
+    Returns:
+        (修正后的OAG, 校验结果 + repairs: 修正/删除记录)
+    """
+    compiled = compile_schema(cached)
+    repairs: List[Dict[str, Any]] = []
+
+    entities: Dict[str, Dict[str, Any]] = {}
+    for entity in oag.get("entities", []):
+        entity_id, entity_type = entity.get("id"), entity.get("type")
+        if not entity_id or entity_id in entities:
+            repairs.append({"action": "drop_entity", "id": entity_id, "reason": "缺少id或id重复"})
+            continue
+        if entity_type not in compiled.type_index:
+            fixed = compiled.type_aliases.get(str(entity_type or "").lower())
+            if fixed is None:
+                repairs.append({"action": "drop_entity", "id": entity_id, "reason": f"未知实体类型: {entity_type}"})
+                continue
+            repairs.append({"action": "fix_type", "id": entity_id, "from": entity_type, "to": fixed})
+            entity_type = fixed
+
+        properties = dict(entity.get("properties") or {})
+        specs = compiled.properties[entity_type]
+        for name, value in list(properties.items()):
+            spec = specs.get(name)
+            if spec is None or not _check_property(spec, value):
+                continue
+            # 枚举按大小写不敏感匹配，仍不符的非必填属性删除
+            match = next((v for v in spec.get("values") or [] if str(v).lower() == str(value).lower()), None)
+            if match is not None:
+                properties[name] = match
+                repairs.append({"action": "fix_property", "id": entity_id, "property": name, "to": match})
+            elif name not in compiled.required[entity_type]:
+                del properties[name]
+                repairs.append({"action": "drop_property", "id": entity_id, "property": name})
+        label = entity.get("label")
+        if not label:
+            label = str(properties.get("name") or entity_id)
+            repairs.append({"action": "fill_label", "id": entity_id, "to": label})
+        if "name" in compiled.required[entity_type] and not properties.get("name"):
+            properties["name"] = label
+            repairs.append({"action": "fill_property", "id": entity_id, "property": "name"})
+
+        entities[entity_id] = {**entity, "type": entity_type, "label": label, "properties": properties}
+
+    relations: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    for relation in oag.get("relations", []):
+        source, target = entities.get(relation.get("source")), entities.get(relation.get("target"))
+        rid = relation.get("id") or f"{relation.get('source')}-{relation.get('type')}->{relation.get('target')}"
+        if source is None or target is None:
+            repairs.append({"action": "drop_relation", "id": rid, "reason": "端点不存在"})
+            continue
+
+        fixed = _repair_relation(compiled, relation, source, target)
+        if fixed is None:
+            repairs.append({"action": "drop_relation", "id": rid, "reason": "端点类型与关系类型不符"})
+            continue
+        if (fixed["source"], fixed["type"]) != (relation["source"], relation.get("type")):
+            repairs.append({
+                "action": "fix_relation",
+                "id": rid,
+                "type": fixed["type"],
+                "reversed": fixed["source"] != relation["source"]
+            })
+        relations.setdefault((fixed["source"], fixed["type"], fixed["target"]), fixed)
+
+    repaired = {"entities": list(entities.values()), "relations": list(relations.values())}
+    report = validate_oag(cached, repaired, strict)
+    report["repairs"] = repairs
+    return repaired, report
+
+
+def _repair_relation(
+    compiled: CompiledSchema,
+    relation: Dict[str, Any],
+    source: Dict[str, Any],
+    target: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """修正关系类型或方向，无法修正返回None"""
+    relation_type = relation.get("type")
+    if relation_type not in compiled.relation_index:
+        relation_type = compiled.relation_aliases.get(str(relation_type or "").lower())
+
+    forward = compiled.relations_between(source["type"], target["type"])
+    if relation_type is None:
+        # 类型无效时，端点类型之间只有一种关系可选才推断
+        return {**relation, "type": forward[0]} if len(forward) == 1 else None
+    if relation_type in forward:
+        return {**relation, "type": relation_type}
+    if relation_type in compiled.relations_between(target["type"], source["type"]):
+        return {**relation, "type": relation_type, "source": target["id"], "target": source["id"]}
+    # 类型有效但端点不符，不改成其他类型
+    return None
@@ -0,0 +1,167 @@
+"""
+语义缓存 - 按输入文本的向量相似度复用历史解析结果
+
+使用 faiss 内积索引（向量已归一化，内积即余弦相似度）；命中阈值以上的
+最近邻直接返回其存储的结果，索引与结果定期在线程池中持久化到磁盘。
+"""
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+import structlog
+
+from app.core.embeddings import Embedder, default_embedder
+
+logger = structlog.get_logger()
+
+
+class SemanticCache:
+    """基于向量相似度的结果缓存"""
+
+    INDEX_FILE = "index.faiss"
+    PAYLOAD_FILE = "payloads.json"
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries: int = 5000,
+        path: Optional[str] = None,
+        persist_interval: int = 300,
+        embedder: Embedder = None
+    ):
+        """
+        Args:
+            threshold: 命中所需的最小余弦相似度
+            max_entries: 最大条目数，超出后淘汰最早写入的条目
+            path: 持久化目录，为空时只在内存中
+            persist_interval: 两次自动持久化的最小间隔（秒）
+            embedder: 嵌入函数
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.path = Path(path) if path else None
+        self.persist_interval = persist_interval
+        self.embedder = embedder or default_embedder
+
+        self._index = faiss.IndexFlatIP(self.embedder.dimension)
+        self._texts: List[str] = []
+        self._payloads: List[Dict[str, Any]] = []
+        self._dirty = False
+        self._last_saved = time.monotonic()
+        self._stats = {"hits": 0, "misses": 0, "adds": 0, "evictions": 0}
+
+        if self.path is not None:
+            self.load()
+
+    def __len__(self) -> int:
+        return self._index.ntotal
+
+    def lookup(self, text: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        查找语义最接近的历史输入
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            (存储的结果, 相似度)，未达到阈值返回None
+        """
+        if self._index.ntotal == 0:
+            self._stats["misses"] += 1
+            return None
+
+        scores, ids = self._index.search(self.embedder.embed([text]), 1)
+        score, idx = float(scores[0][0]), int(ids[0][0])
+        if idx < 0 or score < self.threshold:
+            self._stats["misses"] += 1
+            return None
+
+        self._stats["hits"] += 1
+        return self._payloads[idx], score
+
+    def add(self, text: str, payload: Dict[str, Any]):
+        """写入一条记录（持久化见 persist）"""
+        if len(self._payloads) >= self.max_entries:
+            self._evict(max(1, self.max_entries // 10))
+
+        self._index.add(self.embedder.embed([text]))
+        self._texts.append(text)
+        self._payloads.append(payload)
+        self._stats["adds"] += 1
+        self._dirty = True
+
+    async def persist(self):
+        """距上次持久化超过间隔时在线程池中写盘，不阻塞事件循环"""
+        if self.path is None or not self._dirty:
+            return
+        if time.monotonic() - self._last_saved < self.persist_interval:
+            return
+        # 在事件循环中取快照，写盘期间仍可继续读写缓存
+        snapshot = self._snapshot()
+        self._dirty = False
+        self._last_saved = time.monotonic()
+        try:
+            await asyncio.to_thread(self._write, *snapshot)
+        except Exception as e:
+            self._dirty = True
+            logger.warning("Semantic cache save failed", path=str(self.path), error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": self._index.ntotal,
+        }
+
+    def save(self):
+        """持久化索引与结果"""
+        if self.path is None or not self._dirty:
+            return
+        self._write(*self._snapshot())
+        self._dirty = False
+        self._last_saved = time.monotonic()
+
+    def _snapshot(self) -> Tuple[Any, List[str], List[Dict[str, Any]]]:
+        return faiss.clone_index(self._index), list(self._texts), list(self._payloads)
+
+    def _write(self, index, texts: List[str], payloads: List[Dict[str, Any]]):
+        self.path.mkdir(parents=True, exist_ok=True)
+        faiss.write_index(index, str(self.path / self.INDEX_FILE))
+        with open(self.path / self.PAYLOAD_FILE, "w", encoding="utf-8") as f:
+            json.dump({"texts": texts, "payloads": payloads}, f, ensure_ascii=False)
+        logger.info("Semantic cache saved", path=str(self.path), entries=index.ntotal)
+
+    def load(self):
+        """从磁盘加载，文件不存在或维度不匹配时忽略"""
+        index_path = self.path / self.INDEX_FILE
+        payload_path = self.path / self.PAYLOAD_FILE
+        if not index_path.exists() or not payload_path.exists():
+            return
+
+        index = faiss.read_index(str(index_path))
+        with open(payload_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if index.d != self.embedder.dimension or index.ntotal != len(data["payloads"]):
+            logger.warning("Semantic cache on disk is incompatible, ignoring", path=str(self.path))
+            return
+
+        self._index = index
+        self._texts = data["texts"]
+        self._payloads = data["payloads"]
+        logger.info("Semantic cache loaded", path=str(self.path), entries=index.ntotal)
+
+    def _evict(self, count: int):
+        """淘汰最早写入的 count 条记录（重建索引）"""
+        keep = np.arange(count, self._index.ntotal)
+        vectors = self._index.reconstruct_n(0, self._index.ntotal)[keep]
+        self._index = faiss.IndexFlatIP(self.embedder.dimension)
+        self._index.add(vectors)
+        self._texts = self._texts[count:]
+        self._payloads = self._payloads[count:]
+        self._stats["evictions"] += count
@@ -0,0 +1,59 @@
+"""
+JSON 编解码 - 热路径统一入口，安装了 orjson 时使用 orjson，否则回退到标准库
+
+- loads 接受 bytes / str，直接解码HTTP响应体，无需先转成字符串
+- dumps 输出紧凑的UTF-8 bytes（不转义非ASCII），dataclass（Entity、Relation等）
+  按字段直接编码，不需要先转成字典
+- 解析失败抛出 json.JSONDecodeError（orjson.JSONDecodeError 是其子类），调用方无需区分后端
+"""
+import dataclasses
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 未安装时使用标准库
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def _default(obj: Any) -> Any:
+    """标准库无法直接编码的对象"""
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        # 浅拷贝即可，嵌套的dataclass会再次进入这里
+        return obj.__dict__
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """解码JSON"""
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        """编码为紧凑的UTF-8 JSON"""
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+else:
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """解码JSON"""
+        return json.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        """编码为紧凑的UTF-8 JSON"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def dumps_str(obj: Any) -> str:
+    """编码为JSON字符串"""
+    return dumps(obj).decode("utf-8")
+
+
+def sse_frame(event: Any) -> str:
+    """编码为一帧SSE数据"""
+    return f"data: {dumps_str(event)}\n\n"
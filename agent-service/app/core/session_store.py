@@ -0,0 +1,192 @@
+"""
+会话存储 - 跨请求保存会话的槽位、对话历史和最近一次生成的OAG
+
+- MemorySessionStore：进程内LRU，适用于单节点部署和本地调试
+- RedisSessionStore：多实例共享，依赖 redis 包
+
+两者都按TTL过期；历史消息只保留最近 max_history_messages 条，
+以紧凑JSON（短键名、消息存为数组）序列化。存储故障只记录日志，不影响请求。
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+import structlog
+
+from app.config import settings, AGENT_CONFIG
+from app.core.serialization import dumps, loads
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - 未安装时只能使用进程内存储
+    redis_asyncio = None
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class SessionData:
+    """一个会话的持久化内容"""
+    slots: Dict[str, Any] = field(default_factory=dict)
+    # 每条消息为 {"role", "content", "name"}
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    last_oag: Optional[Dict[str, Any]] = None
+
+    def dumps(self, max_messages: int) -> bytes:
+        """序列化，只保留最近 max_messages 条消息"""
+        messages = self.messages[-max_messages:] if max_messages > 0 else []
+        payload: Dict[str, Any] = {
+            "s": self.slots,
+            "m": [
+                [m["role"], m["content"], m["name"]] if m.get("name") else [m["role"], m["content"]]
+                for m in messages
+            ],
+        }
+        if self.last_oag is not None:
+            payload["o"] = self.last_oag
+        return dumps(payload)
+
+    @classmethod
+    def loads(cls, raw: bytes) -> "SessionData":
+        payload = loads(raw)
+        return cls(
+            slots=payload.get("s", {}),
+            messages=[
+                {"role": m[0], "content": m[1], "name": m[2] if len(m) > 2 else None}
+                for m in payload.get("m", [])
+            ],
+            last_oag=payload.get("o"),
+        )
+
+
+class SessionStore(Protocol):
+    """会话存储协议"""
+
+    async def load(self, session_id: str) -> Optional[SessionData]:
+        ...
+
+    async def save(self, session_id: str, data: SessionData):
+        ...
+
+    async def delete(self, session_id: str):
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    async def close(self):
+        ...
+
+
+class MemorySessionStore:
+    """进程内LRU会话存储"""
+
+    def __init__(self, max_sessions: int = 10000, ttl: int = 3600, max_messages: int = 20):
+        """
+        Args:
+            max_sessions: 最多保留的会话数，超出时淘汰最久未使用的会话
+            ttl: 会话过期时间（秒）
+            max_messages: 每个会话保留的历史消息数
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self._sessions: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "saves": 0, "evictions": 0}
+
+    async def load(self, session_id: str) -> Optional[SessionData]:
+        entry = self._sessions.get(session_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._sessions[session_id]
+            self._stats["misses"] += 1
+            return None
+        self._sessions.move_to_end(session_id)
+        self._stats["hits"] += 1
+        return SessionData.loads(entry[1])
+
+    async def save(self, session_id: str, data: SessionData):
+        self._sessions[session_id] = (time.monotonic() + self.ttl, data.dumps(self.max_messages))
+        self._sessions.move_to_end(session_id)
+        self._stats["saves"] += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "backend": "memory", "sessions": len(self._sessions)}
+
+    async def close(self):
+        pass
+
+
+class RedisSessionStore:
+    """Redis会话存储"""
+
+    def __init__(self, url: str, ttl: int = 3600, max_messages: int = 20, prefix: str = "agent:session:"):
+        """
+        Args:
+            url: Redis连接地址
+            ttl: 会话过期时间（秒），每次保存时刷新
+            max_messages: 每个会话保留的历史消息数
+            prefix: 键前缀
+        """
+        if redis_asyncio is None:
+            raise RuntimeError("redis 未安装，无法使用 Redis 会话存储")
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.prefix = prefix
+        self._client = redis_asyncio.from_url(url)
+        self._stats = {"hits": 0, "misses": 0, "saves": 0, "errors": 0}
+
+    async def load(self, session_id: str) -> Optional[SessionData]:
+        try:
+            raw = await self._client.get(self.prefix + session_id)
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.warning("Session load failed", session_id=session_id, error=str(e))
+            return None
+        if raw is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        return SessionData.loads(raw)
+
+    async def save(self, session_id: str, data: SessionData):
+        try:
+            await self._client.set(self.prefix + session_id, data.dumps(self.max_messages), ex=self.ttl)
+            self._stats["saves"] += 1
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.warning("Session save failed", session_id=session_id, error=str(e))
+
+    async def delete(self, session_id: str):
+        try:
+            await self._client.delete(self.prefix + session_id)
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.warning("Session delete failed", session_id=session_id, error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "backend": "redis"}
+
+    async def close(self):
+        await self._client.close()
+
+
+def build_session_store() -> SessionStore:
+    """根据配置创建会话存储，Redis不可用时退回进程内存储"""
+    max_messages = AGENT_CONFIG["max_history_messages"]
+    if settings.SESSION_STORE == "redis":
+        if redis_asyncio is not None:
+            return RedisSessionStore(settings.REDIS_URL, ttl=settings.REDIS_TTL, max_messages=max_messages)
+        logger.warning("redis package not installed, falling back to in-memory session store")
+    return MemorySessionStore(
+        max_sessions=settings.SESSION_STORE_MAX_SESSIONS,
+        ttl=settings.REDIS_TTL,
+        max_messages=max_messages
+    )
@@ -0,0 +1,139 @@
+"""
+请求合并 (single-flight) - 并发的相同请求只向上游发起一次
+
+上游调用运行在独立任务中，所有等待方共享同一结果；某个等待方被取消
+（如客户端断开）不影响其他等待方，只有最后一个等待方离开时才取消上游调用。
+"""
+import asyncio
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+class _Call:
+    """一次进行中的普通调用"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    """一次进行中的流式调用，增量片段广播给所有订阅方"""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """按键合并进行中的调用"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._stats = {"leaders": 0, "coalesced": 0, "cancelled": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "in_flight": len(self._calls) + len(self._streams)}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行调用，相同键的并发调用共享结果
+
+        Args:
+            key: 请求键
+            fn: 实际发起调用的协程工厂
+
+        Returns:
+            调用结果（异常同样共享）
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+            self._stats["leaders"] += 1
+        else:
+            self._stats["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+                self._stats["cancelled"] += 1
+            raise
+        finally:
+            call.waiters -= 1
+
+    async def stream(
+        self,
+        key: str,
+        factory: Callable[[], AsyncIterator[Any]]
+    ) -> AsyncGenerator[Any, None]:
+        """
+        流式调用，相同键的并发订阅方从头重放已收到的片段并继续接收新片段
+
+        Args:
+            key: 请求键
+            factory: 创建上游异步迭代器的函数
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.create_task(self._pump(broadcast, factory))
+            broadcast.task.add_done_callback(lambda _: self._forget(self._streams, key, broadcast))
+            self._stats["leaders"] += 1
+        else:
+            self._stats["coalesced"] += 1
+
+        broadcast.subscribers += 1
+        position = 0
+        try:
+            while True:
+                if position < len(broadcast.chunks):
+                    chunk = broadcast.chunks[position]
+                    position += 1
+                    yield chunk
+                    continue
+                if broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                async with broadcast.changed:
+                    await broadcast.changed.wait_for(
+                        lambda: broadcast.done or position < len(broadcast.chunks)
+                    )
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.task.done():
+                broadcast.task.cancel()
+                self._stats["cancelled"] += 1
+
+    async def _pump(self, broadcast: _Broadcast, factory: Callable[[], AsyncIterator[Any]]):
+        """读取上游并广播"""
+        try:
+            async for chunk in factory():
+                broadcast.chunks.append(chunk)
+                async with broadcast.changed:
+                    broadcast.changed.notify_all()
+        except asyncio.CancelledError:
+            broadcast.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            broadcast.done = True
+            async with broadcast.changed:
+                broadcast.changed.notify_all()
+
+    @staticmethod
+    def _forget(registry: Dict[str, Any], key: str, entry: Any):
+        """调用结束后移除，之后的相同请求重新发起"""
+        if registry.get(key) is entry:
+            del registry[key]
@@ -0,0 +1,23 @@
+"""
+Token 估算 - 无需分词器的近似计数
+
+中日韩字符约按1个token计，其余字符约4个字符1个token，
+用于限流预估和Prompt预算，偏保守。
+"""
+import re
+from typing import Any, Dict, Iterable
+
+_CJK_RE = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_message_tokens(messages: Iterable[Dict[str, Any]]) -> int:
+    """估算消息列表的token数（每条消息额外计入少量格式开销）"""
+    return sum(estimate_tokens(m.get("content") or "") + 4 for m in messages)
@@ -0,0 +1,347 @@
+"""
+链路追踪 - 轻量的 OpenTelemetry 风格 span，按上下文自动建立父子关系
+
+- 采样在根span处决定（或沿用上游 traceparent 的采样标记），子span继承；
+  未采样或未启用时 start_span() 返回共享的空span，热路径上只有一次判断
+- 导出器：none（默认，不记录）/ memory（进程内环形缓冲，可通过接口查询）/
+  file（每个span一行JSON追加写入）
+- traceparent 采用 W3C Trace Context 格式: 00-<trace_id>-<span_id>-<flags>
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar, Token
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import structlog
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    """一次被追踪的操作"""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "start_time", "end_time",
+        "attributes", "events", "status", "_tracer", "_token", "_started"
+    )
+
+    recording = True
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.attributes = attributes
+        self.events: List[Dict[str, Any]] = []
+        self.status = "ok"
+        self._tracer = tracer
+        self._token: Optional[Token] = None
+        self._started = time.perf_counter()
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_time is None:
+            return None
+        return round((self.end_time - self.start_time) * 1000, 3)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes: Any):
+        self.events.append({"name": name, "time": time.time(), **attributes})
+
+    def record_exception(self, error: BaseException):
+        self.status = "error"
+        self.add_event("exception", type=type(error).__name__, message=str(error)[:500])
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def end(self):
+        if self.end_time is not None:
+            return
+        # 用单调时钟计算耗时，避免系统时间调整影响
+        self.end_time = self.start_time + (time.perf_counter() - self._started)
+        self._tracer._export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+            "events": self.events
+        }
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_exception(exc)
+        _current_span.reset(self._token)
+        self.end()
+        return False
+
+
+class _NoopSpan:
+    """未采样时的空span，所有操作都是空操作"""
+
+    __slots__ = ()
+
+    recording = False
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, **attributes: Any):
+        pass
+
+    def add_event(self, name: str, **attributes: Any):
+        pass
+
+    def record_exception(self, error: BaseException):
+        pass
+
+    def traceparent(self) -> Optional[str]:
+        return None
+
+    def end(self):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Unsampled(_NoopSpan):
+    """未采样的根span：占据当前span位置，使子span同样不记录"""
+
+    __slots__ = ("_token",)
+
+    def __enter__(self):
+        self._token = _current_span.set(NOOP_SPAN)
+        return NOOP_SPAN
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        return False
+
+
+_current_span: ContextVar[Any] = ContextVar("current_span", default=None)
+
+
+class SpanExporter:
+    """导出器基类"""
+
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryExporter(SpanExporter):
+    """进程内保留最近的若干条trace"""
+
+    def __init__(self, max_traces: int = 1000):
+        self.max_traces = max_traces
+        self._traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+
+    def export(self, span: Span):
+        spans = self._traces.get(span.trace_id)
+        if spans is None:
+            spans = self._traces[span.trace_id] = []
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+        spans.append(span.to_dict())
+
+    def get_trace(self, trace_id: str) -> Optional[List[Dict[str, Any]]]:
+        spans = self._traces.get(trace_id)
+        return sorted(spans, key=lambda s: s["start_time"]) if spans is not None else None
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """最近的trace摘要（以根span为准）"""
+        summaries = []
+        for trace_id in reversed(self._traces):
+            spans = self._traces[trace_id]
+            # 根span的父span不在本进程（为空或来自上游 traceparent）
+            span_ids = {s["span_id"] for s in spans}
+            root = next((s for s in spans if s["parent_id"] not in span_ids), spans[0])
+            summaries.append({
+                "trace_id": trace_id,
+                "name": root["name"],
+                "start_time": root["start_time"],
+                "duration_ms": root["duration_ms"],
+                "status": root["status"],
+                "span_count": len(spans)
+            })
+            if len(summaries) >= limit:
+                break
+        return summaries
+
+
+class FileExporter(SpanExporter):
+    """每个span一行JSON追加写入文件"""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class Tracer:
+    """
+    span工厂
+
+    Args:
+        exporter: 导出器，为None时不记录任何span
+        sample_rate: 根span的采样比例（0~1）
+    """
+
+    def __init__(self, exporter: Optional[SpanExporter] = None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self._stats = {"started": 0, "exported": 0, "export_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None and self.sample_rate > 0
+
+    def start_span(self, name: str, **attributes: Any):
+        """
+        开始一个span
+
+        用作上下文管理器时成为当前span；在异步生成器中应直接调用 end() 结束，
+        不要跨 yield 持有上下文。当前上下文没有span时作为根span并进行采样判断；
+        父span未采样时返回空span
+        """
+        if self.exporter is None:
+            return NOOP_SPAN
+        parent = _current_span.get()
+        if parent is None:
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                return _Unsampled()
+            return self._span(name, _new_id(16), None, attributes)
+        if not parent.recording:
+            return NOOP_SPAN
+        return self._span(name, parent.trace_id, parent.span_id, attributes)
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, **attributes: Any):
+        """
+        开始请求级根span，沿用上游 traceparent 的trace_id和采样标记
+
+        traceparent 缺失或格式不合法时按本地采样率开始新的trace
+        """
+        if self.exporter is None:
+            return NOOP_SPAN
+        parsed = parse_traceparent(traceparent) if traceparent else None
+        if parsed is None:
+            return self.start_span(name, **attributes)
+        trace_id, parent_id, sampled = parsed
+        if not sampled:
+            return _Unsampled()
+        return self._span(name, trace_id, parent_id, attributes)
+
+    def _span(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> Span:
+        self._stats["started"] += 1
+        return Span(self, name, trace_id, parent_id, attributes)
+
+    def _export(self, span: Span):
+        try:
+            self.exporter.export(span)
+            self._stats["exported"] += 1
+        except Exception as e:
+            # 导出失败不影响业务请求
+            self._stats["export_errors"] += 1
+            logger.warning("Span export failed", span=span.name, error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "exporter": type(self.exporter).__name__ if self.exporter is not None else None,
+            "sample_rate": self.sample_rate,
+            **self._stats
+        }
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+def current_span():
+    """当前上下文中的span，没有或未采样时返回空span"""
+    span = _current_span.get()
+    return span if span is not None else NOOP_SPAN
+
+
+def parse_traceparent(value: str) -> Optional[tuple]:
+    """解析W3C traceparent，返回 (trace_id, parent_span_id, sampled)，不合法时返回None"""
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 0x01)
+
+
+def build_tracer(exporter: str, sample_rate: float = 1.0, path: str = "", max_traces: int = 1000) -> Tracer:
+    """按配置构建Tracer"""
+    if exporter == "memory":
+        return Tracer(MemoryExporter(max_traces), sample_rate)
+    if exporter == "file":
+        return Tracer(FileExporter(path), sample_rate)
+    if exporter not in ("", "none"):
+        logger.warning("Unknown tracing exporter, tracing disabled", exporter=exporter)
+    return Tracer(None, sample_rate)
+
+
+# 全局Tracer
+tracer = build_tracer(
+    settings.TRACING_EXPORTER,
+    sample_rate=settings.TRACING_SAMPLE_RATE,
+    path=settings.TRACING_FILE_PATH,
+    max_traces=settings.TRACING_MAX_TRACES
+)
@@ -0,0 +1,282 @@
+"""
+本地向量索引 - 已有图谱实体的检索，为OAG生成提供参考
+
+- 每个节点一条文档（名称、类型、简短属性与相邻关系），按来源（文件/图谱）分组
+- 支持增量写入与删除：同一来源重新导入时替换其全部文档，目录导入按文件修改时间跳过未变化的文件
+- faiss IndexIDMap2 + 内积索引（向量已归一化，内积即余弦相似度），持久化后以内存映射方式加载
+- 嵌入函数可替换（Embedder 协议），默认的哈希嵌入完全离线
+"""
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+import structlog
+
+from app.core.embeddings import Embedder, default_embedder
+from app.core.entity_index import normalize_label
+
+logger = structlog.get_logger()
+
+# 按句子/分句切分查询，短查询与节点文本的相似度更有区分度
+_CLAUSE_RE = re.compile(r"[\n。；;：:！!？?，,、]+")
+# 写入文档文本的属性值最大长度
+MAX_VALUE_LENGTH = 60
+# 每个节点在文档中保留的相邻关系数
+MAX_NEIGHBORS = 8
+
+
+def graph_documents(graph: Dict[str, Any], source: str) -> List[Dict[str, Any]]:
+    """
+    把图谱转换为文档，兼容 data.nodes/edges、nodes/edges、entities/relations 三种格式
+
+    Returns:
+        [{"key", "text", "metadata"}]
+    """
+    body = graph.get("data") if isinstance(graph.get("data"), dict) else graph
+    nodes = body.get("nodes") or body.get("entities") or []
+    edges = body.get("edges") or body.get("relations") or []
+
+    labels: Dict[str, str] = {}
+    for node in nodes:
+        if isinstance(node, dict) and node.get("id"):
+            data = node.get("data") or node.get("properties") or {}
+            labels[node["id"]] = str(node.get("label") or data.get("name") or node["id"])
+
+    neighbors: Dict[str, List[str]] = {}
+    for edge in edges:
+        if not isinstance(edge, dict) or edge.get("source") not in labels or edge.get("target") not in labels:
+            continue
+        line = f"{labels[edge['source']]} -{edge.get('type', '')}-> {labels[edge['target']]}"
+        for end in (edge["source"], edge["target"]):
+            bucket = neighbors.setdefault(end, [])
+            if len(bucket) < MAX_NEIGHBORS:
+                bucket.append(line)
+
+    documents = []
+    for node in nodes:
+        if not isinstance(node, dict) or not node.get("id"):
+            continue
+        node_id, node_type = node["id"], node.get("type", "")
+        data = node.get("data") or node.get("properties") or {}
+        values = [
+            str(v) for k, v in data.items()
+            if k != "id" and isinstance(v, (str, int, float)) and len(str(v)) <= MAX_VALUE_LENGTH
+        ]
+        documents.append({
+            "key": f"{source}:{node_id}",
+            "text": " ".join([labels[node_id], node_type, *values]),
+            "metadata": {
+                "source": source,
+                "id": node_id,
+                "type": node_type,
+                "label": labels[node_id],
+                "relations": neighbors.get(node_id, []),
+            },
+        })
+    return documents
+
+
+class VectorStore:
+    """图谱实体向量索引"""
+
+    INDEX_FILE = "graph_index.faiss"
+    DOCS_FILE = "graph_docs.json"
+
+    def __init__(self, path: Optional[str] = None, embedder: Embedder = None):
+        """
+        Args:
+            path: 持久化目录，为空时只在内存中
+            embedder: 嵌入函数
+        """
+        self.path = Path(path) if path else None
+        self.embedder = embedder or default_embedder
+
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.embedder.dimension))
+        self._docs: Dict[int, Dict[str, Any]] = {}
+        self._keys: Dict[str, int] = {}
+        self._sources: Dict[str, Dict[str, Any]] = {}
+        self._next_id = 0
+        self._dirty = False
+
+        if self.path is not None:
+            self.load()
+
+    def __len__(self) -> int:
+        return self._index.ntotal
+
+    def add(self, documents: Iterable[Dict[str, Any]]) -> int:
+        """
+        写入文档，key 已存在的文档被替换
+
+        Args:
+            documents: [{"key", "text", "metadata"}]
+
+        Returns:
+            写入的文档数
+        """
+        documents = list({doc["key"]: doc for doc in documents}.values())
+        if not documents:
+            return 0
+        self.delete(doc["key"] for doc in documents)
+
+        ids = np.arange(self._next_id, self._next_id + len(documents), dtype=np.int64)
+        self._next_id += len(documents)
+        self._index.add_with_ids(self.embedder.embed([doc["text"] for doc in documents]), ids)
+        for doc_id, doc in zip(ids.tolist(), documents):
+            self._docs[doc_id] = {"key": doc["key"], "text": doc["text"], "metadata": doc.get("metadata", {})}
+            self._keys[doc["key"]] = doc_id
+        self._dirty = True
+        return len(documents)
+
+    def delete(self, keys: Iterable[str]) -> int:
+        """删除文档，返回实际删除数"""
+        ids = [self._keys.pop(key) for key in keys if key in self._keys]
+        if not ids:
+            return 0
+        self._index.remove_ids(np.array(ids, dtype=np.int64))
+        for doc_id in ids:
+            del self._docs[doc_id]
+        self._dirty = True
+        return len(ids)
+
+    def ingest_graph(self, graph: Dict[str, Any], source: str, mtime: float = None) -> int:
+        """导入一个图谱，替换该来源之前导入的全部文档"""
+        self.delete_source(source)
+        documents = graph_documents(graph, source)
+        added = self.add(documents)
+        self._sources[source] = {"keys": [doc["key"] for doc in documents], "mtime": mtime}
+        return added
+
+    def delete_source(self, source: str) -> int:
+        info = self._sources.pop(source, None)
+        return self.delete(info["keys"]) if info else 0
+
+    def ingest_directory(self, path: str, pattern: str = "**/*.json") -> Dict[str, int]:
+        """
+        增量导入目录下的图谱文件：未变化的文件跳过，已删除的文件移除其文档，
+        不含节点的JSON文件忽略
+
+        Returns:
+            统计信息
+        """
+        root = Path(path)
+        stats = {"files": 0, "skipped": 0, "removed": 0, "documents": 0}
+        if not root.is_dir():
+            logger.warning("Vector store corpus not found", path=path)
+            return stats
+
+        seen = set()
+        for file in sorted(root.glob(pattern)):
+            if self.path is not None and self.path.resolve() in file.resolve().parents:
+                continue
+            source = str(file.relative_to(root))
+            seen.add(source)
+            mtime = file.stat().st_mtime
+            if source in self._sources and self._sources[source]["mtime"] == mtime:
+                stats["skipped"] += 1
+                continue
+            try:
+                with open(file, "r", encoding="utf-8") as f:
+                    graph = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable graph file", path=str(file), error=str(e))
+                continue
+            if not isinstance(graph, dict):
+                continue
+            stats["documents"] += self.ingest_graph(graph, source, mtime)
+            stats["files"] += 1
+
+        for source in [s for s, info in self._sources.items() if info["mtime"] is not None and s not in seen]:
+            self.delete_source(source)
+            stats["removed"] += 1
+
+        logger.info("Vector store ingested", path=path, total=len(self), **stats)
+        return stats
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        min_score: float = 0.0,
+        types: Optional[Iterable[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        检索与查询相关的文档
+
+        长查询按分句分别检索，每条文档取各分句中的最高相似度；同名同类型的实体只返回一条。
+
+        Args:
+            query: 查询文本
+            top_k: 返回条数
+            min_score: 最小余弦相似度
+            types: 只返回这些实体类型
+
+        Returns:
+            [{"key", "score", "text", "metadata"}]，按相似度降序
+        """
+        if self._index.ntotal == 0:
+            return []
+        clauses = [c.strip() for c in _CLAUSE_RE.split(query) if c.strip()] or [query]
+        wanted = set(types) if types else None
+        # 同一实体可能出现在多个图谱文件中，多取一些候选用于去重和类型过滤
+        k = min(self._index.ntotal, top_k * 4)
+        scores, ids = self._index.search(self.embedder.embed(clauses), k)
+
+        # (类型, 规范化名称) -> (相似度, 文档ID)
+        best: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        for score, doc_id in zip(scores.ravel().tolist(), ids.ravel().tolist()):
+            if doc_id < 0 or score < min_score:
+                continue
+            metadata = self._docs[doc_id]["metadata"]
+            if wanted is not None and metadata.get("type") not in wanted:
+                continue
+            key = (metadata.get("type", ""), normalize_label(metadata.get("label")))
+            if score > best.get(key, (-1.0, -1))[0]:
+                best[key] = (score, doc_id)
+
+        ranked = sorted(best.values(), reverse=True)[:top_k]
+        return [{**self._docs[doc_id], "score": round(score, 4)} for score, doc_id in ranked]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"documents": self._index.ntotal, "sources": len(self._sources)}
+
+    def save(self):
+        """持久化索引与文档"""
+        if self.path is None or not self._dirty:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        faiss.write_index(self._index, str(self.path / self.INDEX_FILE))
+        with open(self.path / self.DOCS_FILE, "w", encoding="utf-8") as f:
+            json.dump({
+                "dimension": self.embedder.dimension,
+                "next_id": self._next_id,
+                "docs": {str(k): v for k, v in self._docs.items()},
+                "sources": self._sources,
+            }, f, ensure_ascii=False)
+        self._dirty = False
+        logger.info("Vector store saved", path=str(self.path), documents=self._index.ntotal)
+
+    def load(self):
+        """从磁盘加载（索引内存映射），文件不存在或不一致时忽略"""
+        index_path = self.path / self.INDEX_FILE
+        docs_path = self.path / self.DOCS_FILE
+        if not index_path.exists() or not docs_path.exists():
+            return
+
+        index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP)
+        with open(docs_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if data.get("dimension") != self.embedder.dimension or index.ntotal != len(data["docs"]):
+            logger.warning("Vector store on disk is incompatible, ignoring", path=str(self.path))
+            return
+
+        self._index = index
+        self._docs = {int(k): v for k, v in data["docs"].items()}
+        self._keys = {doc["key"]: doc_id for doc_id, doc in self._docs.items()}
+        self._sources = data["sources"]
+        self._next_id = data["next_id"]
+        logger.info("Vector store loaded", path=str(self.path), documents=index.ntotal)
@@ -1,4 +1,4 @@
-from .state import AgentState, Message, create_initial_state
+from .state import AgentState, Message, create_initial_state, oag_payload
 from .workflow import agent_graph
 
-__all__ = ['AgentState', 'Message', 'create_initial_state', 'agent_graph']
+__all__ = ['AgentState', 'Message', 'create_initial_state', 'oag_payload', 'agent_graph']
@@ -0,0 +1,62 @@
+"""
+图检查点 - 每个节点执行后保存状态快照，按 session_id 区分
+
+LangGraph 自带的 MemorySaver 会无限保留所有会话的全部快照，
+这里按会话LRU淘汰，并且每个会话只保留最近若干个快照。
+"""
+from collections import OrderedDict
+from typing import Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint import MemorySaver
+from langgraph.checkpoint.base import Checkpoint, CheckpointTuple
+
+
+class BoundedMemorySaver(MemorySaver):
+    """有容量上限的内存检查点存储"""
+
+    def __init__(self, max_threads: int = 1000, max_per_thread: int = 20):
+        """
+        Args:
+            max_threads: 最多保留检查点的会话数
+            max_per_thread: 每个会话保留的快照数
+        """
+        super().__init__()
+        self.max_threads = max_threads
+        self.max_per_thread = max_per_thread
+        self._order: "OrderedDict[str, None]" = OrderedDict()
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        if thread_id not in self.storage:
+            # 避免 defaultdict 为不存在的会话创建空条目
+            return None
+        return super().get_tuple(config)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint) -> RunnableConfig:
+        saved = super().put(config, checkpoint)
+        thread_id = config["configurable"]["thread_id"]
+
+        snapshots = self.storage[thread_id]
+        if len(snapshots) > self.max_per_thread:
+            # ts 为ISO时间戳，字典序即时间顺序
+            for ts in sorted(snapshots)[:len(snapshots) - self.max_per_thread]:
+                del snapshots[ts]
+
+        self._order[thread_id] = None
+        self._order.move_to_end(thread_id)
+        while len(self._order) > self.max_threads:
+            oldest, _ = self._order.popitem(last=False)
+            self.storage.pop(oldest, None)
+        return saved
+
+    def delete(self, thread_id: str):
+        """删除会话的全部快照"""
+        self.storage.pop(thread_id, None)
+        self._order.pop(thread_id, None)
+
+    def stats(self):
+        return {
+            "threads": len(self._order),
+            "snapshots": sum(len(s) for s in self.storage.values()),
+        }
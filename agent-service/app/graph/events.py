@@ -0,0 +1,92 @@
+"""
+流式事件通道 - 把图节点执行过程中的事件实时推送给SSE端点
+
+节点和Agent通过 emit() 发送事件；只有在 bind_channel() 绑定了通道的
+上下文中（即流式接口）事件才会被投递，普通接口调用时 emit() 为空操作。
+"""
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from app.core.llm_client import kimi_client, Message as LLMMessage
+
+
+_current_channel: ContextVar[Optional["EventChannel"]] = ContextVar(
+    "agent_event_channel", default=None
+)
+
+# 通道关闭标记
+_CLOSED = object()
+
+
+class EventChannel:
+    """单次请求的事件队列"""
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._closed = False
+
+    def emit(self, event_type: str, **data: Any):
+        """发送事件（非阻塞）"""
+        if self._closed:
+            return
+        self._queue.put_nowait({"type": event_type, **data})
+
+    def close(self):
+        """关闭通道，消费者读完剩余事件后退出"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put_nowait(_CLOSED)
+
+    async def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        while True:
+            event = await self._queue.get()
+            if event is _CLOSED:
+                return
+            yield event
+
+
+def get_channel() -> Optional[EventChannel]:
+    """获取当前上下文绑定的事件通道"""
+    return _current_channel.get()
+
+
+def is_streaming() -> bool:
+    """当前是否处于流式请求上下文"""
+    return _current_channel.get() is not None
+
+
+def emit(event_type: str, **data: Any):
+    """向当前通道发送事件，未绑定通道时忽略"""
+    channel = _current_channel.get()
+    if channel is not None:
+        channel.emit(event_type, **data)
+
+
+@contextmanager
+def bind_channel(channel: EventChannel) -> Iterator[EventChannel]:
+    """在当前上下文绑定事件通道"""
+    token = _current_channel.set(channel)
+    try:
+        yield channel
+    finally:
+        _current_channel.reset(token)
+
+
+async def stream_completion(agent: str, messages: List[LLMMessage], **kwargs) -> str:
+    """
+    流式调用LLM并把每个增量作为 token 事件转发
+
+    Args:
+        agent: 发出事件的Agent名
+        messages: 消息列表
+
+    Returns:
+        完整的响应文本
+    """
+    chunks: List[str] = []
+    async for delta in kimi_client.chat_stream(messages, **kwargs):
+        chunks.append(delta)
+        emit("token", agent=agent, content=delta)
+    return "".join(chunks)
@@ -1,9 +1,12 @@
 """
 LangGraph 状态定义
 """
-from typing import TypedDict, Annotated, List, Dict, Any, Optional
+from typing import TypedDict, List, Dict, Any, Optional
 from dataclasses import dataclass, field
-import operator
+
+
+# 只属于当前这一轮输入的槽位，不跨轮保留
+TURN_SLOTS = frozenset({"description", "entities"})
 
 
 @dataclass
@@ -42,8 +45,8 @@ class AgentState(TypedDict):
     
     这是LangGraph的主状态，贯穿整个执行流程
     """
-    # 对话相关
-    messages: Annotated[List[Message], operator.add]
+    # 对话相关（节点原地追加消息并返回完整状态，不能使用累加reducer，否则每个节点都会重复一遍历史）
+    messages: List[Message]
     session_id: str
     
     # 用户输入
@@ -65,6 +68,7 @@ class AgentState(TypedDict):
     schema_id: Optional[str]
     entities_to_create: List[Entity]
     relations_to_create: List[Relation]
+    last_oag: Optional[Dict[str, Any]]  # 本会话上一次生成的OAG（entities/relations）
     
     # 工具调用
     tool_calls: List[Dict[str, Any]]
@@ -80,21 +84,42 @@ class AgentState(TypedDict):
     error: Optional[str]
 
 
-def create_initial_state(session_id: str, user_input: str) -> AgentState:
-    """创建初始状态"""
+def session_slots(slots: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """可跨轮保留的槽位（去掉本轮描述等临时槽位）"""
+    return {key: value for key, value in (slots or {}).items() if key not in TURN_SLOTS}
+
+
+def create_initial_state(
+    session_id: str,
+    user_input: str,
+    history: Optional[List[Message]] = None,
+    slots: Optional[Dict[str, Any]] = None,
+    last_oag: Optional[Dict[str, Any]] = None
+) -> AgentState:
+    """
+    创建初始状态
+    
+    Args:
+        session_id: 会话ID
+        user_input: 用户输入
+        history: 会话历史消息
+        slots: 会话已有的槽位（临时槽位会被丢弃）
+        last_oag: 会话上一次生成的OAG
+    """
     return AgentState(
-        messages=[Message(role="user", content=user_input)],
+        messages=[*(history or []), Message(role="user", content=user_input)],
         session_id=session_id,
         user_input=user_input,
         intent=None,
         entities=[],
-        slots={},
+        slots=session_slots(slots),
         current_agent=None,
         agent_results={},
         oag_id=None,
         schema_id=None,
         entities_to_create=[],
         relations_to_create=[],
+        last_oag=last_oag,
         tool_calls=[],
         tool_results=[],
         iteration_count=0,
@@ -103,3 +128,31 @@ def create_initial_state(session_id: str, user_input: str) -> AgentState:
         final_response=None,
         error=None
     )
+
+
+def oag_payload(state: AgentState) -> Dict[str, Any]:
+    """从最终状态提取OAG生成结果（可直接序列化为JSON）"""
+    return {
+        "success": not bool(state.get("error")),
+        "entities": [
+            {
+                "id": e.id,
+                "type": e.type,
+                "label": e.label,
+                "properties": e.properties
+            }
+            for e in state.get("entities_to_create", [])
+        ],
+        "relations": [
+            {
+                "id": r.id,
+                "source": r.source,
+                "target": r.target,
+                "type": r.type,
+                "label": r.label,
+                "properties": r.properties
+            }
+            for r in state.get("relations_to_create", [])
+        ],
+        "explanation": state.get("agent_results", {}).get("oag_generator", {}).get("explanation", "")
+    }
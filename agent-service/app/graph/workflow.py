@@ -2,8 +2,23 @@
 LangGraph 工作流定义
 主图定义和节点路由
 """
+import asyncio
+import time
+import uuid
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Sequence
+
 from langgraph.graph import StateGraph, END
-from app.graph.state import AgentState
+from app.config import settings
+from app.core.cassette import cassette
+from app.core.context import current_agent, current_session_id
+from app.core.metrics import observe_node
+from app.core.rate_limiter import LLMOverloadedError
+from app.core.session_store import SessionData, build_session_store
+from app.core.tracing import tracer
+from app.graph import events
+from app.graph.checkpoint import BoundedMemorySaver
+from app.graph.state import AgentState, Message, create_initial_state, oag_payload, session_slots
+from app.agents.intent_classifier import build_intent_classifier
 from app.agents.nlu_agent import NLUAgent
 from app.agents.oag_generator_agent import OAGGeneratorAgent
 import structlog
@@ -15,24 +30,44 @@ class OntologyAgentGraph:
     """本体图谱Agent主图"""
     
     def __init__(self):
+        self.intent_classifier = build_intent_classifier()
         self.nlu_agent = NLUAgent()
         self.oag_generator = OAGGeneratorAgent()
-        self.graph = self._build_graph()
+        self.session_store = build_session_store()
+        self.checkpointer = BoundedMemorySaver(
+            max_threads=settings.GRAPH_CHECKPOINT_MAX_THREADS,
+            max_per_thread=settings.GRAPH_CHECKPOINT_PER_THREAD
+        ) if settings.GRAPH_CHECKPOINT_ENABLED else None
+        self.graph = self._build_graph(self.checkpointer)
+        # 批量条目等一次性运行不写检查点，避免挤掉交互会话的快照
+        self.ephemeral_graph = self._build_graph(None) if self.checkpointer is not None else self.graph
     
-    def _build_graph(self) -> StateGraph:
+    def _build_graph(self, checkpointer: Optional[BoundedMemorySaver]) -> StateGraph:
         """构建LangGraph"""
         
         # 创建状态图
         workflow = StateGraph(AgentState)
         
         # 添加节点
-        workflow.add_node("nlu", self.nlu_agent.run)
-        workflow.add_node("oag_generator", self.oag_generator.run)
-        workflow.add_node("router", self._router)
-        workflow.add_node("response", self._generate_response)
+        workflow.add_node("pre_classifier", self._node("pre_classifier", self._pre_classify))
+        workflow.add_node("nlu", self._node("nlu", self.nlu_agent.run))
+        workflow.add_node("oag_generator", self._node("oag_generator", self.oag_generator.run))
+        workflow.add_node("oag_updater", self._node("oag_updater", self.oag_generator.update))
+        workflow.add_node("router", self._node("router", self._router))
+        workflow.add_node("response", self._node("response", self._generate_response))
         
         # 定义边
-        workflow.set_entry_point("nlu")
+        workflow.set_entry_point("pre_classifier")
+        
+        # 快速分类命中时跳过NLU
+        workflow.add_conditional_edges(
+            "pre_classifier",
+            lambda state: "router" if state.get("intent") else "nlu",
+            {
+                "router": "router",
+                "nlu": "nlu"
+            }
+        )
         
         workflow.add_edge("nlu", "router")
         
@@ -42,16 +77,51 @@ class OntologyAgentGraph:
             self._route_by_intent,
             {
                 "create_oag": "oag_generator",
-                "update_oag": "oag_generator",
+                "update_oag": "oag_updater",
                 "general_chat": "response",
                 "end": END
             }
         )
         
         workflow.add_edge("oag_generator", "response")
+        workflow.add_edge("oag_updater", "response")
         workflow.add_edge("response", END)
         
-        return workflow.compile()
+        # 每个节点执行后按 session_id 保存快照，失败的运行可从最近的快照继续
+        return workflow.compile(checkpointer=checkpointer)
+    
+    def _node(self, name: str, func: Callable) -> Callable:
+        """包装节点函数：记录耗时指标与trace span，在流式请求中发出 node_start / node_end 事件"""
+        
+        async def wrapper(state: AgentState) -> AgentState:
+            events.emit("node_start", node=name)
+            agent_token = current_agent.set(name)
+            started = time.perf_counter()
+            failed = True
+            try:
+                with tracer.start_span(f"node.{name}", node=name) as span:
+                    result = await func(state)
+                    span.set_attributes(intent=result.get("intent"), error=result.get("error"))
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                current_agent.reset(agent_token)
+                observe_node(name, elapsed, failed)
+                events.emit("node_end", node=name, elapsed_ms=round(elapsed * 1000, 1))
+        
+        return wrapper
+    
+    async def _pre_classify(self, state: AgentState) -> AgentState:
+        """快速意图分类节点：规则/本地模型高置信命中时直接写入NLU结果"""
+        if self.intent_classifier is None:
+            return state
+        
+        result = self.intent_classifier.classify(state["user_input"])
+        if result is not None:
+            self.nlu_agent.apply_result(state, result, source="fast_path")
+        
+        return state
     
     async def _router(self, state: AgentState) -> AgentState:
         """路由器节点"""
@@ -96,6 +166,7 @@ class OntologyAgentGraph:
             entity_count = len(result.get("entities", []))
             relation_count = len(result.get("relations", []))
             explanation = result.get("explanation", "")
+            validation = result.get("validation")
             
             state["final_response"] = (
                 f"✅ 已成功生成OAG图谱！\n\n"
@@ -104,6 +175,31 @@ class OntologyAgentGraph:
                 f"- 关系数量: {relation_count}\n\n"
                 f"📝 说明:\n{explanation}"
             )
+            if validation and not validation["valid"]:
+                state["final_response"] += f"\n\n⚠️ Schema校验发现 {len(validation['errors'])} 个问题"
+        
+        elif intent == "update_oag" and "oag_generator" in state["agent_results"]:
+            result = state["agent_results"]["oag_generator"]
+            changes = result.get("changes")
+            if changes is None:
+                # 会话中没有可更新的图谱，已完整生成
+                state["final_response"] = (
+                    f"✅ 已生成OAG图谱！\n\n"
+                    f"📊 统计:\n"
+                    f"- 实体数量: {len(result.get('entities', []))}\n"
+                    f"- 关系数量: {len(result.get('relations', []))}\n\n"
+                    f"📝 说明:\n{result.get('explanation', '')}"
+                )
+            else:
+                state["final_response"] = (
+                    f"✅ 已更新OAG图谱！\n\n"
+                    f"📊 变更:\n"
+                    f"- 实体: 新增 {changes['added_entities']}, 修改 {changes['updated_entities']}, "
+                    f"删除 {changes['removed_entities']}\n"
+                    f"- 关系: 新增 {changes['added_relations']}, 删除 {changes['removed_relations']}\n"
+                    f"- 当前规模: {len(result['entities'])} 个实体, {len(result['relations'])} 个关系\n\n"
+                    f"📝 说明:\n{result.get('explanation', '')}"
+                )
         
         elif intent == "general_chat":
             state["final_response"] = (
@@ -117,30 +213,44 @@ class OntologyAgentGraph:
         else:
             state["final_response"] = "处理完成。"
         
+        events.emit("chunk", content=state["final_response"])
         return state
     
-    async def run(self, session_id: str, user_input: str) -> AgentState:
+    async def run(self, session_id: str, user_input: str, persist: bool = True) -> AgentState:
         """
         运行Agent图
         
         Args:
             session_id: 会话ID
             user_input: 用户输入
+            persist: 是否读写会话存储与检查点；一次性运行（如批量条目）传False
             
         Returns:
             最终状态
         """
-        from app.graph.state import create_initial_state
-        
-        initial_state = create_initial_state(session_id, user_input)
+        if cassette is not None and cassette.mode == "record":
+            cassette.record_input(session_id, user_input)
         
-        logger.info(
-            "Starting workflow",
-            session_id=session_id,
-            user_input=user_input
-        )
-        
-        result = await self.graph.ainvoke(initial_state)
+        with tracer.start_span("graph.run", session_id=session_id) as span:
+            # 载入会话历史、槽位和上一次的OAG
+            if persist:
+                with tracer.start_span("session.load"):
+                    initial_state = await self._load_session(session_id, user_input)
+            else:
+                initial_state = create_initial_state(session_id, user_input)
+            
+            logger.info(
+                "Starting workflow",
+                session_id=session_id,
+                user_input=user_input,
+                history_messages=len(initial_state["messages"]) - 1
+            )
+            
+            result = await self._invoke(session_id, initial_state, persist)
+            if persist:
+                with tracer.start_span("session.save"):
+                    await self._save_session(result)
+            span.set_attributes(intent=result.get("intent"), iterations=result.get("iteration_count"))
         
         logger.info(
             "Workflow completed",
@@ -150,6 +260,217 @@ class OntologyAgentGraph:
         )
         
         return result
+    
+    async def resume(self, session_id: str) -> AgentState:
+        """
+        从最近的检查点继续执行上一次未完成的运行（如LLM过载中断）
+        
+        Args:
+            session_id: 会话ID
+            
+        Returns:
+            最终状态
+        
+        Raises:
+            ValueError: 未启用检查点或该会话没有可继续的运行
+        """
+        snapshot = await self.get_checkpoint(session_id)
+        if snapshot is None or not snapshot.next:
+            raise ValueError(f"会话 {session_id} 没有可继续的运行")
+        
+        logger.info("Resuming workflow", session_id=session_id, next_nodes=list(snapshot.next))
+        result = await self._invoke(session_id, None)
+        await self._save_session(result)
+        return result
+    
+    async def get_checkpoint(self, session_id: str) -> Optional[Any]:
+        """会话最近的状态快照（StateSnapshot，含 values 与待执行节点 next），没有时返回None"""
+        if self.checkpointer is None:
+            return None
+        snapshot = await self.graph.aget_state(self._thread_config(session_id))
+        return snapshot if snapshot.values else None
+    
+    async def _invoke(self, session_id: str, state: Optional[AgentState], persist: bool = True) -> AgentState:
+        """执行图，state 为None时从检查点继续；persist 为False时不写检查点"""
+        # 绑定会话上下文，供LLM限流按会话公平排队
+        session_token = current_session_id.set(session_id)
+        try:
+            if self.checkpointer is None or not persist:
+                return await self.ephemeral_graph.ainvoke(state)
+            return await self.graph.ainvoke(state, self._thread_config(session_id))
+        finally:
+            current_session_id.reset(session_token)
+    
+    @staticmethod
+    def _thread_config(session_id: str) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": session_id}}
+    
+    async def _load_session(self, session_id: str, user_input: str) -> AgentState:
+        """从会话存储构建初始状态"""
+        session = await self.session_store.load(session_id)
+        if session is None:
+            return create_initial_state(session_id, user_input)
+        
+        history = [
+            Message(role=m["role"], content=m["content"], name=m.get("name"))
+            for m in session.messages
+        ]
+        return create_initial_state(
+            session_id,
+            user_input,
+            history=history,
+            slots=session.slots,
+            last_oag=session.last_oag
+        )
+    
+    async def _save_session(self, state: AgentState):
+        """保存本轮结束后的会话（历史窗口由存储截断）"""
+        messages = [{"role": m.role, "content": m.content, "name": m.name} for m in state["messages"]]
+        if state.get("final_response"):
+            messages.append({"role": "assistant", "content": state["final_response"], "name": "response"})
+        
+        last_oag = state.get("last_oag")
+        oag = state["agent_results"].get("oag_generator")
+        if oag and not state.get("error"):
+            last_oag = {"entities": oag["entities"], "relations": oag["relations"]}
+        
+        await self.session_store.save(
+            state["session_id"],
+            SessionData(slots=session_slots(state["slots"]), messages=messages, last_oag=last_oag)
+        )
+    
+    async def run_stream(
+        self,
+        session_id: str,
+        user_input: str
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        流式运行Agent图
+        
+        图在后台任务中执行，节点事件和LLM增量在产生时立即产出；
+        最后产出一个 result 事件携带最终状态。消费方提前退出时取消后台任务。
+        
+        Args:
+            session_id: 会话ID
+            user_input: 用户输入
+            
+        Yields:
+            事件字典，至少包含 type 字段
+        """
+        channel = events.EventChannel()
+        
+        async def execute() -> AgentState:
+            with events.bind_channel(channel):
+                try:
+                    return await self.run(session_id, user_input)
+                finally:
+                    channel.close()
+        
+        task = asyncio.create_task(execute())
+        try:
+            async for event in channel:
+                yield event
+            yield {"type": "result", "state": await task}
+        finally:
+            if not task.done():
+                task.cancel()
+    
+    async def run_batch(
+        self,
+        descriptions: Sequence[str],
+        concurrency: Optional[int] = None,
+        batch_id: Optional[str] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        批量生成OAG
+        
+        固定数量的worker并发执行，共享LLM连接池与限流；每条结果在完成时立即产出
+        （顺序与输入不同，用 index 对应），最后产出一条汇总。消费方提前退出时取消未完成的条目。
+        各条目是一次性运行，不写会话存储与检查点。
+        
+        Args:
+            descriptions: 业务描述列表
+            concurrency: 并发数，默认 OAG_BATCH_CONCURRENCY
+            batch_id: 批次ID，每条的会话ID（仅用于日志、trace与限流排队）为 {batch_id}-{index}
+            
+        Yields:
+            {"type": "item", "index", "session_id", "success", "entities", "relations",
+             "explanation", "error", "elapsed_ms"}，最后是 {"type": "summary", ...}
+        """
+        batch_id = batch_id or str(uuid.uuid4())
+        concurrency = max(1, min(concurrency or settings.OAG_BATCH_CONCURRENCY, len(descriptions) or 1))
+        pending: asyncio.Queue = asyncio.Queue()
+        for index, description in enumerate(descriptions):
+            pending.put_nowait((index, description))
+        done: asyncio.Queue = asyncio.Queue()
+        
+        async def worker():
+            while True:
+                try:
+                    index, description = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await done.put(await self._run_batch_item(batch_id, index, description))
+        
+        started = time.perf_counter()
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        latencies: List[float] = []
+        succeeded = 0
+        try:
+            for _ in range(len(descriptions)):
+                item = await done.get()
+                latencies.append(item["elapsed_ms"])
+                succeeded += item["success"]
+                yield item
+        finally:
+            for task in workers:
+                task.cancel()
+        
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        
+        def percentile(q: float) -> float:
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+        
+        summary = {
+            "type": "summary",
+            "batch_id": batch_id,
+            "total": len(descriptions),
+            "succeeded": succeeded,
+            "failed": len(descriptions) - succeeded,
+            "concurrency": concurrency,
+            "elapsed_seconds": round(elapsed, 3),
+            "items_per_second": round(len(descriptions) / elapsed, 3) if elapsed > 0 else 0.0,
+            "latency_ms": {
+                "avg": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": latencies[-1] if latencies else 0.0,
+            },
+        }
+        logger.info("OAG batch completed", **{k: v for k, v in summary.items() if k != "type"})
+        yield summary
+    
+    async def _run_batch_item(self, batch_id: str, index: int, description: str) -> Dict[str, Any]:
+        """执行批量中的一条，异常记录在结果中而不中断整个批次"""
+        session_id = f"{batch_id}-{index}"
+        started = time.perf_counter()
+        try:
+            result = await self.run(session_id, f"创建一个OAG图谱: {description}", persist=False)
+            item = {**oag_payload(result), "error": result.get("error")}
+        except Exception as e:
+            # 过载只影响该条，调用方可稍后重试失败的条目
+            if not isinstance(e, LLMOverloadedError):
+                logger.error("OAG batch item failed", session_id=session_id, error=str(e))
+            item = {"success": False, "entities": [], "relations": [], "explanation": "", "error": str(e)}
+        
+        return {
+            "type": "item",
+            "index": index,
+            "session_id": session_id,
+            **item,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
 
 
 # 全局图实例
@@ -1,15 +1,25 @@
 """
 FastAPI 主应用入口
 """
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, AsyncGenerator
+from typing import Any, List, Optional, AsyncGenerator
+import hashlib
+import math
 import uuid
-import json
 
-from app.config import settings
+from app.config import settings, TOOL_CONFIG
+from app.core.job_queue import CallbackURLError, JobQueue, JobQueueFullError
+from app.core.llm_client import KimiClient, kimi_client
+from app.core.metrics import RequestTimings, current_timings, metrics
+from app.core.rate_limiter import LLMOverloadedError
+from app.core.schema_store import SchemaVersionNotFoundError, schema_store
+from app.core.schema_validator import repair_oag, validate_oag
+from app.core.serialization import dumps, sse_frame
+from app.core.tracing import MemoryExporter, tracer
+from app.graph.state import oag_payload
 from app.graph.workflow import agent_graph
 import structlog
 
@@ -34,11 +44,20 @@ structlog.configure(
 
 logger = structlog.get_logger()
 
+
+class FastJSONResponse(JSONResponse):
+    """用 app.core.serialization 编码的JSON响应（可用时为orjson，dataclass直接编码）"""
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
-    description="基于LangGraph的本体图谱Agent服务"
+    description="基于LangGraph的本体图谱Agent服务",
+    default_response_class=FastJSONResponse
 )
 
 # CORS配置
@@ -51,6 +70,47 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def debug_timing(request: Request, call_next):
+    """请求带调试头时收集耗时明细，写入 Server-Timing 响应头（聊天/生成接口的响应体中同时返回）"""
+    if not request.headers.get(settings.DEBUG_TIMING_HEADER):
+        return await call_next(request)
+    
+    timings = RequestTimings()
+    token = current_timings.set(timings)
+    try:
+        response = await call_next(request)
+    finally:
+        current_timings.reset(token)
+    response.headers["Server-Timing"] = timings.server_timing()
+    return response
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    每个请求一个根span，沿用上游 traceparent；采样时在响应头中返回 X-Trace-Id
+    
+    根span在响应开始时结束，流式接口的后续处理仍挂在该trace下（见 graph.run span）
+    """
+    with tracer.start_trace(
+        f"{request.method} {request.url.path}",
+        traceparent=request.headers.get("traceparent"),
+        http_method=request.method,
+        http_target=request.url.path
+    ) as span:
+        response = await call_next(request)
+        if span.recording:
+            route = request.scope.get("route")
+            if route is not None:
+                span.name = f"{request.method} {route.path}"
+            span.set_attribute("http_status", response.status_code)
+            if response.status_code >= 500:
+                span.status = "error"
+            response.headers["X-Trace-Id"] = span.trace_id
+    return response
+
+
 # ============== 请求/响应模型 ==============
 
 class ChatRequest(BaseModel):
@@ -67,6 +127,7 @@ class ChatResponse(BaseModel):
     intent: Optional[str] = None
     entities: Optional[list] = []
     oag_data: Optional[dict] = None
+    timings: Optional[dict] = None  # 请求带调试头时的耗时明细
 
 
 class OAGGenerateRequest(BaseModel):
@@ -76,12 +137,90 @@ class OAGGenerateRequest(BaseModel):
     session_id: Optional[str] = None
 
 
+class OAGJobRequest(OAGGenerateRequest):
+    """OAG异步生成任务请求"""
+    callback_url: Optional[str] = None  # 任务结束后POST结果到该地址
+
+
+class OAGValidateRequest(BaseModel):
+    """OAG校验请求"""
+    entities: List[dict] = []
+    relations: List[dict] = []
+    schema_id: Optional[str] = "default"
+    repair: bool = False
+    strict: Optional[bool] = None
+
+
+class OAGBatchRequest(BaseModel):
+    """OAG批量生成请求"""
+    descriptions: List[str]
+    concurrency: Optional[int] = None
+
+
 class HealthResponse(BaseModel):
     """健康检查响应"""
     status: str
     version: str
 
 
+def _overloaded(error: LLMOverloadedError) -> HTTPException:
+    """LLM限流排队超时 -> 503"""
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    )
+
+
+def _timings() -> Optional[dict]:
+    """当前请求的耗时明细，未带调试头时为None"""
+    timings = current_timings.get()
+    return timings.to_dict() if timings is not None else None
+
+
+def _chat_response(session_id: str, result: dict) -> ChatResponse:
+    """由最终状态构建聊天响应"""
+    return ChatResponse(
+        session_id=session_id,
+        response=result.get("final_response", "处理完成"),
+        intent=result.get("intent"),
+        entities=result.get("entities", []),
+        oag_data={
+            "entities": [
+                {"id": e.id, "type": e.type, "label": e.label}
+                for e in result.get("entities_to_create", [])
+            ],
+            "relations": [
+                {"source": r.source, "target": r.target, "type": r.type}
+                for r in result.get("relations_to_create", [])
+            ]
+        } if result.get("entities_to_create") else None,
+        timings=_timings()
+    )
+
+
+async def _run_oag_job(payload: dict) -> dict:
+    """异步任务执行：生成OAG（调用方未指定会话时不写会话存储与检查点）"""
+    session_id = payload["session_id"]
+    result = await agent_graph.run(
+        session_id,
+        f"创建一个OAG图谱: {payload['description']}",
+        persist=payload.get("persist", True)
+    )
+    return {**oag_payload(result), "session_id": session_id, "error": result.get("error")}
+
+
+# 全局任务队列
+job_queue = JobQueue(
+    _run_oag_job,
+    workers=settings.JOB_WORKERS,
+    max_queue=settings.JOB_QUEUE_SIZE,
+    ttl=settings.JOB_TTL,
+    webhook_timeout=settings.JOB_WEBHOOK_TIMEOUT,
+    webhook_allowed_hosts=settings.JOB_WEBHOOK_ALLOWED_HOSTS.split(",")
+)
+
+
 # ============== API端点 ==============
 
 @app.get("/health", response_model=HealthResponse)
@@ -112,28 +251,32 @@ async def chat(request: ChatRequest):
         # 执行Agent图
         result = await agent_graph.run(session_id, request.message)
         
-        return ChatResponse(
-            session_id=session_id,
-            response=result.get("final_response", "处理完成"),
-            intent=result.get("intent"),
-            entities=result.get("entities", []),
-            oag_data={
-                "entities": [
-                    {"id": e.id, "type": e.type, "label": e.label}
-                    for e in result.get("entities_to_create", [])
-                ],
-                "relations": [
-                    {"source": r.source, "target": r.target, "type": r.type}
-                    for r in result.get("relations_to_create", [])
-                ]
-            } if result.get("entities_to_create") else None
-        )
+        return _chat_response(session_id, result)
+        
+    except LLMOverloadedError as e:
+        logger.warning("Chat rejected, LLM overloaded", session_id=session_id)
+        raise _overloaded(e)
         
     except Exception as e:
         logger.error("Chat processing error", error=str(e), session_id=session_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/v1/agent/session/{session_id}/resume", response_model=ChatResponse)
+async def resume_session(session_id: str):
+    """从最近的检查点继续该会话上一次未完成的运行"""
+    try:
+        result = await agent_graph.resume(session_id)
+        return _chat_response(session_id, result)
+        
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+        
+    except LLMOverloadedError as e:
+        logger.warning("Resume rejected, LLM overloaded", session_id=session_id)
+        raise _overloaded(e)
+
+
 @app.post("/api/v1/agent/chat/stream")
 async def chat_stream(request: ChatRequest):
     """
@@ -146,26 +289,22 @@ async def chat_stream(request: ChatRequest):
     async def generate() -> AsyncGenerator[str, None]:
         try:
             # 发送开始标记
-            yield f"data: {json.dumps({'type': 'start', 'session_id': session_id})}\n\n"
-            
-            # 执行Agent图
-            result = await agent_graph.run(session_id, request.message)
+            yield sse_frame({"type": "start", "session_id": session_id})
             
-            # 分段发送响应
-            response = result.get("final_response", "")
-            chunk_size = 20  # 每20个字符一个片段
+            # 执行Agent图，节点事件与LLM增量产生即转发
+            async for event in agent_graph.run_stream(session_id, request.message):
+                if event["type"] == "result":
+                    result = event["state"]
+                    # 发送完成标记
+                    yield sse_frame({"type": "end", "intent": result.get("intent")})
+                else:
+                    yield sse_frame(event)
             
-            for i in range(0, len(response), chunk_size):
-                chunk = response[i:i + chunk_size]
-                yield f"data: {json.dumps({'type': 'chunk', 'content': chunk})}\n\n"
-            
-            # 发送完成标记
-            yield f"data: {json.dumps({'type': 'end', 'intent': result.get('intent')})}\n\n"
             yield "data: [DONE]\n\n"
             
         except Exception as e:
             logger.error("Stream error", error=str(e))
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            yield sse_frame({"type": "error", "message": str(e)})
             yield "data: [DONE]\n\n"
     
     return StreamingResponse(
@@ -174,6 +313,7 @@ async def chat_stream(request: ChatRequest):
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",  # 禁止反向代理缓冲，保证增量及时送达
         }
     )
 
@@ -199,48 +339,280 @@ async def generate_oag(request: OAGGenerateRequest):
         
         result = await agent_graph.run(session_id, instruction)
         
-        return {
-            "success": not bool(result.get("error")),
+        # 实体/关系dataclass直接编码，不经过中间字典与 jsonable_encoder
+        content = {
+            "success": not result.get("error"),
             "session_id": session_id,
-            "entities": [
-                {
-                    "id": e.id,
-                    "type": e.type,
-                    "label": e.label,
-                    "properties": e.properties
-                }
-                for e in result.get("entities_to_create", [])
-            ],
-            "relations": [
-                {
-                    "source": r.source,
-                    "target": r.target,
-                    "type": r.type,
-                    "label": r.label,
-                    "properties": r.properties
-                }
-                for r in result.get("relations_to_create", [])
-            ],
+            "entities": result.get("entities_to_create", []),
+            "relations": result.get("relations_to_create", []),
             "explanation": result.get("agent_results", {}).get("oag_generator", {}).get("explanation", "")
         }
+        if current_timings.get() is not None:
+            content["timings"] = _timings()
+        return FastJSONResponse(content)
+        
+    except LLMOverloadedError as e:
+        logger.warning("OAG generation rejected, LLM overloaded", session_id=session_id)
+        raise _overloaded(e)
         
     except Exception as e:
         logger.error("OAG generation error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/v1/oag/generate/batch")
+async def generate_oag_batch(request: OAGBatchRequest):
+    """
+    批量生成OAG接口
+    
+    以NDJSON流式返回：每条描述完成时输出一行结果（含 index），最后一行为汇总统计
+    """
+    if not request.descriptions:
+        raise HTTPException(status_code=400, detail="descriptions 不能为空")
+    if len(request.descriptions) > settings.OAG_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多 {settings.OAG_BATCH_MAX_ITEMS} 条，实际 {len(request.descriptions)} 条"
+        )
+    
+    concurrency = min(request.concurrency or settings.OAG_BATCH_CONCURRENCY, settings.OAG_BATCH_MAX_CONCURRENCY)
+    batch_id = str(uuid.uuid4())
+    logger.info("OAG batch request", batch_id=batch_id, items=len(request.descriptions), concurrency=concurrency)
+    
+    async def generate() -> AsyncGenerator[bytes, None]:
+        async for item in agent_graph.run_batch(request.descriptions, concurrency=concurrency, batch_id=batch_id):
+            yield dumps(item) + b"\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Id": batch_id, "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/v1/oag/jobs", status_code=202)
+async def submit_oag_job(request: OAGJobRequest):
+    """
+    提交异步OAG生成任务
+    
+    立即返回任务ID，结果通过状态接口轮询、事件流订阅或回调URL获取
+    """
+    if request.callback_url:
+        try:
+            await job_queue.check_callback_url(request.callback_url)
+        except CallbackURLError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        job = job_queue.submit(
+            {
+                "description": request.description,
+                "session_id": request.session_id or str(uuid.uuid4()),
+                "persist": request.session_id is not None
+            },
+            callback_url=request.callback_url
+        )
+    except JobQueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/v1/oag/jobs/{job.id}",
+        "events_url": f"/api/v1/oag/jobs/{job.id}/events"
+    }
+
+
+@app.get("/api/v1/oag/jobs/{job_id}")
+async def get_oag_job(job_id: str):
+    """查询任务状态与结果"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return job.to_dict()
+
+
+@app.get("/api/v1/oag/jobs/{job_id}/events")
+async def oag_job_events(job_id: str):
+    """以SSE推送任务状态变化，任务结束后关闭"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    
+    async def generate() -> AsyncGenerator[str, None]:
+        yield sse_frame(job.to_dict())
+        while not job.done:
+            if await job.wait_changed(timeout=15):
+                yield sse_frame(job.to_dict())
+            else:
+                # 保持连接，避免代理超时断开
+                yield ": keepalive\n\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@app.delete("/api/v1/oag/jobs/{job_id}")
+async def cancel_oag_job(job_id: str):
+    """取消任务"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return job.to_dict()
+
+
+@app.post("/api/v1/oag/validate")
+async def validate_oag_endpoint(request: OAGValidateRequest):
+    """按Schema本地校验OAG，repair 为真时返回自动修正后的OAG"""
+    cached = await schema_store.get(request.schema_id)
+    oag = {"entities": request.entities, "relations": request.relations}
+    strict = TOOL_CONFIG["schema_validator"]["strict_mode"] if request.strict is None else request.strict
+    if request.repair:
+        repaired, report = repair_oag(cached, oag, strict)
+        return {**report, "oag": repaired}
+    return validate_oag(cached, oag, strict)
+
+
+@app.get("/api/v1/oag/search")
+async def search_entities(q: str, top_k: Optional[int] = None, type: Optional[str] = None):
+    """检索已有图谱中与查询相关的实体"""
+    vector_store = agent_graph.oag_generator.vector_store
+    if vector_store is None:
+        raise HTTPException(status_code=404, detail="图谱检索未启用")
+    hits = vector_store.search(
+        q,
+        top_k=min(top_k or TOOL_CONFIG["search"]["top_k"], 100),
+        min_score=settings.RAG_MIN_SCORE,
+        types=[type] if type else None
+    )
+    return {"query": q, "results": hits}
+
+
 @app.get("/api/v1/schema/{schema_id}")
-async def get_schema(schema_id: str):
-    """获取Schema定义"""
-    # 实际应从主后端服务获取
+async def get_schema(
+    schema_id: str,
+    version: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    """获取Schema定义（来自主后端，进程内缓存）"""
+    try:
+        cached = await schema_store.get(schema_id, version)
+    except SchemaVersionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    tag = f"{cached.schema_id}:{cached.version}:{cached.etag or ''}"
+    etag = f'"{hashlib.sha1(tag.encode("utf-8")).hexdigest()}"'
+    
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    return JSONResponse(
+        content={
+            "id": schema_id,
+            "version": cached.version,
+            "entityTypes": cached.entity_types,
+            "relationTypes": cached.relation_types
+        },
+        headers={"ETag": etag}
+    )
+
+
+@app.delete("/api/v1/agent/session/{session_id}")
+async def clear_session(session_id: str):
+    """清除会话的历史、槽位、上一次的OAG和检查点"""
+    await agent_graph.session_store.delete(session_id)
+    if agent_graph.checkpointer is not None:
+        agent_graph.checkpointer.delete(session_id)
+    return {"session_id": session_id, "cleared": True}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus 指标"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="指标未启用")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def _component_samples():
+    """各组件 stats() 中已有的计数，抓取时导出"""
+    stats = kimi_client.stats()
+    cache = stats["cache"] or {}
+    for result in ("hits", "misses"):
+        yield "llm_cache_lookups_total", "counter", "LLM响应缓存查找次数", {"result": result}, cache.get(result)
+    for key, value in stats["retry"].items():
+        if key.startswith("retries_"):
+            yield "llm_retries_total", "counter", "LLM请求重试次数", {"reason": key[len("retries_"):]}, value
+    yield "llm_retries_exhausted_total", "counter", "重试用尽后失败的LLM请求数", {}, stats["retry"].get("gave_up")
+    hedge = stats["hedge"] or {}
+    yield "llm_hedged_requests_total", "counter", "发起的对冲请求数", {}, hedge.get("hedged")
+    single_flight = stats["single_flight"] or {}
+    yield "llm_coalesced_requests_total", "counter", "合并到进行中请求的LLM调用数", {}, single_flight.get("coalesced")
+    yield "llm_in_flight_requests", "gauge", "进行中的上游LLM请求数", {}, stats["pool"]["in_flight_requests"]
+    yield "llm_queue_depth", "gauge", "等待LLM并发许可的请求数", {}, stats["rate_limiter"]["queue_depth"]
+    
+    semantic_cache = agent_graph.nlu_agent.semantic_cache
+    if semantic_cache is not None:
+        nlu = semantic_cache.stats()
+        for result in ("hits", "misses"):
+            yield "nlu_semantic_cache_lookups_total", "counter", "NLU语义缓存查找次数", {"result": result}, nlu[result]
+    
+    jobs = job_queue.stats()
+    yield "oag_jobs_queued", "gauge", "排队中的异步任务数", {}, jobs["queued"]
+    yield "oag_jobs_running", "gauge", "执行中的异步任务数", {}, jobs["running"]
+
+
+metrics.add_collector(_component_samples)
+
+
+@app.get("/api/v1/llm/stats")
+async def llm_stats():
+    """LLM客户端运行统计（缓存命中率等）"""
+    semantic_cache = agent_graph.nlu_agent.semantic_cache
+    entity_index = agent_graph.oag_generator.entity_index
+    vector_store = agent_graph.oag_generator.vector_store
     return {
-        "id": schema_id,
-        "version": "1.0.0",
-        "entityTypes": {},
-        "relationTypes": {}
+        **kimi_client.stats(),
+        "schema_store": schema_store.stats(),
+        "nlu_semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+        "entity_index": entity_index.stats() if entity_index is not None else None,
+        "vector_store": vector_store.stats() if vector_store is not None else None,
+        "session_store": agent_graph.session_store.stats(),
+        "checkpoints": agent_graph.checkpointer.stats() if agent_graph.checkpointer is not None else None,
+        "jobs": job_queue.stats(),
+        "tracing": tracer.stats()
     }
 
 
+@app.get("/api/v1/traces")
+async def list_traces(limit: int = 20):
+    """最近的trace（需 TRACING_EXPORTER=memory）"""
+    if not isinstance(tracer.exporter, MemoryExporter):
+        raise HTTPException(status_code=404, detail="未启用内存trace导出")
+    return {"traces": tracer.exporter.recent(limit)}
+
+
+@app.get("/api/v1/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """单个trace的全部span（需 TRACING_EXPORTER=memory）"""
+    if not isinstance(tracer.exporter, MemoryExporter):
+        raise HTTPException(status_code=404, detail="未启用内存trace导出")
+    spans = tracer.exporter.get_trace(trace_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail="Trace不存在")
+    return {"trace_id": trace_id, "spans": spans}
+
+
 # ============== 启动事件 ==============
 
 @app.on_event("startup")
@@ -251,12 +623,50 @@ async def startup_event():
         version=settings.APP_VERSION,
         debug=settings.DEBUG
     )
+    
+    # 预先创建共享连接池
+    KimiClient.get_client()
+    
+    # 定期刷新Schema缓存
+    schema_store.start_background_refresh(settings.SCHEMA_REFRESH_INTERVAL)
+    
+    # 登记已有图谱的实体，生成的实体对齐到已有ID
+    entity_index = agent_graph.oag_generator.entity_index
+    if entity_index is not None and settings.ENTITY_INDEX_CORPUS_PATH:
+        entity_index.load_directory(settings.ENTITY_INDEX_CORPUS_PATH)
+    
+    # 增量导入已有图谱用于检索
+    vector_store = agent_graph.oag_generator.vector_store
+    if vector_store is not None and settings.RAG_CORPUS_PATH:
+        vector_store.ingest_directory(settings.RAG_CORPUS_PATH)
+        vector_store.save()
+    
+    # 启动异步任务worker
+    job_queue.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭事件"""
     logger.info(f"{settings.APP_NAME} shutting down")
+    
+    # 停止异步任务worker
+    await job_queue.stop()
+    
+    # 持久化图谱检索索引
+    if agent_graph.oag_generator.vector_store is not None:
+        agent_graph.oag_generator.vector_store.save()
+    
+    # 关闭连接池
+    await KimiClient.close_client()
+    await schema_store.close()
+    await agent_graph.session_store.close()
+    
+    # 持久化语义缓存
+    if agent_graph.nlu_agent.semantic_cache is not None:
+        agent_graph.nlu_agent.semantic_cache.save()
+    
+    tracer.close()
 
 
 if __name__ == "__main__":
@@ -1,19 +1,69 @@
 """
 Prompt管理器 - 使用Markdown格式管理Prompt
+
+模板在首次加载时编译为「文本片段 / 变量名」交替的列表，渲染时一次拼接，
+耗时与输出长度成正比；按文件修改时间自动热更新，无需全局锁。
 """
 import os
+import re
+import time
 from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Dict, FrozenSet, List, Set, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+_PLACEHOLDER_RE = re.compile(r"\{\{(\w+)\}\}")
+
+
+class CompiledPrompt:
+    """编译后的Prompt模板"""
+    
+    __slots__ = ("name", "path", "mtime_ns", "literals", "names", "variables", "checked_at")
+    
+    def __init__(self, name: str, path: Path, text: str, mtime_ns: int):
+        self.name = name
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.checked_at = time.monotonic()
+        
+        # literals 比 names 多一个：literals[0] names[0] literals[1] ... literals[-1]
+        self.literals: List[str] = []
+        self.names: List[str] = []
+        position = 0
+        for match in _PLACEHOLDER_RE.finditer(text):
+            self.literals.append(text[position:match.start()])
+            self.names.append(match.group(1))
+            position = match.end()
+        self.literals.append(text[position:])
+        self.variables: FrozenSet[str] = frozenset(self.names)
+    
+    def render(self, variables: Dict[str, Any]) -> str:
+        """单次拼接渲染，调用方需保证变量齐全"""
+        parts = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            value = variables[name]
+            parts.append(value if isinstance(value, str) else str(value))
+            parts.append(literal)
+        return "".join(parts)
 
 
 class PromptManager:
     """Markdown Prompt 管理器"""
     
-    def __init__(self, prompts_dir: str = None):
+    def __init__(self, prompts_dir: str = None, check_interval: float = 1.0):
+        """
+        Args:
+            prompts_dir: Prompt目录
+            check_interval: 检查文件修改时间的最小间隔（秒），<=0 时每次加载都检查
+        """
         if prompts_dir is None:
             prompts_dir = Path(__file__).parent / "markdown"
         self.prompts_dir = Path(prompts_dir)
-        self._cache: Dict[str, str] = {}
+        self.check_interval = check_interval
+        self._cache: Dict[str, CompiledPrompt] = {}
+        self._warned: Set[Tuple[str, FrozenSet[str]]] = set()
     
     def load(self, name: str, **variables) -> str:
         """
@@ -22,25 +72,46 @@ class PromptManager:
         Args:
             name: Prompt文件名(不含扩展名)
             **variables: 模板变量
-            
+        
         Returns:
             渲染后的Prompt文本
+        
+        Raises:
+            FileNotFoundError: Prompt文件不存在
+            ValueError: 模板中的变量未提供
         """
-        if name not in self._cache:
-            prompt_path = self.prompts_dir / f"{name}.md"
-            if not prompt_path.exists():
-                raise FileNotFoundError(f"Prompt not found: {prompt_path}")
-            
-            with open(prompt_path, 'r', encoding='utf-8') as f:
-                self._cache[name] = f.read()
+        template = self.get(name)
         
-        template = self._cache[name]
+        missing = template.variables.difference(variables)
+        if missing:
+            raise ValueError(f"Prompt '{name}' 缺少变量: {', '.join(sorted(missing))}")
         
-        # 简单变量替换
-        for key, value in variables.items():
-            placeholder = f"{{{{{key}}}}}"
-            template = template.replace(placeholder, str(value))
+        if len(variables) > len(template.variables):
+            unused = frozenset(variables).difference(template.variables)
+            if (name, unused) not in self._warned:
+                self._warned.add((name, unused))
+                logger.warning("Unused prompt variables", prompt=name, unused=sorted(unused))
         
+        return template.render(variables)
+    
+    def get(self, name: str) -> CompiledPrompt:
+        """获取编译后的模板，文件有修改时重新编译"""
+        template = self._cache.get(name)
+        if template is not None:
+            now = time.monotonic()
+            if now - template.checked_at < self.check_interval:
+                return template
+            template.checked_at = now
+            try:
+                if os.stat(template.path).st_mtime_ns == template.mtime_ns:
+                    return template
+            except FileNotFoundError:
+                return template
+            logger.info("Prompt file changed, recompiling", prompt=name)
+        
+        # 并发时可能重复编译，结果相同，直接覆盖即可
+        template = self._compile(name)
+        self._cache[name] = template
         return template
     
     def reload(self, name: str = None):
@@ -49,6 +120,15 @@ class PromptManager:
             self._cache.pop(name, None)
         else:
             self._cache.clear()
+    
+    def _compile(self, name: str) -> CompiledPrompt:
+        prompt_path = self.prompts_dir / f"{name}.md"
+        if not prompt_path.exists():
+            raise FileNotFoundError(f"Prompt not found: {prompt_path}")
+        
+        mtime_ns = os.stat(prompt_path).st_mtime_ns
+        with open(prompt_path, 'r', encoding='utf-8') as f:
+            return CompiledPrompt(name, prompt_path, f.read(), mtime_ns)
 
 
 # 全局实例
@@ -0,0 +1,130 @@
+"""
+现有图谱 Prompt 构建 - 增量更新时以紧凑格式提供现有OAG
+
+只列出实体ID、类型、名称和关系三元组（不含属性），与更新描述相关的
+实体及其邻居优先，其余实体在token预算内依次加入：
+
+    实体:  id: Type 名称
+    关系:  source -type-> target
+
+生成时检索到的已有图谱实体也用同样的格式作为参考（build_reference_prompt）。
+"""
+from typing import Any, Dict, List, Set, Tuple
+
+from app.core.tokens import estimate_tokens
+
+
+def _format_entity(entity: Dict[str, Any]) -> str:
+    return f"{entity['id']}: {entity.get('type', '')} {entity.get('label', '')}".rstrip()
+
+
+def _format_relation(relation: Dict[str, Any]) -> str:
+    return f"{relation['source']} -{relation.get('type', '')}-> {relation['target']}"
+
+
+def build_graph_prompt(
+    oag: Dict[str, Any],
+    description: str,
+    token_budget: int = 0
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    构建Prompt中的现有图谱部分
+
+    Args:
+        oag: 现有OAG（entities/relations）
+        description: 更新描述
+        token_budget: 该部分的token预算，<=0 表示不限制
+
+    Returns:
+        (图谱文本, 统计信息)
+    """
+    entities = [e for e in oag.get("entities", []) if e.get("id")]
+    relations = [r for r in oag.get("relations", []) if r.get("source") and r.get("target")]
+
+    text = description.lower()
+    neighbors: Dict[str, Set[str]] = {e["id"]: set() for e in entities}
+    for r in relations:
+        neighbors.setdefault(r["source"], set()).add(r["target"])
+        neighbors.setdefault(r["target"], set()).add(r["source"])
+
+    # 描述中提到的实体优先，其次是它们的邻居，最后按原顺序
+    mentioned = {
+        e["id"] for e in entities
+        if e["id"].lower() in text or (e.get("label") and str(e["label"]).lower() in text)
+    }
+    nearby = set().union(*(neighbors[i] for i in mentioned)) - mentioned if mentioned else set()
+    order = {e["id"]: i for i, e in enumerate(entities)}
+    ranked = sorted(
+        entities,
+        key=lambda e: (e["id"] not in mentioned, e["id"] not in nearby, order[e["id"]])
+    )
+
+    chosen: List[Dict[str, Any]] = []
+    chosen_ids: Set[str] = set()
+    used = 0
+    for entity in ranked:
+        cost = estimate_tokens(_format_entity(entity)) + 1
+        if token_budget > 0 and chosen and used + cost > token_budget:
+            break
+        chosen.append(entity)
+        chosen_ids.add(entity["id"])
+        used += cost
+
+    shown_relations: List[Dict[str, Any]] = []
+    for relation in relations:
+        if relation["source"] not in chosen_ids or relation["target"] not in chosen_ids:
+            continue
+        cost = estimate_tokens(_format_relation(relation)) + 1
+        if token_budget > 0 and used + cost > token_budget:
+            break
+        shown_relations.append(relation)
+        used += cost
+
+    lines = ["实体:"]
+    lines.extend(_format_entity(e) for e in chosen)
+    lines.append("")
+    lines.append("关系:")
+    lines.extend(_format_relation(r) for r in shown_relations)
+    rendered = "\n".join(lines)
+
+    stats = {
+        "graph_tokens": estimate_tokens(rendered),
+        "entities_shown": len(chosen),
+        "entities_total": len(entities),
+        "relations_shown": len(shown_relations),
+        "relations_total": len(relations),
+        "mentioned": len(mentioned),
+    }
+    return rendered, stats
+
+
+def build_reference_prompt(hits: List[Dict[str, Any]], token_budget: int = 0) -> Tuple[str, Dict[str, Any]]:
+    """
+    构建Prompt中的已有图谱参考部分
+
+    Args:
+        hits: VectorStore.search 的结果（按相关度降序）
+        token_budget: 该部分的token预算，<=0 表示不限制
+
+    Returns:
+        (参考文本，无结果时为"（无）", 统计信息)
+    """
+    lines: List[str] = []
+    used = 0
+    shown = 0
+    for hit in hits:
+        metadata = hit["metadata"]
+        block = [_format_entity(metadata)] + [f"  {line}" for line in metadata.get("relations", [])]
+        cost = estimate_tokens("\n".join(block)) + 1
+        if token_budget > 0 and used + cost > token_budget:
+            # 关系较多时只保留实体行
+            block = block[:1]
+            cost = estimate_tokens(block[0]) + 1
+            if used + cost > token_budget:
+                break
+        lines.extend(block)
+        used += cost
+        shown += 1
+
+    rendered = "\n".join(lines) or "（无）"
+    return rendered, {"context_tokens": estimate_tokens(rendered), "references": shown}
@@ -0,0 +1,211 @@
+"""
+Schema Prompt 构建 - 按请求裁剪Schema并以紧凑格式写入Prompt
+
+完整Schema（数十上百种实体/关系类型）直接序列化为JSON会让Prompt过长。
+这里只保留与用户描述、NLU实体相关的类型及其一跳邻居，用紧凑的行格式表示，
+并在token预算内按相关度依次加入：
+
+    实体:  Code(标签): 属性*, 属性, 状态[A|B|C]      * 表示必填
+    关系:  code(标签): From1|From2 -> To
+"""
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.schema_store import CachedSchema, relation_endpoints
+from app.core.tokens import estimate_tokens
+
+# 枚举属性最多展示的取值数
+MAX_ENUM_VALUES = 6
+
+ENTITY_HEADER = "实体类型:"
+RELATION_HEADER = "关系类型:"
+
+
+def _format_property(name: str, spec: Any) -> str:
+    if not isinstance(spec, dict):
+        return name
+    text = name + ("*" if spec.get("required") else "")
+    values = spec.get("values")
+    if values:
+        shown = [str(v) for v in values[:MAX_ENUM_VALUES]]
+        if len(values) > MAX_ENUM_VALUES:
+            shown.append("...")
+        text += "[" + "|".join(shown) + "]"
+    return text
+
+
+def _format_entity(code: str, spec: Dict[str, Any]) -> str:
+    line = f"{code}({spec.get('label', code)})"
+    properties = spec.get("properties") or {}
+    if properties:
+        line += ": " + ", ".join(_format_property(name, p) for name, p in properties.items())
+    return line
+
+
+def _format_relation(code: str, spec: Dict[str, Any], sources: Iterable[str], targets: Iterable[str]) -> str:
+    return f"{code}({spec.get('label', code)}): {'|'.join(sources)} -> {'|'.join(targets)}"
+
+
+class SchemaIndex:
+    """
+    一个Schema版本的预处理结果（每个 CachedSchema 只构建一次）
+
+    包含每种类型的紧凑行、token开销、匹配词和邻接关系。
+    """
+
+    def __init__(self, cached: CachedSchema):
+        self.entity_lines: Dict[str, str] = {}
+        self.entity_costs: Dict[str, int] = {}
+        self.terms: Dict[str, List[str]] = {}
+        self.domains: Dict[str, str] = {}
+        for code, spec in cached.entity_types.items():
+            line = _format_entity(code, spec)
+            self.entity_lines[code] = line
+            self.entity_costs[code] = estimate_tokens(line) + 1
+            self.terms[code] = [t for t in {code.lower(), str(spec.get("label", "")).lower()} if t]
+            if spec.get("domain"):
+                self.domains[code] = spec["domain"]
+
+        self.relations: Dict[str, Tuple[Dict[str, Any], List[str], List[str]]] = {}
+        self.relation_costs: Dict[str, int] = {}
+        self.relations_by_type: Dict[str, List[str]] = {code: [] for code in self.entity_lines}
+        self.neighbors: Dict[str, Set[str]] = {code: set() for code in self.entity_lines}
+        for code, spec in cached.relation_types.items():
+            sources, targets = relation_endpoints(spec)
+            sources = [t for t in sources if t in self.entity_lines]
+            targets = [t for t in targets if t in self.entity_lines]
+            if not sources or not targets:
+                continue
+            self.relations[code] = (spec, sources, targets)
+            self.relation_costs[code] = estimate_tokens(_format_relation(code, spec, sources, targets)) + 1
+            for t in set(sources) | set(targets):
+                self.relations_by_type[t].append(code)
+                self.neighbors[t].update(set(sources) | set(targets))
+        for code, linked in self.neighbors.items():
+            linked.discard(code)
+
+        self.full_tokens = estimate_tokens(cached.prompt_json)
+
+    def rank(self, text: str) -> Tuple[List[str], int]:
+        """
+        按与文本的相关度排序实体类型
+
+        Returns:
+            (排序后的类型代码, 直接命中的类型数)；无命中时按连接度排序全部类型
+        """
+        text = text.lower()
+        scores: Dict[str, float] = {}
+        matched_domains = {d for d in set(self.domains.values()) if d.lower() in text}
+        for code, terms in self.terms.items():
+            score = sum(2.0 for term in terms if term in text)
+            if self.domains.get(code) in matched_domains:
+                score += 1.0
+            if score:
+                scores[code] = score
+
+        seeds = len(scores)
+        if not scores:
+            candidates = list(self.entity_lines)
+        else:
+            for code in list(scores):
+                for neighbor in self.neighbors[code]:
+                    scores.setdefault(neighbor, 0.5)
+            candidates = list(scores)
+
+        order = {code: i for i, code in enumerate(self.entity_lines)}
+        candidates.sort(key=lambda c: (-scores.get(c, 0.0), -len(self.neighbors[c]), order[c]))
+        return candidates, seeds
+
+
+def _relation_covered(index: SchemaIndex, relation: str, selected: Set[str]) -> bool:
+    """关系的源端和目标端都至少有一个类型已选中"""
+    _, sources, targets = index.relations[relation]
+    return any(t in selected for t in sources) and any(t in selected for t in targets)
+
+
+# 按 CachedSchema 缓存预处理结果，Schema条目被替换后自动释放
+_indexes: "weakref.WeakKeyDictionary[CachedSchema, SchemaIndex]" = weakref.WeakKeyDictionary()
+
+
+def get_schema_index(cached: CachedSchema) -> SchemaIndex:
+    index = _indexes.get(cached)
+    if index is None:
+        index = SchemaIndex(cached)
+        _indexes[cached] = index
+    return index
+
+
+def build_schema_prompt(
+    cached: CachedSchema,
+    description: str,
+    entities: Optional[List[Dict[str, Any]]] = None,
+    token_budget: int = 0
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    构建Prompt中的Schema部分
+
+    Args:
+        cached: Schema
+        description: 用户描述
+        entities: NLU抽取的实体（type/value）
+        token_budget: Schema部分的token预算，<=0 表示不限制
+
+    Returns:
+        (Schema文本, 统计信息)
+    """
+    index = get_schema_index(cached)
+    hints = [description]
+    for entity in entities or []:
+        hints.extend(str(entity.get(k, "")) for k in ("type", "value"))
+    ranked, seeds = index.rank(" ".join(hints))
+
+    chosen: List[str] = []
+    chosen_set: Set[str] = set()
+    relations: List[str] = []
+    relation_set: Set[str] = set()
+    used = estimate_tokens(ENTITY_HEADER) + estimate_tokens(RELATION_HEADER) + 2
+    truncated = False
+
+    for code in ranked:
+        # 加入该类型后两端都已选中的关系一并计入开销
+        new_relations = [
+            r for r in index.relations_by_type[code]
+            if r not in relation_set and _relation_covered(index, r, chosen_set | {code})
+        ]
+        cost = index.entity_costs[code] + sum(index.relation_costs[r] for r in new_relations)
+        if token_budget > 0 and chosen and used + cost > token_budget:
+            truncated = True
+            continue
+        chosen.append(code)
+        chosen_set.add(code)
+        relations.extend(new_relations)
+        relation_set.update(new_relations)
+        used += cost
+
+    lines = [ENTITY_HEADER]
+    lines.extend(index.entity_lines[code] for code in chosen)
+    lines.append("")
+    lines.append(RELATION_HEADER)
+    for code in relations:
+        spec, sources, targets = index.relations[code]
+        lines.append(_format_relation(
+            code,
+            spec,
+            [t for t in sources if t in chosen_set],
+            [t for t in targets if t in chosen_set]
+        ))
+    text = "\n".join(lines)
+
+    stats = {
+        "schema_tokens": estimate_tokens(text),
+        "schema_tokens_full": index.full_tokens,
+        "token_budget": token_budget,
+        "entity_types": len(chosen),
+        "entity_types_total": len(index.entity_lines),
+        "relation_types": len(relations),
+        "relation_types_total": len(cached.relation_types),
+        "matched_types": seeds,
+        "truncated": truncated,
+    }
+    return text, stats
+
@@ -0,0 +1,278 @@
+"""
+服务压测 - 以给定并发驱动聊天/流式聊天/OAG生成接口，统计吞吐、延迟分位数、首字节时间和内存
+
+默认同时启动模拟Kimi服务（benchmarks.mock_kimi）和 agent-service 子进程，
+agent-service 通过 KIMI_BASE_URL 指向模拟服务，不消耗真实额度；
+也可用 --target 压测已在运行的服务（此时不统计内存）。
+
+用法（在 agent-service 目录下）:
+    python -m benchmarks.load_test [--scenarios chat,stream,generate] [--concurrency 16]
+        [--requests 200 | --duration 30] [--latency lognormal:800,0.5] [--rate-429 0.05]
+        [--env KIMI_MAX_CONCURRENCY=32] [--output result.json]
+    python -m benchmarks.load_test --target http://127.0.0.1:3002 --scenarios generate
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.mock_kimi import add_arguments as add_mock_arguments
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+
+SCENARIOS = {
+    "chat": ("/api/v1/agent/chat", lambda i: {"message": f"创建一个智能驾驶研发体系的图谱 #{i}", "session_id": f"bench-chat-{i}"}),
+    "stream": ("/api/v1/agent/chat/stream", lambda i: {"message": f"创建一个智能驾驶研发体系的图谱 #{i}", "session_id": f"bench-stream-{i}"}),
+    "generate": ("/api/v1/oag/generate", lambda i: {"description": f"智能驾驶项目包含车型开发、软件开发、测试验证三个领域 #{i}"}),
+}
+
+# 压测时放开服务端的限流，避免测到的是配置的速率上限
+DEFAULT_SERVICE_ENV = {
+    "KIMI_API_KEY": "mock",
+    "KIMI_RATE_LIMIT_PER_MINUTE": "1000000",
+    "KIMI_TOKEN_LIMIT_PER_MINUTE": "0",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+@dataclass
+class ScenarioResult:
+    """单个场景的统计"""
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    ttfbs: List[float] = field(default_factory=list)
+    statuses: Dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def record(self, status: str, latency: float, ttfb: Optional[float]):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == "200":
+            self.latencies.append(latency)
+            if ttfb is not None:
+                self.ttfbs.append(ttfb)
+
+    def summary(self) -> Dict[str, object]:
+        total = sum(self.statuses.values())
+        return {
+            "scenario": self.name,
+            "requests": total,
+            "ok": len(self.latencies),
+            "statuses": self.statuses,
+            "elapsed_s": round(self.elapsed, 3),
+            "rps": round(total / self.elapsed, 2) if self.elapsed else 0.0,
+            "latency_ms": percentiles(self.latencies),
+            "ttfb_ms": percentiles(self.ttfbs),
+        }
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """最近秩法计算 p50/p95/p99（毫秒）"""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        index = max(0, min(len(ordered) - 1, int(q * len(ordered) + 0.999999) - 1))
+        return round(ordered[index] * 1000, 1)
+
+    return {"p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99), "max": round(ordered[-1] * 1000, 1)}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_memory(pid: int) -> Dict[str, Optional[int]]:
+    """从 /proc 读取进程的常驻内存与峰值（KiB），非Linux返回空值"""
+    memory = {"rss_kib": None, "peak_rss_kib": None}
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                memory["rss_kib"] = int(line.split()[1])
+            elif line.startswith("VmHWM:"):
+                memory["peak_rss_kib"] = int(line.split()[1])
+    except OSError:
+        pass
+    return memory
+
+
+async def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"服务未就绪: {url}")
+            await asyncio.sleep(0.2)
+
+
+async def send(client: httpx.AsyncClient, scenario: str, index: int, result: ScenarioResult):
+    """发送一次请求，首字节时间以收到第一块响应体为准"""
+    path, body = SCENARIOS[scenario]
+    started = time.perf_counter()
+    ttfb = None
+    try:
+        async with client.stream("POST", path, json=body(index)) as response:
+            async for _ in response.aiter_bytes():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+            status = str(response.status_code)
+    except httpx.TimeoutException:
+        status = "timeout"
+    except httpx.HTTPError:
+        status = "error"
+    result.record(status, time.perf_counter() - started, ttfb)
+
+
+async def run_scenario(
+    base_url: str,
+    scenario: str,
+    concurrency: int,
+    requests: Optional[int],
+    duration: Optional[float],
+    warmup: int,
+    timeout: float
+) -> ScenarioResult:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        warm = ScenarioResult(scenario)
+        await asyncio.gather(*(send(client, scenario, -1 - i, warm) for i in range(warmup)))
+
+        result = ScenarioResult(scenario)
+        counter = iter(range(sys.maxsize))
+        started = time.perf_counter()
+        deadline = started + duration if duration else None
+
+        async def worker():
+            for index in counter:
+                if requests is not None and index >= requests:
+                    return
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                await send(client, scenario, index, result)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        result.elapsed = time.perf_counter() - started
+        return result
+
+
+def print_summary(summary: Dict[str, object]):
+    latency = summary["latency_ms"]
+    ttfb = summary["ttfb_ms"]
+    print(
+        f"{summary['scenario']:<10} {summary['requests']:>6} req {summary['rps']:>8.2f} rps  "
+        f"latency p50/p95/p99 {latency['p50']}/{latency['p95']}/{latency['p99']} ms  "
+        f"ttfb p50/p95 {ttfb['p50']}/{ttfb['p95']} ms  status {summary['statuses']}"
+    )
+
+
+def start_process(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args],
+        cwd=SERVICE_DIR,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, object]:
+    processes: List[subprocess.Popen] = []
+    service: Optional[subprocess.Popen] = None
+    base_url = args.target
+    try:
+        if base_url is None:
+            mock_port = free_port()
+            processes.append(start_process([
+                "-m", "benchmarks.mock_kimi",
+                "--port", str(mock_port),
+                "--latency", args.latency,
+                "--chunk-delay", str(args.chunk_delay),
+                "--chunk-chars", str(args.chunk_chars),
+                "--rate-429", str(args.rate_429),
+                "--retry-after", str(args.retry_after),
+                "--entities", str(args.entities),
+            ], {}))
+            await wait_ready(f"http://127.0.0.1:{mock_port}/stats")
+
+            port = free_port()
+            env = {**DEFAULT_SERVICE_ENV, "KIMI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1"}
+            env.update(item.split("=", 1) for item in args.env)
+            service = start_process(["-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"], env)
+            processes.append(service)
+            base_url = f"http://127.0.0.1:{port}"
+            await wait_ready(f"{base_url}/health")
+
+        report: Dict[str, object] = {"target": base_url, "concurrency": args.concurrency, "scenarios": []}
+        if service is not None:
+            report["memory_before"] = read_memory(service.pid)
+
+        for scenario in args.scenarios.split(","):
+            result = await run_scenario(
+                base_url,
+                scenario,
+                args.concurrency,
+                args.requests if args.duration is None else None,
+                args.duration,
+                args.warmup,
+                args.timeout
+            )
+            summary = result.summary()
+            report["scenarios"].append(summary)
+            print_summary(summary)
+
+        if service is not None:
+            report["memory_after"] = read_memory(service.pid)
+            print(f"memory     rss {report['memory_before']['rss_kib']} -> {report['memory_after']['rss_kib']} KiB, "
+                  f"peak {report['memory_after']['peak_rss_kib']} KiB")
+        return report
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", default=None, help="已在运行的服务地址，不指定时启动模拟Kimi与本地服务")
+    parser.add_argument("--scenarios", default="chat,stream,generate")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="每个场景的请求数")
+    parser.add_argument("--duration", type=float, default=None, help="每个场景的持续时间（秒），指定时忽略 --requests")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--env", action="append", default=[], help="传给本地服务的环境变量 KEY=VALUE，可重复")
+    parser.add_argument("--output", default=None, help="结果写入JSON文件，便于对比")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios.split(",")) - SCENARIOS.keys()
+    if unknown:
+        parser.error(f"未知场景: {', '.join(sorted(unknown))}")
+
+    report = asyncio.run(main_async(args))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+模拟 Kimi (OpenAI 兼容) /chat/completions 服务，用于本地压测，不消耗真实额度
+
+- 按系统/用户Prompt返回预置的NLU、OAG生成、OAG增量更新JSON
+- 首字节延迟可按分布配置，流式响应按片段间隔逐块发送
+- 可按比例注入429（带 Retry-After）
+- GET /stats 返回收到的请求数、注入的429数
+
+用法（在 agent-service 目录下）:
+    python -m benchmarks.mock_kimi [--port 18080] [--latency lognormal:800,0.5]
+        [--chunk-delay 20] [--chunk-chars 16] [--rate-429 0.05] [--entities 10]
+
+服务端指向它: KIMI_BASE_URL=http://127.0.0.1:18080/v1
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class LatencyDistribution:
+    """
+    延迟分布（毫秒），规格字符串:
+        fixed:<ms>
+        uniform:<min_ms>,<max_ms>
+        lognormal:<median_ms>,<sigma>
+    """
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",") if v]
+        if kind == "fixed" and len(values) == 1:
+            self._sample = lambda: values[0]
+        elif kind == "uniform" and len(values) == 2:
+            self._sample = lambda: random.uniform(values[0], values[1])
+        elif kind == "lognormal" and len(values) == 2:
+            mu = math.log(max(values[0], 1e-3))
+            self._sample = lambda: random.lognormvariate(mu, values[1])
+        else:
+            raise ValueError(f"无效的延迟分布: {spec}")
+        self.spec = spec
+
+    def sample(self) -> float:
+        """采样一次延迟（秒）"""
+        return max(0.0, self._sample()) / 1000
+
+
+@dataclass
+class MockConfig:
+    """模拟服务配置"""
+    latency: LatencyDistribution = field(default_factory=lambda: LatencyDistribution("fixed:0"))
+    chunk_delay: float = 0.0  # 秒，流式片段间隔
+    chunk_chars: int = 16  # 每个流式片段的字符数
+    rate_429: float = 0.0  # 注入429的比例
+    retry_after: float = 1.0  # 秒
+    entities: int = 10  # OAG生成结果的实体数
+
+
+def nlu_result() -> Dict[str, Any]:
+    return {
+        "intent": "create_oag",
+        "confidence": 0.95,
+        "entities": [{"type": "domain", "value": "智能驾驶研发体系", "start": 0, "end": 8}],
+        "slots": {"schema_type": "domain"},
+        "context_updates": {},
+        "clarification_needed": False
+    }
+
+
+def oag_result(entities: int) -> Dict[str, Any]:
+    """一个项目实体加若干领域实体，项目包含每个领域"""
+    items = [{"id": "project_001", "type": "Project", "label": "智能驾驶项目", "properties": {"status": "进行中"}}]
+    relations = []
+    for i in range(1, max(entities, 1)):
+        domain_id = f"domain_{i:03d}"
+        items.append({"id": domain_id, "type": "Domain", "label": f"研发领域{i}", "properties": {"category": "软件"}})
+        relations.append({"source": "project_001", "target": domain_id, "type": "contains", "label": "包含"})
+    return {"entities": items, "relations": relations, "explanation": f"模拟生成{len(items)}个实体"}
+
+
+def oag_diff_result() -> Dict[str, Any]:
+    return {
+        "added_entities": [{"id": "domain_new", "type": "Domain", "label": "新增领域", "properties": {}}],
+        "updated_entities": [],
+        "removed_entities": [],
+        "added_relations": [{"source": "project_001", "target": "domain_new", "type": "contains", "label": "包含"}],
+        "removed_relations": [],
+        "explanation": "模拟增量更新"
+    }
+
+
+def completion_content(messages: List[Dict[str, Any]], config: MockConfig) -> str:
+    """根据Prompt判断调用方并返回对应的预置内容"""
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    if "自然语言理解" in system:
+        result = nlu_result()
+    elif "本体图谱工程师" in system:
+        result = oag_diff_result() if "added_entities" in user else oag_result(config.entities)
+    else:
+        return "这是模拟的回复。"
+    return json.dumps(result, ensure_ascii=False)
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock Kimi")
+    stats = {"requests": 0, "streams": 0, "injected_429": 0}
+
+    def usage(messages: List[Dict[str, Any]], content: str) -> Dict[str, int]:
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 2
+        completion_tokens = len(content) // 2
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        stats["requests"] += 1
+
+        if config.rate_429 and random.random() < config.rate_429:
+            stats["injected_429"] += 1
+            return JSONResponse(
+                {"error": {"message": "rate limit exceeded (mock)", "type": "rate_limit_reached_error"}},
+                status_code=429,
+                headers={"Retry-After": str(config.retry_after)}
+            )
+
+        messages = payload.get("messages", [])
+        content = completion_content(messages, config)
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        model = payload.get("model", "mock")
+        await asyncio.sleep(config.latency.sample())
+
+        if not payload.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage(messages, content)
+            }
+
+        stats["streams"] += 1
+
+        async def frames() -> AsyncIterator[str]:
+            step = max(config.chunk_chars, 1)
+            for start in range(0, len(content), step):
+                if start and config.chunk_delay:
+                    await asyncio.sleep(config.chunk_delay)
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[start:start + step]}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(frames(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", default="fixed:200", help="首字节延迟分布，如 fixed:200 / uniform:100,500 / lognormal:800,0.5")
+    parser.add_argument("--chunk-delay", type=float, default=10, help="流式片段间隔（毫秒）")
+    parser.add_argument("--chunk-chars", type=int, default=16)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="注入429的比例 0~1")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--entities", type=int, default=10, help="OAG生成结果的实体数")
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency=LatencyDistribution(args.latency),
+        chunk_delay=args.chunk_delay / 1000,
+        chunk_chars=args.chunk_chars,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        entities=args.entities
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Prompt 渲染基准 - 对比逐变量 str.replace 与编译模板的单次拼接
+
+用法（在 agent-service 目录下）:
+    python -m benchmarks.prompt_render [--iterations 2000]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from app.prompts import PromptManager
+
+SCHEMA_PATH = Path(__file__).resolve().parents[2] / "data" / "schemaVersions" / "core-domain-schema-v2.json"
+
+
+def render_replace(template: str, variables: dict) -> str:
+    """旧实现：每个变量对整份模板做一次 replace"""
+    for key, value in variables.items():
+        template = template.replace(f"{{{{{key}}}}}", str(value))
+    return template
+
+
+def measure(label: str, fn, iterations: int):
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<28} {elapsed / iterations * 1e6:>10.1f} us/op {peak / 1024:>10.1f} KiB peak")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    manager = PromptManager()
+    template = manager.get("oag_generator")
+    raw = template.path.read_text(encoding="utf-8")
+
+    schema = json.loads(SCHEMA_PATH.read_text(encoding="utf-8")) if SCHEMA_PATH.exists() else {}
+    cases = {
+        "small": {"schema": "Project(项目)\nDomain(领域)", "description": "智能驾驶项目"},
+        "full schema": {
+            "schema": json.dumps(schema, ensure_ascii=False),
+            "description": "为新车型创建领域项目和里程碑" * 20,
+        },
+    }
+
+    for name, variables in cases.items():
+        size = len(template.render(variables))
+        print(f"\n[{name}] output {size} chars, {args.iterations} iterations")
+        measure("str.replace per variable", lambda: render_replace(raw, variables), args.iterations)
+        measure("compiled single pass", lambda: template.render(variables), args.iterations)
+        measure("PromptManager.load", lambda: manager.load("oag_generator", **variables), args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+录制回放基准 - 把录制的真实负载离线重新跑过完整的 agent_graph，对比版本间的延迟与内存分配
+
+先在服务上录制（LLM_CASSETTE_MODE=record），录制文件中包含每次图运行的用户输入与LLM响应；
+回放时LLM响应按原始时序（--speed）返回，同一会话内的输入按录制顺序执行。
+
+用法（在 agent-service 目录下）:
+    python -m benchmarks.replay --cassette data/llm_cassette.jsonl.gz [--speed 0] [--concurrency 4]
+        [--allocations] [--output new.json] [--baseline old.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.load_test import percentiles
+
+
+async def replay(inputs: List[Dict[str, str]], concurrency: int) -> Dict[str, object]:
+    from app.core.llm_client import KimiClient
+    from app.graph.workflow import agent_graph
+
+    sessions: Dict[str, List[str]] = {}
+    for item in inputs:
+        sessions.setdefault(item["session_id"], []).append(item["user_input"])
+    pending = list(sessions.items())
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while pending:
+            session_id, messages = pending.pop(0)
+            for message in messages:
+                started = time.perf_counter()
+                try:
+                    result = await agent_graph.run(session_id, message)
+                    if result.get("error"):
+                        errors += 1
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - started
+    await KimiClient.close_client()
+
+    return {
+        "runs": len(latencies),
+        "sessions": len(sessions),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "latency_ms": percentiles(latencies),
+    }
+
+
+def print_comparison(report: Dict[str, object], baseline: Dict[str, object]):
+    """打印与基线的差异（正数表示变慢/变大）"""
+    print("\nvs baseline")
+    for key in ("p50", "p95", "p99"):
+        new, old = report["latency_ms"][key], baseline["latency_ms"][key]
+        if new is not None and old:
+            print(f"  latency {key:<4} {old:>10.1f} -> {new:>10.1f} ms ({(new - old) / old:+.1%})")
+    new, old = report.get("peak_alloc_kib"), baseline.get("peak_alloc_kib")
+    if new is not None and old:
+        print(f"  peak alloc {old:>10.1f} -> {new:>10.1f} KiB ({(new - old) / old:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cassette", default="data/llm_cassette.jsonl.gz")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数，1为原始时序，0为不等待")
+    parser.add_argument("--concurrency", type=int, default=1, help="并发执行的会话数")
+    parser.add_argument("--allocations", action="store_true", help="用 tracemalloc 统计内存分配峰值（会拖慢执行）")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None, help="之前的 --output 结果，打印对比")
+    args = parser.parse_args()
+
+    # 配置在导入 app 时读取，必须先设置
+    os.environ["LLM_CASSETTE_MODE"] = "replay"
+    os.environ["LLM_CASSETTE_PATH"] = args.cassette
+    os.environ["LLM_CASSETTE_REPLAY_SPEED"] = str(args.speed)
+    os.environ.setdefault("KIMI_RATE_LIMIT_PER_MINUTE", "1000000")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from app.config import settings
+    from app.core.cassette import cassette
+    from app.graph.workflow import agent_graph  # 先完成导入，不计入回放的内存分配
+
+    # 与服务启动时一样登记已有图谱实体，生成的ID与录制时一致
+    entity_index = agent_graph.oag_generator.entity_index
+    if entity_index is not None and settings.ENTITY_INDEX_CORPUS_PATH:
+        entity_index.load_directory(settings.ENTITY_INDEX_CORPUS_PATH)
+
+    if not cassette.inputs:
+        parser.error(f"录制文件中没有图运行输入: {args.cassette}")
+
+    if args.allocations:
+        tracemalloc.start()
+    report = asyncio.run(replay(cassette.inputs, args.concurrency))
+    if args.allocations:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report["peak_alloc_kib"] = round(peak / 1024, 1)
+    report["cassette"] = cassette.stats()
+
+    latency = report["latency_ms"]
+    print(
+        f"{report['runs']} runs / {report['sessions']} sessions in {report['elapsed_s']} s, "
+        f"errors {report['errors']}, cassette misses {report['cassette']['misses']}\n"
+        f"latency p50/p95/p99/max {latency['p50']}/{latency['p95']}/{latency['p99']}/{latency['max']} ms"
+    )
+    if "peak_alloc_kib" in report:
+        print(f"peak alloc {report['peak_alloc_kib']} KiB")
+
+    if args.baseline:
+        print_comparison(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+JSON 编解码基准 - 以100个关系的OAG为例，对比标准库路径与 app.core.serialization
+
+对比项:
+- LLM 非流式响应体解码（response.json() vs loads(response.content)）
+- 流式解析器逐元素解码并构造 Entity / Relation
+- /oag/generate 响应编码（字典拷贝 + jsonable_encoder + json.dumps vs dataclass 直接编码）
+- SSE 帧编码
+
+用法（在 agent-service 目录下）:
+    python -m benchmarks.serialization [--iterations 2000] [--relations 100]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from fastapi.encoders import jsonable_encoder
+
+from app.graph.state import Entity, Relation, oag_payload
+from app.agents.oag_generator_agent import OAGGeneratorAgent
+from app.core import json_stream
+from app.core.serialization import JSON_BACKEND, dumps, loads, sse_frame
+
+
+def build_oag(relations: int) -> dict:
+    """一个项目实体，relations 个领域实体，项目包含每个领域"""
+    entities = [{"id": "project_001", "type": "Project", "label": "智能驾驶项目", "properties": {"status": "进行中"}}]
+    links = []
+    for i in range(1, relations + 1):
+        domain_id = f"domain_{i:03d}"
+        entities.append({
+            "id": domain_id,
+            "type": "Domain",
+            "label": f"研发领域{i}",
+            "properties": {"category": "软件", "owner": f"团队{i % 7}", "priority": i % 3}
+        })
+        links.append({"source": "project_001", "target": domain_id, "type": "contains", "label": "包含", "properties": {}})
+    return {"entities": entities, "relations": links, "explanation": f"识别出{len(entities)}个实体，建立包含关系"}
+
+
+def measure(label: str, fn, iterations: int):
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<40} {elapsed / iterations * 1e6:>10.1f} us/op {peak / 1024:>10.1f} KiB peak")
+
+
+def parse_items(text: str, decode) -> list:
+    """流式解析器分片喂入，每个元素解码后构造 Entity / Relation"""
+    original = json_stream.loads
+    json_stream.loads = decode
+    try:
+        parser = json_stream.StreamingJSONParser(("entities", "relations"))
+        items = []
+        for start in range(0, len(text), 64):
+            for key, data in parser.feed(text[start:start + 64]):
+                if key == "entities":
+                    items.append(OAGGeneratorAgent._to_entity(data))
+                else:
+                    items.append(OAGGeneratorAgent._to_relation(data))
+        return items
+    finally:
+        json_stream.loads = original
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--relations", type=int, default=100)
+    args = parser.parse_args()
+
+    oag = build_oag(args.relations)
+    content = json.dumps(oag, ensure_ascii=False)
+    body = json.dumps({
+        "id": "chatcmpl-bench",
+        "model": "moonshot-v1-8k",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1200, "completion_tokens": 2400, "total_tokens": 3600}
+    }, ensure_ascii=False).encode("utf-8")
+
+    items = parse_items(content, loads)
+    state = {
+        "entities_to_create": [i for i in items if isinstance(i, Entity)],
+        "relations_to_create": [i for i in items if isinstance(i, Relation)],
+        "agent_results": {"oag_generator": {"explanation": oag["explanation"]}},
+        "error": None
+    }
+    events = [{"type": "relation", "agent": "oag_generator", "data": r} for r in oag["relations"]]
+
+    def encode_dicts():
+        payload = oag_payload(state)
+        return json.dumps(jsonable_encoder({**payload, "session_id": "bench"}), ensure_ascii=False).encode("utf-8")
+
+    def encode_direct():
+        return dumps({
+            "success": True,
+            "session_id": "bench",
+            "entities": state["entities_to_create"],
+            "relations": state["relations_to_create"],
+            "explanation": oag["explanation"]
+        })
+
+    print(f"backend {JSON_BACKEND}, {len(oag['entities'])} entities / {len(oag['relations'])} relations, "
+          f"response body {len(body)} bytes, {args.iterations} iterations\n")
+    measure("decode LLM body: json.loads(text)", lambda: json.loads(body.decode("utf-8")), args.iterations)
+    measure("decode LLM body: loads(bytes)", lambda: loads(body), args.iterations)
+    measure("stream parse -> Entity/Relation: json", lambda: parse_items(content, json.loads), args.iterations // 10 or 1)
+    measure("stream parse -> Entity/Relation: loads", lambda: parse_items(content, loads), args.iterations // 10 or 1)
+    measure("encode response: dicts + jsonable_encoder", encode_dicts, args.iterations)
+    measure("encode response: dataclasses direct", encode_direct, args.iterations)
+    measure("SSE frames: json.dumps", lambda: [f"data: {json.dumps(e, ensure_ascii=False)}\n\n" for e in events], args.iterations)
+    measure("SSE frames: sse_frame", lambda: [sse_frame(e) for e in events], args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# 先导入 app.graph（其中会导入各Agent），单独先导入 app.agents 会触发循环导入
+import app.graph  # noqa: F401
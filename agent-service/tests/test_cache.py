@@ -0,0 +1,57 @@
+"""
+ResponseCache 测试：内存LRU、过期与SQLite磁盘层
+"""
+import time
+
+from app.core.cache import ResponseCache
+
+PAYLOAD = {"model": "moonshot-v1-8k", "messages": [{"role": "user", "content": "你好"}], "temperature": 0}
+
+
+def test_key_ignores_stream_flag_and_field_order():
+    reordered = {"temperature": 0, "messages": PAYLOAD["messages"], "model": "moonshot-v1-8k", "stream": True}
+
+    assert ResponseCache.make_key(PAYLOAD) == ResponseCache.make_key(reordered)
+    assert ResponseCache.make_key(PAYLOAD) != ResponseCache.make_key({**PAYLOAD, "temperature": 0.5})
+
+
+async def test_memory_tier_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    await cache.set("a", {"v": 1})
+    await cache.set("b", {"v": 2})
+    assert await cache.get("a") == {"v": 1}
+    await cache.set("c", {"v": 3})
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == {"v": 1}
+    assert await cache.get("c") == {"v": 3}
+    assert cache.stats()["evictions"] == 1
+
+
+async def test_expired_entries_are_misses(monkeypatch):
+    cache = ResponseCache(ttl=10)
+    await cache.set("a", {"v": 1})
+    await cache.set("b", {"v": 2}, ttl=100)
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 50)
+    assert await cache.get("a") is None
+    assert await cache.get("b") == {"v": 2}
+    assert cache.stats()["expired"] == 1
+
+
+async def test_disk_tier_survives_restart_and_is_bounded(tmp_path):
+    path = str(tmp_path / "llm_cache.db")
+    cache = ResponseCache(max_entries=1, path=path, disk_max_entries=2)
+    for key in ("a", "b", "c"):
+        await cache.set(key, {"v": key})
+        time.sleep(0.001)
+
+    restarted = ResponseCache(path=path)
+    assert await restarted.get("a") is None
+    assert await restarted.get("b") == {"v": "b"}
+    assert await restarted.get("c") == {"v": "c"}
+    assert restarted.stats()["disk_hits"] == 2
+
+    await restarted.clear()
+    assert await ResponseCache(path=path).get("c") is None
@@ -0,0 +1,45 @@
+"""
+嵌入协议测试：只实现 Embedder 协议（dimension / embed）的嵌入函数可直接替换默认实现
+"""
+import numpy as np
+
+from app.agents.intent_classifier import LinearIntentClassifier
+from app.core.embeddings import HashingEmbedder
+from app.core.entity_index import EntityIndex
+from app.core.semantic_cache import SemanticCache
+
+
+class ProtocolOnlyEmbedder:
+    """只有协议要求的成员"""
+
+    def __init__(self):
+        self._inner = HashingEmbedder(dimension=64)
+        self.dimension = 64
+
+    def embed(self, texts):
+        return self._inner.embed(texts)
+
+
+def test_hashing_embedder_returns_unit_vectors():
+    vectors = HashingEmbedder(dimension=64).embed(["软件领域", "", "测试验证"])
+
+    assert vectors.shape == (3, 64)
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[[0, 2]], axis=1), 1.0)
+
+
+def test_protocol_only_embedder_works_everywhere():
+    embedder = ProtocolOnlyEmbedder()
+
+    cache = SemanticCache(threshold=0.9, embedder=embedder)
+    cache.add("创建智能驾驶图谱", {"intent": "create_oag"})
+    assert cache.lookup("创建智能驾驶图谱")[0]["intent"] == "create_oag"
+
+    index = EntityIndex(vector_threshold=0.5, embedder=embedder)
+    index.add_many([{"id": "d1", "type": "Domain", "label": "智能驾驶软件领域"}])
+    assert index.match("Domain", "智能驾驶软件领域组")[0] == "d1"
+
+    classifier = LinearIntentClassifier(
+        ["create_oag", "general_chat"], np.zeros((64, 2), dtype=np.float32), np.zeros(2, dtype=np.float32), embedder
+    )
+    assert classifier.classify("你好")["intent"] in ("create_oag", "general_chat")
@@ -0,0 +1,69 @@
+"""
+EntityIndex 单元测试
+"""
+from app.core.entity_index import EntityIndex, stable_entity_id
+
+
+def generated(label: str, entity_type: str = "Domain"):
+    return {"entities": [{"id": "tmp", "type": entity_type, "label": label}], "relations": []}
+
+
+def test_seed_entities_are_matched_and_never_evicted():
+    index = EntityIndex(vector_threshold=0, max_learned=2)
+    index.add_many([{"id": "domain_sw", "type": "Domain", "label": "软件领域"}])
+
+    for i in range(10):
+        index.canonicalize(generated(f"领域{i}"))
+
+    oag, stats = index.canonicalize(generated("软件 领域"))
+    assert oag["entities"][0]["id"] == "domain_sw"
+    assert index.stats()["seed_entities"] == 1
+    assert index.stats()["learned_entities"] <= 2
+
+
+def test_learned_tier_is_bounded_and_evicts_least_recently_used():
+    index = EntityIndex(vector_threshold=0.999, max_learned=10)
+    for i in range(25):
+        index.canonicalize(generated(f"测试领域{i}"))
+        # 不断命中第一个，使其保持最近使用
+        assert index.match("Domain", "测试领域0") is not None
+
+    stats = index.stats()
+    assert stats["learned_entities"] <= 10
+    assert stats["learned_evictions"] >= 15
+    assert index.match("Domain", "测试领域0")[0] == stable_entity_id("Domain", "测试领域0")
+    assert index.match("Domain", "测试领域24")[0] == stable_entity_id("Domain", "测试领域24")
+    assert index.match("Domain", "测试领域1") is None
+
+    # 淘汰后向量索引的行与名称表保持一致
+    learned = index._learned
+    assert learned._vectors["Domain"].ntotal == len(learned._vector_keys["Domain"]) == len(learned)
+    assert set(learned._vector_keys["Domain"]) == set(learned._by_key)
+
+
+def test_learning_disabled_registers_nothing():
+    index = EntityIndex(max_learned=0)
+    index.canonicalize(generated("软件领域"))
+
+    assert len(index) == 0
+
+
+def test_canonicalize_merges_duplicates_and_rewrites_relations():
+    index = EntityIndex(vector_threshold=0)
+    oag, stats = index.canonicalize({
+        "entities": [
+            {"id": "a", "type": "Project", "label": "P"},
+            {"id": "b", "type": "Domain", "label": "软件领域"},
+            {"id": "c", "type": "Domain", "label": "软件-领域"},
+        ],
+        "relations": [
+            {"source": "a", "target": "b", "type": "contains"},
+            {"source": "a", "target": "c", "type": "contains"},
+            {"source": "a", "target": "missing", "type": "contains"},
+        ],
+    })
+
+    assert len(oag["entities"]) == 2
+    assert len(oag["relations"]) == 1
+    assert stats["duplicates_merged"] == 1
+    assert stats["relations_dropped"] == 1
@@ -0,0 +1,79 @@
+"""
+JobQueue 回调URL检查与回调发送测试
+"""
+import asyncio
+
+import pytest
+
+from app.core.job_queue import CallbackURLError, Job, JobQueue
+
+
+async def runner(payload):
+    return {"success": True}
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://example.com/hook",
+    "http:///hook",
+    "http://127.0.0.1:8080/hook",
+    "http://localhost/hook",
+    "http://10.0.0.5/hook",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/hook",
+    "http://0.0.0.0/hook",
+])
+async def test_rejects_non_public_callback_targets(url):
+    with pytest.raises(CallbackURLError):
+        await JobQueue(runner).check_callback_url(url)
+
+
+async def test_accepts_public_address():
+    await JobQueue(runner).check_callback_url("https://93.184.216.34/hook")
+
+
+async def test_allowlist_overrides_address_check():
+    queue = JobQueue(runner, webhook_allowed_hosts=["hooks.internal", " "])
+
+    await queue.check_callback_url("http://HOOKS.internal:9000/done")
+    with pytest.raises(CallbackURLError):
+        await queue.check_callback_url("https://93.184.216.34/hook")
+
+
+async def test_blocked_callback_is_not_sent(monkeypatch):
+    sent = []
+
+    async def post(self, url, **kwargs):
+        sent.append(url)
+
+    monkeypatch.setattr("httpx.AsyncClient.post", post)
+    await JobQueue(runner)._notify(Job(id="job-1", payload={}, callback_url="http://127.0.0.1/hook"))
+
+    assert sent == []
+
+
+async def test_slow_webhook_does_not_hold_the_worker(monkeypatch):
+    release = asyncio.Event()
+    sent = []
+
+    async def notify(self, job):
+        await release.wait()
+        sent.append(job.id)
+
+    monkeypatch.setattr(JobQueue, "_notify", notify)
+    queue = JobQueue(runner, workers=1)
+    first = queue.submit({}, callback_url="https://93.184.216.34/hook")
+    second = queue.submit({})
+
+    async def finished(job):
+        while not job.done:
+            await job.wait_changed()
+
+    await asyncio.wait_for(finished(second), 1)
+    assert first.status == second.status == "succeeded"
+    assert queue.stats()["webhooks_pending"] == 1
+
+    release.set()
+    await asyncio.sleep(0.01)
+    assert sent == [first.id]
+    assert queue.stats()["webhooks_pending"] == 0
+    await queue.stop()
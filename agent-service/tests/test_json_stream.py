@@ -0,0 +1,100 @@
+"""
+StreamingJSONParser 单元测试
+"""
+import json
+
+import pytest
+
+from app.core.json_stream import StreamingJSONParser
+
+OAG = {
+    "entities": [
+        {"id": "project_001", "type": "Project", "label": "智能驾驶项目", "properties": {"status": "进行中"}},
+        {"id": "domain_001", "type": "Domain", "label": "软件{开发}", "properties": {"tags": ["a", "b"]}},
+    ],
+    "relations": [
+        {"source": "project_001", "target": "domain_001", "type": "contains", "label": "包含"},
+    ],
+    "explanation": "识别出2个实体",
+}
+
+
+def feed_all(parser: StreamingJSONParser, text: str, size: int):
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return completed
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64, 10000])
+def test_items_emitted_regardless_of_chunk_boundaries(size):
+    parser = StreamingJSONParser(("entities", "relations"))
+    completed = feed_all(parser, json.dumps(OAG, ensure_ascii=False), size)
+
+    assert completed == [("entities", e) for e in OAG["entities"]] + [("relations", r) for r in OAG["relations"]]
+    result = parser.result()
+    assert result["complete"]
+    assert result["explanation"] == "识别出2个实体"
+    assert parser.errors == 0
+
+
+def test_item_emitted_when_its_closing_brace_arrives():
+    parser = StreamingJSONParser(("entities",))
+    assert parser.feed('{"entities": [{"id": "a", "type": "T", "label": "A"') == []
+    assert parser.feed("}") == [("entities", {"id": "a", "type": "T", "label": "A"})]
+
+
+def test_escaped_quotes_and_brackets_inside_strings():
+    entity = {"id": "a", "type": "T", "label": 'say "}]" \\ done', "properties": {"note": "{[\"x\"]}"}}
+    text = json.dumps({"entities": [entity], "explanation": 'quote " and \\'})
+    parser = StreamingJSONParser(("entities",))
+
+    assert feed_all(parser, text, 1) == [("entities", entity)]
+    assert parser.result()["explanation"] == 'quote " and \\'
+    assert parser.complete
+
+
+def test_leading_code_fence_is_skipped():
+    parser = StreamingJSONParser(("entities",))
+    completed = feed_all(parser, '```json\n{"entities": [{"id": "a"}]}\n```', 4)
+
+    assert completed == [("entities", {"id": "a"})]
+    assert parser.complete
+
+
+def test_truncated_output_keeps_completed_items():
+    text = json.dumps(OAG, ensure_ascii=False)
+    cut = text.index('{"source"') + 10
+    parser = StreamingJSONParser(("entities", "relations"))
+    feed_all(parser, text[:cut], 5)
+
+    result = parser.result()
+    assert not result["complete"]
+    assert result["entities"] == OAG["entities"]
+    assert result["relations"] == []
+    assert "explanation" not in result
+
+
+def test_malformed_item_is_counted_and_skipped():
+    text = '{"entities": [{"id": "a", "label": x}, {"id": "b"}], "explanation": "ok"}'
+    parser = StreamingJSONParser(("entities",))
+
+    assert feed_all(parser, text, 2) == [("entities", {"id": "b"})]
+    assert parser.errors == 1
+    assert parser.result()["explanation"] == "ok"
+
+
+def test_non_collection_arrays_and_nested_values_are_not_items():
+    text = '{"notes": [{"id": "n"}], "entities": [{"id": "a", "children": [{"id": "c"}]}], "count": 3}'
+    parser = StreamingJSONParser(("entities",))
+
+    assert feed_all(parser, text, 3) == [("entities", {"id": "a", "children": [{"id": "c"}]})]
+    assert parser.result()["count"] == 3
+
+
+def test_feed_after_completion_is_ignored():
+    parser = StreamingJSONParser(("entities",))
+    parser.feed('{"entities": []}')
+
+    assert parser.feed('{"entities": [{"id": "late"}]}') == []
+    assert parser.result() == {"entities": [], "complete": True}
@@ -0,0 +1,46 @@
+"""
+KimiClient 单元测试（上游为 httpx.MockTransport）
+"""
+import httpx
+import pytest
+
+from app.core.llm_client import KimiClient, Message
+
+COMPLETION = {
+    "id": "chatcmpl-test",
+    "model": "moonshot-v1-8k",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+}
+STREAM = (
+    'data: {"choices": [{"index": 0, "delta": {"content": "o"}}]}\n\n'
+    'data: {"choices": [{"index": 0, "delta": {"content": "k"}}]}\n\n'
+    "data: [DONE]\n\n"
+)
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        if b'"stream":true' in request.content.replace(b" ", b""):
+            return httpx.Response(200, text=STREAM, headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json=COMPLETION)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), timeout=httpx.Timeout(60.0, connect=3.0))
+    monkeypatch.setattr(KimiClient, "_client", client)
+    return seen
+
+
+async def test_requests_use_the_pooled_client_timeout(requests):
+    kimi = KimiClient()
+    messages = [Message(role="user", content="ping")]
+
+    assert (await kimi.chat(messages, use_cache=False)).content == "ok"
+    assert "".join([delta async for delta in kimi.chat_stream(messages, use_cache=False)]) == "ok"
+
+    assert len(requests) == 2
+    for request in requests:
+        assert request.extensions["timeout"] == {"connect": 3.0, "read": 60.0, "write": 60.0, "pool": 60.0}
@@ -0,0 +1,63 @@
+"""
+NLUAgent 语义缓存单元测试
+"""
+import pytest
+
+from app.agents.nlu_agent import NLUAgent
+from app.core.semantic_cache import SemanticCache
+from app.graph.state import create_initial_state
+
+FIRST = "为智能驾驶项目创建图谱，软件领域下有感知、规划两个子系统，规划子系统包含路径规划史诗和若干特性"
+SECOND = "为智能驾驶项目创建图谱，软件领域下有感知、规划两个子系统，规划子系统包含行为决策史诗和若干特性"
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    agent = NLUAgent.__new__(NLUAgent)
+    agent.name = "nlu_agent"
+    agent.semantic_cache = SemanticCache(threshold=0.9)
+    calls = []
+
+    async def parse_with_llm(state):
+        calls.append(state["user_input"])
+        return {
+            "intent": "create_oag",
+            "confidence": 0.95,
+            "entities": [{"type": "Epic", "label": "路径规划史诗"}],
+            "slots": {"description": state["user_input"]}
+        }
+
+    monkeypatch.setattr(agent, "_parse_with_llm", parse_with_llm)
+    agent.calls = calls
+    return agent
+
+
+async def test_cache_hit_reuses_intent_but_not_input_specific_slots(agent):
+    await agent.run(create_initial_state("s1", FIRST))
+    state = await agent.run(create_initial_state("s2", SECOND))
+
+    assert agent.calls == [FIRST]
+    assert state["agent_results"]["nlu"]["source"] == "semantic_cache"
+    assert state["intent"] == "create_oag"
+    assert state["slots"] == {"description": SECOND}
+    assert state["entities"] == []
+
+
+async def test_results_with_other_slots_are_not_cached(agent, monkeypatch):
+    async def parse_with_llm(state):
+        return {"intent": "query_oag", "confidence": 0.95, "entities": [], "slots": {"schema_id": "s-1"}}
+
+    monkeypatch.setattr(agent, "_parse_with_llm", parse_with_llm)
+    await agent.run(create_initial_state("s1", FIRST))
+
+    assert len(agent.semantic_cache) == 0
+
+
+async def test_persist_writes_snapshot_off_the_event_loop(tmp_path):
+    cache = SemanticCache(path=str(tmp_path), persist_interval=0)
+    cache.add(FIRST, {"intent": "create_oag", "confidence": 0.95, "with_description": True})
+    await cache.persist()
+
+    reloaded = SemanticCache(path=str(tmp_path))
+    assert len(reloaded) == 1
+    assert reloaded.lookup(FIRST)[0]["intent"] == "create_oag"
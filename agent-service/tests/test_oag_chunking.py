@@ -0,0 +1,51 @@
+"""
+长文档切分与合并测试
+"""
+from app.agents.oag_chunking import merge_chunk_results, split_document
+from app.core.tokens import estimate_tokens
+
+PARAGRAPH = "智能驾驶软件领域负责感知、规划与控制模块的研发，并与测试验证团队协作完成版本发布。" * 6
+
+
+def test_heading_stays_with_its_body():
+    text = "# 软件领域\n\n" + "\n\n".join([PARAGRAPH] * 4)
+    chunks = split_document(text, max_tokens=500, overlap_tokens=0)
+
+    assert len(chunks) > 1
+    assert chunks[0].startswith("# 软件领域\n" + PARAGRAPH[:10])
+    assert all(estimate_tokens(chunk) > 1 for chunk in chunks)
+    assert not any(chunk.strip() == "# 软件领域" for chunk in chunks)
+
+
+def test_consecutive_headings_attach_to_next_block():
+    chunks = split_document("# 项目\n## 软件领域\n\n感知模块\n\n## 测试领域", max_tokens=500)
+
+    assert chunks == ["# 项目\n## 软件领域\n感知模块\n\n## 测试领域"]
+
+
+def test_chunks_respect_token_limit_and_keep_code_fences_whole():
+    fence = "```mermaid\ngraph TD\n  A --> B\n```"
+    text = "\n\n".join([PARAGRAPH, fence, PARAGRAPH, PARAGRAPH])
+    chunks = split_document(text, max_tokens=300, overlap_tokens=50)
+
+    assert all(estimate_tokens(chunk) <= 300 for chunk in chunks)
+    assert sum(fence in chunk for chunk in chunks) >= 1
+    assert all(chunk.count("```") % 2 == 0 for chunk in chunks)
+
+
+def test_merge_deduplicates_entities_and_rewrites_relations():
+    results = [
+        {
+            "entities": [{"id": "e1", "type": "Domain", "label": "软件领域"}, {"id": "e2", "type": "Project", "label": "P"}],
+            "relations": [{"source": "e2", "target": "e1", "type": "contains"}],
+        },
+        {
+            "entities": [{"id": "e1", "type": "Domain", "label": "软件 领域"}, {"id": "e9", "type": "Project", "label": "P"}],
+            "relations": [{"source": "e9", "target": "e1", "type": "contains"}],
+        },
+    ]
+    merged, stats = merge_chunk_results(results)
+
+    assert len(merged["entities"]) == 2
+    assert len(merged["relations"]) == 1
+    assert stats["duplicates_merged"] == 2
@@ -0,0 +1,69 @@
+"""
+apply_oag_diff 测试：删除级联、端点校验与重复新增按更新处理
+"""
+from app.agents.oag_diff import DIFF_KEYS, apply_oag_diff
+
+EXISTING = {
+    "entities": [
+        {"id": "p", "type": "Project", "label": "智能驾驶", "properties": {"owner": "张三"}},
+        {"id": "d1", "type": "Domain", "label": "感知", "properties": {}},
+        {"id": "d2", "type": "Domain", "label": "规划", "properties": {}},
+    ],
+    "relations": [
+        {"source": "p", "target": "d1", "type": "contains"},
+        {"source": "p", "target": "d2", "type": "contains"},
+        {"source": "d2", "target": "d1", "type": "depends_on"},
+    ],
+}
+
+
+def diff(**changes):
+    return {key: changes.get(key, []) for key in DIFF_KEYS}
+
+
+def test_removing_an_entity_cascades_to_its_relations():
+    merged, counts = apply_oag_diff(EXISTING, diff(removed_entities=[{"id": "d1"}]))
+
+    assert [e["id"] for e in merged["entities"]] == ["p", "d2"]
+    assert merged["relations"] == [{"source": "p", "target": "d2", "type": "contains"}]
+    assert counts["removed_entities"] == 1
+    assert len(EXISTING["relations"]) == 3
+
+
+def test_added_relations_with_unknown_endpoints_are_skipped():
+    merged, counts = apply_oag_diff(EXISTING, diff(added_relations=[
+        {"source": "p", "target": "missing", "type": "contains"},
+        {"source": "d1", "target": "d2", "type": "depends_on"},
+        {"source": "p", "target": "d1", "type": "contains"},
+    ]))
+
+    assert len(merged["relations"]) == 4
+    assert {"source": "d1", "target": "d2", "type": "depends_on", "label": "", "properties": {}} in merged["relations"]
+    assert counts["added_relations"] == 1
+    assert counts["skipped"] == 2
+
+
+def test_added_entity_with_existing_id_is_an_update():
+    merged, counts = apply_oag_diff(EXISTING, diff(added_entities=[
+        {"id": "p", "type": "Project", "label": "智能驾驶平台", "properties": {"owner": None, "phase": "二期"}},
+    ]))
+
+    project = merged["entities"][0]
+    assert project["label"] == "智能驾驶平台"
+    assert project["properties"] == {"phase": "二期"}
+    assert len(merged["entities"]) == 3
+    assert counts["added_entities"] == 0
+    assert counts["updated_entities"] == 1
+    assert EXISTING["entities"][0]["properties"] == {"owner": "张三"}
+
+
+def test_operations_on_missing_items_are_counted_as_skipped():
+    _, counts = apply_oag_diff(EXISTING, diff(
+        updated_entities=[{"id": "nope", "label": "x"}],
+        removed_entities=[{"id": "nope"}],
+        removed_relations=[{"source": "d1", "target": "p", "type": "contains"}],
+        added_entities=[{"id": "x"}],
+    ))
+
+    assert counts["skipped"] == 4
+    assert sum(counts[key] for key in DIFF_KEYS) == 0
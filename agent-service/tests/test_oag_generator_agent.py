@@ -0,0 +1,134 @@
+"""
+OAGGeneratorAgent 单元测试（LLM与Schema均为本地替身）
+"""
+import json
+
+import pytest
+
+from app.agents import oag_generator_agent as module
+from app.agents.oag_generator_agent import OAGGeneratorAgent
+from app.core.entity_index import EntityIndex, stable_entity_id
+from app.core.schema_store import CachedSchema
+
+SCHEMA = CachedSchema("default", {
+    "entityTypes": {
+        "Project": {"label": "项目", "properties": {}},
+        "Domain": {"label": "领域", "properties": {}},
+    },
+    "relationTypes": {
+        "contains": {"label": "包含", "from": ["Project"], "to": ["Domain"]},
+        "depends_on": {"label": "依赖", "from": ["Domain"], "to": ["Domain"]},
+    },
+})
+
+
+def make_state(description: str = "智能驾驶项目包含软件领域"):
+    return {
+        "session_id": "test",
+        "user_input": description,
+        "slots": {"description": description},
+        "entities": [],
+        "messages": [],
+        "agent_results": {},
+        "entities_to_create": [],
+        "relations_to_create": [],
+        "error": None,
+    }
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    async def get_schema(schema_id="default", version=None):
+        return SCHEMA
+
+    monkeypatch.setattr(module.schema_store, "get", get_schema)
+    agent = OAGGeneratorAgent.__new__(OAGGeneratorAgent)
+    agent.name = "oag_generator"
+    agent.entity_index = None
+    agent.vector_store = None
+    return agent
+
+
+def llm_output(monkeypatch, output: dict):
+    text = json.dumps(output, ensure_ascii=False)
+
+    async def chat_stream(messages, **kwargs):
+        for start in range(0, len(text), 16):
+            yield text[start:start + 16]
+
+    monkeypatch.setattr(module.kimi_client, "chat_stream", chat_stream)
+
+
+@pytest.mark.parametrize("auto_repair", [True, False])
+async def test_malformed_items_are_skipped_not_fatal(agent, monkeypatch, auto_repair):
+    monkeypatch.setattr(module.settings, "OAG_SCHEMA_AUTO_REPAIR", auto_repair)
+    llm_output(monkeypatch, {
+        "entities": [
+            {"id": "p", "type": "Project", "label": "P"},
+            {"id": "d", "type": "Domain", "properties": {"name": "软件"}},
+            {"id": "x", "label": "缺少类型"},
+        ],
+        "relations": [{"source": "p", "target": "d"}],
+    })
+
+    state = await agent.run(make_state())
+
+    assert state["error"] is None
+    result = state["agent_results"]["oag_generator"]
+    assert [e["id"] for e in result["entities"]] == ["p", "d"]
+    assert result["relations"] == []
+    assert [e.id for e in state["entities_to_create"]] == ["p", "d"]
+    assert state["relations_to_create"] == []
+
+    # 缺少名称的实体保留下来，自动修正时用 name 属性补全
+    domain = state["entities_to_create"][1]
+    assert domain.label == ("软件" if auto_repair else "")
+    assert result["entities"][1].get("label") == ("软件" if auto_repair else None)
+
+
+async def test_update_validates_and_canonicalizes_added_items(agent, monkeypatch):
+    monkeypatch.setattr(module.settings, "OAG_SCHEMA_AUTO_REPAIR", True)
+    agent.entity_index = EntityIndex(vector_threshold=0, max_learned=100)
+    prompts = []
+    real_load_prompt = module.load_prompt
+
+    def load_prompt(name, **variables):
+        prompts.append(variables)
+        return real_load_prompt(name, **variables)
+
+    monkeypatch.setattr(module, "load_prompt", load_prompt)
+    llm_output(monkeypatch, {
+        "added_entities": [
+            {"id": "new_domain", "type": "domain", "label": "规划"},
+            {"id": "bad", "type": "Unknown", "label": "未知"},
+            {"id": "d1", "type": "Domain", "label": "感知系统"},
+        ],
+        "added_relations": [
+            {"source": "p", "target": "new_domain", "type": "contains"},
+            {"source": "p", "target": "bad", "type": "contains"},
+        ],
+    })
+    state = make_state("再加一个规划领域")
+    state["slots"] = {"description": "上一轮的描述"}
+    state["last_oag"] = {
+        "entities": [
+            {"id": "p", "type": "Project", "label": "智能驾驶", "properties": {}},
+            {"id": "d1", "type": "Domain", "label": "感知", "properties": {}},
+        ],
+        "relations": [{"source": "p", "target": "d1", "type": "contains"}],
+    }
+
+    state = await agent.update(state)
+
+    assert state["error"] is None
+    assert prompts[0]["description"] == "再加一个规划领域"
+
+    domain_id = stable_entity_id("Domain", "规划")
+    assert [(e.id, e.type) for e in state["entities_to_create"]] == [(domain_id, "Domain")]
+    assert [(r.source, r.target) for r in state["relations_to_create"]] == [("p", domain_id)]
+
+    result = state["agent_results"]["oag_generator"]
+    assert {e["id"] for e in result["entities"]} == {"p", "d1", domain_id}
+    assert next(e for e in result["entities"] if e["id"] == "d1")["label"] == "感知系统"
+    assert {(r["source"], r["target"]) for r in result["relations"]} == {("p", "d1"), ("p", domain_id)}
+    assert result["canonicalization"]["new"] == 1
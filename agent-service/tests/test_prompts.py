@@ -0,0 +1,74 @@
+"""
+PromptManager 测试：片段渲染、变量校验与按修改时间热更新
+"""
+import os
+
+import pytest
+
+from app.prompts import CompiledPrompt, PromptManager
+
+
+@pytest.fixture
+def prompts(tmp_path):
+    (tmp_path / "greet.md").write_text("你好 {{who}}，今天是{{day}}。再见 {{who}}", encoding="utf-8")
+    return PromptManager(prompts_dir=str(tmp_path), check_interval=0)
+
+
+def test_template_compiles_into_alternating_segments(tmp_path):
+    template = CompiledPrompt("t", tmp_path / "t.md", "A{{x}}B{{y}}{{x}}", 0)
+
+    assert template.literals == ["A", "B", "", ""]
+    assert template.names == ["x", "y", "x"]
+    assert template.variables == {"x", "y"}
+    assert template.render({"x": 1, "y": "-"}) == "A1B-1"
+
+
+def test_template_without_placeholders_renders_verbatim(tmp_path):
+    template = CompiledPrompt("t", tmp_path / "t.md", "纯文本 {不是变量}", 0)
+    assert template.render({}) == "纯文本 {不是变量}"
+
+
+def test_load_renders_every_occurrence(prompts):
+    assert prompts.load("greet", who="小明", day="周一") == "你好 小明，今天是周一。再见 小明"
+
+
+def test_missing_variable_raises(prompts):
+    with pytest.raises(ValueError, match="day"):
+        prompts.load("greet", who="小明")
+
+
+def test_unused_variables_are_ignored_and_warned_once(prompts):
+    assert prompts.load("greet", who="a", day="b", extra=1) == "你好 a，今天是b。再见 a"
+    prompts.load("greet", who="a", day="b", extra=2)
+
+    assert prompts._warned == {("greet", frozenset({"extra"}))}
+
+
+def test_missing_file_raises(prompts):
+    with pytest.raises(FileNotFoundError):
+        prompts.load("nope")
+
+
+def test_changed_file_is_recompiled(prompts, tmp_path):
+    path = tmp_path / "greet.md"
+    first = prompts.get("greet")
+    assert prompts.get("greet") is first
+
+    path.write_text("新模板 {{who}}", encoding="utf-8")
+    os.utime(path, ns=(first.mtime_ns + 1_000_000_000, first.mtime_ns + 1_000_000_000))
+
+    assert prompts.load("greet", who="x") == "新模板 x"
+
+
+def test_mtime_is_not_rechecked_within_interval(tmp_path):
+    path = tmp_path / "p.md"
+    path.write_text("旧", encoding="utf-8")
+    prompts = PromptManager(prompts_dir=str(tmp_path), check_interval=3600)
+    first = prompts.get("p")
+
+    path.write_text("新", encoding="utf-8")
+    os.utime(path, ns=(first.mtime_ns + 1_000_000_000, first.mtime_ns + 1_000_000_000))
+    assert prompts.load("p") == "旧"
+
+    prompts.reload("p")
+    assert prompts.load("p") == "新"
@@ -0,0 +1,111 @@
+"""
+LLMGovernor 测试：公平排队、排队超时、取消与令牌桶定时重试
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.core.rate_limiter import LLMGovernor, LLMOverloadedError
+
+
+async def hold(governor: LLMGovernor, session_id: str, order: list, release: asyncio.Event):
+    async with governor.acquire(session_id=session_id):
+        order.append(session_id)
+        await release.wait()
+
+
+async def test_sessions_are_served_round_robin():
+    governor = LLMGovernor(requests_per_minute=0, max_concurrency=1)
+    order = []
+    gate = asyncio.Event()
+
+    # 先占住唯一的并发许可，再让会话 a 突发3个请求、会话 b 排在其后
+    blocker = asyncio.create_task(hold(governor, "blocker", order, gate))
+    await asyncio.sleep(0)
+    release = asyncio.Event()
+    release.set()
+    waiters = [asyncio.create_task(hold(governor, "a", order, release)) for _ in range(3)]
+    waiters += [asyncio.create_task(hold(governor, "b", order, release)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    gate.set()
+    await asyncio.gather(blocker, *waiters)
+
+    assert order == ["blocker", "a", "b", "a", "b", "a"]
+    assert governor.stats()["granted"] == 6
+    assert governor.stats()["queue_depth"] == 0
+
+
+async def test_queue_wait_timeout_raises_overloaded():
+    governor = LLMGovernor(requests_per_minute=0, max_concurrency=1, max_queue_wait=0.05)
+    gate = asyncio.Event()
+    blocker = asyncio.create_task(hold(governor, "blocker", [], gate))
+    await asyncio.sleep(0)
+
+    with pytest.raises(LLMOverloadedError) as exc_info:
+        async with governor.acquire(session_id="late"):
+            pass
+    assert exc_info.value.retry_after == 0.05
+    assert governor.stats()["rejected"] == 1
+    assert governor.stats()["queue_depth"] == 0
+
+    gate.set()
+    await blocker
+    assert governor.stats()["active"] == 0
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    governor = LLMGovernor(requests_per_minute=0, max_concurrency=1)
+    gate = asyncio.Event()
+    blocker = asyncio.create_task(hold(governor, "blocker", [], gate))
+    await asyncio.sleep(0)
+
+    waiter = asyncio.create_task(hold(governor, "a", [], gate))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert governor.stats()["queue_depth"] == 0
+
+    gate.set()
+    await blocker
+    assert governor.stats()["active"] == 0
+
+
+async def test_exhausted_bucket_retries_on_timer():
+    # 每分钟6000次 => 每秒补充100次；桶容量耗尽后下一次需等待约10ms
+    governor = LLMGovernor(requests_per_minute=6000, max_concurrency=8)
+    governor.requests.tokens = 0
+    governor.requests.updated = time.monotonic()
+
+    async with governor.acquire():
+        pass
+
+    assert governor.stats()["granted"] == 1
+    assert governor.stats()["max_wait_seconds"] > 0
+
+
+def test_timer_is_rescheduled_on_a_new_event_loop():
+    governor = LLMGovernor(requests_per_minute=6000, max_concurrency=8)
+
+    async def stall():
+        # 额度耗尽后排队并在定时器触发前离开，留下旧循环上的定时器
+        governor.requests.tokens = -1000
+        with pytest.raises(LLMOverloadedError):
+            async with governor.acquire():
+                pass
+
+    async def use():
+        governor.requests.tokens = 0
+        governor.requests.updated = time.monotonic()
+        async with governor.acquire():
+            pass
+
+    governor.max_queue_wait = 0.01
+    asyncio.run(stall())
+    assert governor._timer is not None
+
+    governor.max_queue_wait = 1.0
+    asyncio.run(asyncio.wait_for(use(), 2))
+    assert governor.stats()["granted"] == 1
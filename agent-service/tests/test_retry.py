@@ -0,0 +1,58 @@
+"""
+RetryPolicy 单元测试
+"""
+import httpx
+import pytest
+
+from app.core.rate_limiter import LLMOverloadedError
+from app.core.retry import RetryPolicy
+
+
+def status_error(status: int, headers=None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://kimi.test/v1/chat/completions")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status}", request=request, response=response)
+
+
+def failing(errors):
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+
+    fn.calls = calls
+    return fn
+
+
+async def test_retries_transient_errors_then_succeeds():
+    policy = RetryPolicy(max_retries=3, base_delay=0, max_delay=0)
+    fn = failing([status_error(503), httpx.ConnectTimeout("timeout")])
+
+    assert await policy.run(fn) == "ok"
+    assert len(fn.calls) == 3
+    assert policy.stats()["retries"] == 2
+
+
+async def test_non_retryable_error_is_reraised_without_self_cause():
+    policy = RetryPolicy(max_retries=3, base_delay=0)
+    error = status_error(400)
+
+    with pytest.raises(httpx.HTTPStatusError) as excinfo:
+        await policy.run(failing([error]))
+
+    assert excinfo.value is error
+    assert excinfo.value.__cause__ is None
+
+
+async def test_persistent_429_becomes_overloaded_error():
+    policy = RetryPolicy(max_retries=1, base_delay=0, max_delay=0)
+    errors = [status_error(429, {"retry-after": "0"}), status_error(429, {"retry-after": "0"})]
+
+    with pytest.raises(LLMOverloadedError) as excinfo:
+        await policy.run(failing(errors))
+
+    assert excinfo.value.__cause__ is errors[1]
+    assert policy.stats()["gave_up"] == 1
@@ -0,0 +1,112 @@
+"""
+SchemaStore 测试：ETag 重新验证、stale-while-revalidate 与版本查找（后端为 httpx.MockTransport）
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.schema_store import SchemaStore, SchemaVersionNotFoundError
+
+SCHEMA_V1 = {"version": "1", "entityTypes": {"Project": {"code": "Project"}}, "relationTypes": {}}
+SCHEMA_V2 = {"version": "2", "entityTypes": {"Project": {"code": "Project"}, "Epic": {"code": "Epic"}}, "relationTypes": {}}
+
+
+class Backend:
+    """可切换Schema的假后端，支持 If-None-Match"""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.requests = []
+
+    @property
+    def etag(self) -> str:
+        return f'"v{self.schema["version"]}"'
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.headers.get("if-none-match") == self.etag:
+            return httpx.Response(304)
+        return httpx.Response(200, json={"data": self.schema}, headers={"ETag": self.etag})
+
+
+@pytest.fixture
+def backend():
+    return Backend(SCHEMA_V1)
+
+
+@pytest.fixture
+def store(backend):
+    store = SchemaStore(base_url="http://backend", ttl=60, stale_ttl=60, timeout=1)
+    store._client = httpx.AsyncClient(transport=httpx.MockTransport(backend))
+    return store
+
+
+def expire(store: SchemaStore, schema_id: str, seconds: float):
+    store._latest[schema_id].fetched_at -= seconds
+
+
+async def test_fresh_entry_is_served_from_cache(store, backend):
+    first = await store.get()
+    second = await store.get()
+
+    assert first is second
+    assert first.version == "1"
+    assert len(backend.requests) == 1
+    assert store.stats()["hits"] == 1
+
+
+async def test_schema_id_is_sent_as_query_parameter(store, backend):
+    await store.get("custom")
+    assert backend.requests[0].url.path == "/graph/schema"
+    assert backend.requests[0].url.params["schemaId"] == "custom"
+
+
+async def test_expired_entry_revalidates_with_etag(store, backend):
+    first = await store.get()
+    expire(store, "default", 200)
+
+    again = await store.get()
+
+    assert again is first
+    assert backend.requests[-1].headers["if-none-match"] == '"v1"'
+    assert store.stats()["not_modified"] == 1
+    assert again.age() < 1
+
+
+async def test_stale_entry_is_served_while_revalidating(store, backend):
+    first = await store.get()
+    backend.schema = SCHEMA_V2
+    expire(store, "default", 90)
+
+    stale = await store.get()
+    assert stale is first
+    assert store.stats()["stale_hits"] == 1
+
+    await asyncio.gather(*store._background)
+    latest = await store.get()
+    assert latest.version == "2"
+    assert len(backend.requests) == 2
+
+
+async def test_cached_versions_remain_addressable(store, backend):
+    await store.get()
+    backend.schema = SCHEMA_V2
+    await store.refresh("default")
+
+    assert (await store.get(version="1")).version == "1"
+    assert (await store.get(version="2")).version == "2"
+
+
+async def test_unknown_version_is_not_served_as_latest(store, backend):
+    with pytest.raises(SchemaVersionNotFoundError):
+        await store.get(version="9")
+
+
+async def test_backend_failure_serves_stale_copy(store, backend):
+    first = await store.get()
+    expire(store, "default", 200)
+    store._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(503)))
+
+    assert await store.get() is first
+    assert store.stats()["errors"] == 1
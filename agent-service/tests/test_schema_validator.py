@@ -0,0 +1,60 @@
+"""
+Schema 校验与自动修正测试
+"""
+from app.core.schema_store import CachedSchema
+from app.core.schema_validator import repair_oag, validate_oag
+
+SCHEMA = CachedSchema("default", {
+    "entityTypes": {
+        "Project": {"label": "项目", "properties": {"name": {"type": "String", "required": True}}},
+        "Domain": {"label": "领域", "properties": {"status": {"type": "Enum", "values": ["Active", "Closed"]}}},
+        "Feature": {"label": "特性", "properties": {}},
+    },
+    "relationTypes": {
+        "contains": {"label": "包含", "from": ["Project"], "to": ["Domain"]},
+        "has_feature": {"label": "拥有特性", "from": ["Domain"], "to": ["Feature"]},
+    },
+})
+
+ENTITIES = [
+    {"id": "p", "type": "Project", "label": "P", "properties": {"name": "P"}},
+    {"id": "d", "type": "Domain", "label": "D"},
+    {"id": "f", "type": "Feature", "label": "F"},
+]
+
+
+def test_valid_oag_has_no_errors():
+    report = validate_oag(SCHEMA, {"entities": ENTITIES, "relations": [{"source": "p", "target": "d", "type": "contains"}]})
+
+    assert report["valid"], report["errors"]
+
+
+def test_missing_label_is_filled_not_fatal():
+    oag, report = repair_oag(SCHEMA, {
+        "entities": [{"id": "p", "type": "project", "properties": {"name": "智能驾驶"}}, {"id": "d", "type": "Domain"}],
+        "relations": [],
+    })
+
+    assert [e["label"] for e in oag["entities"]] == ["智能驾驶", "d"]
+    assert oag["entities"][0]["type"] == "Project"
+    assert {r["action"] for r in report["repairs"]} >= {"fill_label", "fix_type"}
+
+
+def test_reversed_relation_is_swapped():
+    oag, report = repair_oag(SCHEMA, {"entities": ENTITIES, "relations": [{"source": "d", "target": "p", "type": "包含"}]})
+
+    assert oag["relations"] == [{"source": "p", "target": "d", "type": "contains"}]
+    assert report["valid"]
+
+
+def test_invalid_type_is_inferred_when_unambiguous():
+    oag, _ = repair_oag(SCHEMA, {"entities": ENTITIES, "relations": [{"source": "p", "target": "d", "type": "owns"}]})
+
+    assert oag["relations"][0]["type"] == "contains"
+
+
+def test_valid_type_with_wrong_endpoints_is_dropped_not_retyped():
+    oag, report = repair_oag(SCHEMA, {"entities": ENTITIES, "relations": [{"source": "p", "target": "d", "type": "has_feature"}]})
+
+    assert oag["relations"] == []
+    assert report["repairs"] == [{"action": "drop_relation", "id": "p-has_feature->d", "reason": "端点类型与关系类型不符"}]
@@ -0,0 +1,144 @@
+"""
+SingleFlight 测试：调用合并、取消语义与流式广播
+"""
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+async def test_concurrent_calls_share_one_upstream_call():
+    flight = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "result"
+
+    waiters = [asyncio.create_task(flight.do("k", fetch)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ["result"] * 3
+    assert calls == 1
+    assert flight.stats() == {"leaders": 1, "coalesced": 2, "cancelled": 0, "in_flight": 0}
+
+
+async def test_errors_are_shared_and_key_is_released():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream")
+
+    results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+
+    async def ok():
+        return "ok"
+
+    assert await flight.do("k", ok) == "ok"
+
+
+async def test_cancelling_one_waiter_keeps_the_call_for_others():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return "result"
+
+    first = asyncio.create_task(flight.do("k", fetch))
+    second = asyncio.create_task(flight.do("k", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await second == "result"
+    assert first.cancelled()
+    assert flight.stats()["cancelled"] == 0
+
+
+async def test_last_waiter_leaving_cancels_the_upstream_call():
+    flight = SingleFlight()
+    upstream_cancelled = asyncio.Event()
+
+    async def fetch():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            upstream_cancelled.set()
+            raise
+
+    waiter = asyncio.create_task(flight.do("k", fetch))
+    await asyncio.sleep(0)
+    waiter.cancel()
+
+    await asyncio.wait_for(upstream_cancelled.wait(), 1)
+    assert flight.stats()["cancelled"] == 1
+
+
+def upstream(chunks, gate: asyncio.Event = None, error: Exception = None):
+    started = []
+
+    async def factory():
+        started.append(1)
+        for i, chunk in enumerate(chunks):
+            if gate is not None and i == 1:
+                await gate.wait()
+            yield chunk
+        if error is not None:
+            raise error
+
+    factory.started = started
+    return factory
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+async def test_stream_broadcasts_to_late_subscribers_from_the_start():
+    flight = SingleFlight()
+    gate = asyncio.Event()
+    factory = upstream(["a", "b", "c"], gate)
+
+    first = asyncio.create_task(collect(flight.stream("k", factory)))
+    await asyncio.sleep(0.01)
+    late = asyncio.create_task(collect(flight.stream("k", factory)))
+    await asyncio.sleep(0.01)
+    gate.set()
+
+    assert await first == ["a", "b", "c"]
+    assert await late == ["a", "b", "c"]
+    assert len(factory.started) == 1
+
+
+async def test_stream_errors_reach_every_subscriber():
+    flight = SingleFlight()
+    factory = upstream(["a"], error=RuntimeError("broken"))
+
+    results = await asyncio.gather(
+        collect(flight.stream("k", factory)),
+        collect(flight.stream("k", factory)),
+        return_exceptions=True
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+async def test_stream_is_cancelled_when_every_subscriber_leaves():
+    flight = SingleFlight()
+    gate = asyncio.Event()
+    stream = flight.stream("k", upstream(["a", "b"], gate))
+
+    assert await stream.__anext__() == "a"
+    await stream.aclose()
+    await asyncio.sleep(0.01)
+
+    assert flight.stats()["cancelled"] == 1
+    assert flight.stats()["in_flight"] == 0
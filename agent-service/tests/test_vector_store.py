@@ -0,0 +1,114 @@
+"""
+VectorStore 测试：增量写入/删除、持久化与内存映射加载、检索与目录导入
+"""
+import json
+import os
+
+import pytest
+
+from app.core.embeddings import HashingEmbedder
+from app.core.vector_store import VectorStore, graph_documents
+
+GRAPH = {
+    "entities": [
+        {"id": "p", "type": "Project", "label": "智能驾驶", "properties": {"owner": "张三"}},
+        {"id": "d1", "type": "Domain", "label": "感知系统"},
+        {"id": "d2", "type": "Domain", "label": "座舱娱乐"},
+    ],
+    "relations": [{"source": "p", "target": "d1", "type": "contains"}],
+}
+
+
+@pytest.fixture
+def embedder():
+    return HashingEmbedder(dimension=256)
+
+
+def doc(key: str, text: str, **metadata):
+    return {"key": key, "text": text, "metadata": {"label": text, **metadata}}
+
+
+def test_graph_documents_include_neighbours():
+    docs = {d["key"]: d for d in graph_documents(GRAPH, "g.json")}
+
+    assert set(docs) == {"g.json:p", "g.json:d1", "g.json:d2"}
+    assert docs["g.json:p"]["text"] == "智能驾驶 Project 张三"
+    assert docs["g.json:d1"]["metadata"]["relations"] == ["智能驾驶 -contains-> 感知系统"]
+    assert docs["g.json:d2"]["metadata"]["relations"] == []
+
+
+def test_add_replaces_existing_keys_and_delete_removes(embedder):
+    store = VectorStore(embedder=embedder)
+
+    assert store.add([doc("a", "感知系统"), doc("b", "座舱娱乐")]) == 2
+    assert store.add([doc("a", "规划控制")]) == 1
+    assert len(store) == 2
+    assert store.search("规划控制", top_k=1)[0]["key"] == "a"
+
+    assert store.delete(["a", "missing"]) == 1
+    assert len(store) == 1
+    assert [hit["key"] for hit in store.search("规划控制")] == ["b"]
+
+
+def test_search_filters_dedupes_and_ranks(embedder):
+    store = VectorStore(embedder=embedder)
+    store.ingest_graph(GRAPH, "a.json")
+    store.ingest_graph(GRAPH, "b.json")
+
+    hits = store.search("感知系统", top_k=5)
+    labels = [hit["metadata"]["label"] for hit in hits]
+    assert labels[0] == "感知系统"
+    assert len(labels) == len(set(labels))
+    assert [hit["score"] for hit in hits] == sorted((hit["score"] for hit in hits), reverse=True)
+
+    assert all(hit["metadata"]["type"] == "Project" for hit in store.search("感知系统", types=["Project"]))
+    assert all(hit["score"] >= 0.9 for hit in store.search("感知系统", min_score=0.9))
+
+
+def test_reingesting_a_source_replaces_its_documents(embedder):
+    store = VectorStore(embedder=embedder)
+    store.ingest_graph(GRAPH, "g.json")
+
+    store.ingest_graph({"entities": [{"id": "x", "type": "Domain", "label": "车身控制"}]}, "g.json")
+
+    assert len(store) == 1
+    assert store.stats() == {"documents": 1, "sources": 1}
+
+
+def test_saved_index_is_memory_mapped_on_load_and_stays_writable(tmp_path, embedder):
+    store = VectorStore(path=str(tmp_path), embedder=embedder)
+    store.ingest_graph(GRAPH, "g.json")
+    store.save()
+
+    loaded = VectorStore(path=str(tmp_path), embedder=embedder)
+    assert len(loaded) == 3
+    assert loaded.search("座舱娱乐", top_k=1)[0]["key"] == "g.json:d2"
+
+    loaded.add([doc("new", "车身控制")])
+    loaded.delete(["g.json:p"])
+    assert len(loaded) == 3
+    assert loaded.search("车身控制", top_k=1)[0]["key"] == "new"
+
+
+def test_incompatible_index_on_disk_is_ignored(tmp_path, embedder):
+    store = VectorStore(path=str(tmp_path), embedder=embedder)
+    store.ingest_graph(GRAPH, "g.json")
+    store.save()
+
+    assert len(VectorStore(path=str(tmp_path), embedder=HashingEmbedder(dimension=128))) == 0
+
+
+def test_directory_ingest_skips_unchanged_and_removes_deleted(tmp_path, embedder):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    first, second = corpus / "a.json", corpus / "b.json"
+    first.write_text(json.dumps(GRAPH), encoding="utf-8")
+    second.write_text(json.dumps({"nodes": [{"id": "n", "type": "Domain", "label": "车身控制"}]}), encoding="utf-8")
+    store = VectorStore(path=str(tmp_path / "index"), embedder=embedder)
+
+    assert store.ingest_directory(str(corpus)) == {"files": 2, "skipped": 0, "removed": 0, "documents": 4}
+
+    os.remove(second)
+    stats = store.ingest_directory(str(corpus))
+    assert stats == {"files": 0, "skipped": 1, "removed": 1, "documents": 0}
+    assert len(store) == 3
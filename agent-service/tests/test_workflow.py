@@ -0,0 +1,47 @@
+"""
+OntologyAgentGraph 会话、槽位与检查点持久化测试（快速分类命中问候语，不调用LLM）
+"""
+from app.core.session_store import SessionData
+from app.graph.state import create_initial_state
+from app.graph.workflow import agent_graph
+
+
+async def test_run_persists_session_and_checkpoint():
+    result = await agent_graph.run("test-persist", "你好")
+
+    assert result["intent"] == "general_chat"
+    assert await agent_graph.session_store.load("test-persist") is not None
+    assert await agent_graph.get_checkpoint("test-persist") is not None
+
+
+async def test_ephemeral_run_leaves_no_session_or_checkpoint():
+    result = await agent_graph.run("test-ephemeral", "你好", persist=False)
+
+    assert result["intent"] == "general_chat"
+    assert result["final_response"]
+    assert await agent_graph.session_store.load("test-ephemeral") is None
+    assert await agent_graph.get_checkpoint("test-ephemeral") is None
+
+
+async def test_turn_slots_do_not_leak_into_later_turns():
+    first = create_initial_state("test-turn-slots", "创建车辆图谱：上一轮的描述")
+    first["slots"].update({"description": "上一轮的描述", "schema_id": "vehicle"})
+    await agent_graph._save_session(first)
+
+    stored = await agent_graph.session_store.load("test-turn-slots")
+    assert stored.slots == {"schema_id": "vehicle"}
+
+    second = await agent_graph.run("test-turn-slots", "你好")
+    assert second["slots"] == {"schema_id": "vehicle"}
+
+
+async def test_legacy_sessions_drop_stored_turn_slots():
+    await agent_graph.session_store.save(
+        "test-legacy-slots",
+        SessionData(slots={"description": "旧描述", "entities": [], "schema_id": "vehicle"}, messages=[])
+    )
+
+    result = await agent_graph.run("test-legacy-slots", "你好")
+
+    assert result["slots"] == {"schema_id": "vehicle"}
+    assert (await agent_graph.session_store.load("test-legacy-slots")).slots == {"schema_id": "vehicle"}